@@ -1,41 +1,59 @@
+import functools
 import logging
-from telegram import Update
+import os
+import tempfile
+from typing import Optional
+from telegram import Update, InputMediaVideo
+from telegram.error import BadRequest
 from telegram.ext import (
-    Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
     filters
 )
-from config import ADMIN_BOT_TOKEN, ADMIN_ID
-from database.operations import Database
+from config import ADMIN_BOT_TOKEN, ADMIN_ID, BATCH_MODERATION_SIZE, MEDIA_PREFETCH_INTERVAL, USER_BOT_TOKEN
+from database.retention import ensure_retention_indexes
 from utils.keyboards import (
     get_admin_menu_keyboard,
     get_moderation_keyboard,
-    get_confirmation_keyboard
+    get_confirmation_keyboard,
+    get_stats_keyboard,
+    get_batch_moderation_keyboard
 )
 from utils.states import AdminStates
-from utils.helpers import format_challenge_info, format_challenge_stats
+from utils.helpers import (
+    format_challenge_info,
+    format_challenge_stats,
+    format_activity_stats,
+    format_top_activity
+)
+from utils import callbacks
+from utils.callbacks import CallbackRouter
+from utils.challenge_io import ChallengeImporter, ChallengeExporter
+from utils.circuit_breaker import CircuitOpenError
+from utils.scheduler import JobScheduler
+from utils.maintenance import register_maintenance_jobs
+from utils.outbox import OutboxConsumer, register_submission_handlers
+from utils.logging_config import setup_logging
+from utils.resources import resources, run_bot
+from utils.telegram_transport import application_builder, get_shared_bot
 import asyncio
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
-# Инициализация базы данных
-db = Database()
+# Период для раздела статистики
+STATS_PERIOD_DAYS = 7
 
 async def error_handler(update: Update, context):
     """Обработчик ошибок."""
     logger.error(f"Update {update} caused error {context.error}")
     if update and update.effective_message:
-        await update.effective_message.reply_text(
-            "Произошла ошибка в админ-панели. Пожалуйста, попробуйте позже."
-        )
+        if isinstance(context.error, CircuitOpenError):
+            text = "База данных временно недоступна. Попробуйте через минуту."
+        else:
+            text = "Произошла ошибка в админ-панели. Пожалуйста, попробуйте позже."
+        await update.effective_message.reply_text(text)
 
 async def start(update: Update, context):
     """Обработчик команды /start."""
@@ -49,102 +67,350 @@ async def start(update: Update, context):
     )
     return AdminStates.MAIN_MENU
 
-async def handle_admin_menu(update: Update, context):
-    """Обработчик админ-меню."""
+async def show_next_submission(update: Update, context):
+    """Показывает следующее видео на модерацию."""
     query = update.callback_query
-    await query.answer()
-    
-    if query.data == "moderate_videos":
-        submissions = await db.get_pending_submissions()
-        if submissions:
-            submission = submissions[0]
-            await query.message.edit_text(
-                f"Видео на модерацию:\n\n"
-                f"От пользователя: {submission['user_id']}\n"
-                f"Челлендж: {submission['challenge_id']}\n"
-                f"Отправлено: {submission['submitted_at']}",
-                reply_markup=get_moderation_keyboard(submission['submission_id'])
-            )
-            return AdminStates.MODERATING_VIDEOS
-        else:
-            await query.message.edit_text(
-                "Нет видео на модерацию.",
-                reply_markup=get_admin_menu_keyboard()
-            )
-    
-    elif query.data == "add_challenge":
+    submissions = await resources.db.get_pending_submissions(limit=1)
+    if not submissions:
         await query.message.edit_text(
-            "Создание нового челленджа:\n\n"
-            "1. Отправьте название челленджа:",
+            "Нет видео на модерацию.",
             reply_markup=get_admin_menu_keyboard()
         )
-        return AdminStates.ADDING_CHALLENGE
+        return AdminStates.MAIN_MENU
     
-    elif query.data == "manage_influencers":
-        await query.message.edit_text(
-            "Управление блогерами:\n\n"
-            "1. Добавить блогера\n"
-            "2. Редактировать блогера\n"
-            "3. Удалить блогера",
-            reply_markup=get_admin_menu_keyboard()
-        )
-        return AdminStates.MANAGING_INFLUENCERS
+    submission = submissions[0]
+    await query.message.edit_text(
+        f"Видео на модерацию:\n\n"
+        f"От пользователя: {submission.user_id}\n"
+        f"Челлендж: {submission.challenge_id}\n"
+        f"Отправлено: {submission.submitted_at}",
+        reply_markup=get_moderation_keyboard(submission.submission_id)
+    )
+    return AdminStates.MODERATING_VIDEOS
+
+async def start_challenge_creation(update: Update, context):
+    await update.callback_query.message.edit_text(
+        "Создание нового челленджа:\n\n"
+        "1. Отправьте название челленджа:",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.ADDING_CHALLENGE
+
+async def start_challenge_import(update: Update, context):
+    await update.callback_query.message.edit_text(
+        "Массовый импорт челленджей:\n\n"
+        "Отправьте файл .jsonl или .csv с полями "
+        "title, description, category, difficulty, tags (через ;), media_url.",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.IMPORTING_CHALLENGES
+
+async def export_challenges(update: Update, context):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "challenges.jsonl")
+        exported = await ChallengeExporter(resources.db).export_file(path)
+        with open(path, 'rb') as f:
+            await update.callback_query.message.reply_document(
+                document=f,
+                filename="challenges.jsonl",
+                caption=f"📤 Выгружено челленджей: {exported}"
+            )
+    return AdminStates.MAIN_MENU
+
+async def manage_influencers(update: Update, context):
+    await update.callback_query.message.edit_text(
+        "Управление блогерами:\n\n"
+        "1. Добавить блогера\n"
+        "2. Редактировать блогера\n"
+        "3. Удалить блогера",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MANAGING_INFLUENCERS
+
+async def show_stats_menu(update: Update, context):
+    await update.callback_query.message.edit_text(
+        "Статистика:\n\n"
+        "1. Общая статистика\n"
+        "2. По челленджам\n"
+        "3. По блогерам\n"
+        "4. По виральности",
+        reply_markup=get_stats_keyboard()
+    )
+    return AdminStates.VIEWING_STATS
+
+async def back_to_admin_menu(update: Update, context):
+    await update.callback_query.message.edit_text(
+        "Добро пожаловать в админ-панель!",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MAIN_MENU
+
+# Отчеты раздела статистики: (область, метрика, заголовок, подпись строки)
+STATS_REPORTS = {
+    "challenges": ("challenge", "submissions", "🎯 Топ челленджей за {days} дн.", "Челлендж"),
+    "influencers": ("influencer", "submissions", "👥 Топ блогеров за {days} дн.", "Блогер"),
+    "viral": ("challenge", "views", "🚀 Самые виральные челленджи за {days} дн.", "Челлендж")
+}
+
+async def show_stats_report(update: Update, context, report: str):
+    """Показывает выбранный отчет статистики."""
+    if report == "global":
+        stats = await resources.db.get_activity_stats("global", days=STATS_PERIOD_DAYS)
+        text = format_activity_stats(stats, STATS_PERIOD_DAYS)
+    elif report in STATS_REPORTS:
+        scope, metric, title, label = STATS_REPORTS[report]
+        rows = await resources.db.get_top_activity(scope, STATS_PERIOD_DAYS, metric=metric)
+        text = format_top_activity(title.format(days=STATS_PERIOD_DAYS), rows, label)
+    else:
+        return AdminStates.VIEWING_STATS
     
-    elif query.data == "admin_stats":
-        await query.message.edit_text(
-            "Статистика:\n\n"
-            "1. Общая статистика\n"
-            "2. По челленджам\n"
-            "3. По блогерам\n"
-            "4. По виральности",
-            reply_markup=get_admin_menu_keyboard()
+    await update.callback_query.message.edit_text(text, reply_markup=get_stats_keyboard())
+    return AdminStates.VIEWING_STATS
+
+async def approve_submission(update: Update, context, submission_id: int):
+    await resources.db.update_submission_status(
+        submission_id,
+        "approved",
+        moderator_id=ADMIN_ID
+    )
+    await update.callback_query.message.edit_text(
+        "Видео одобрено!",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MAIN_MENU
+
+async def reject_submission(update: Update, context, submission_id: int):
+    await update.callback_query.message.edit_text(
+        "Укажите причину отказа:",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    context.user_data['rejecting_submission'] = submission_id
+    return AdminStates.REJECTING_VIDEO
+
+async def skip_submission(update: Update, context, submission_id: int):
+    return await show_next_submission(update, context)
+
+async def prefetch_moderation_videos(stop_event: asyncio.Event):
+    """Заранее передает админ-боту видео из начала очереди модерации.
+
+    Видео получены пользовательским ботом, и их file_id админ-боту не
+    подходят. Скачивание и загрузка идут здесь, в фоне, а обработчик пачки
+    берет только готовые file_id. BadRequest (файл больше 20 МБ, файл
+    удален) повтором не лечится: ошибка записывается в видео, и передача
+    больше не повторяется.
+    """
+    admin_bot = get_shared_bot(ADMIN_BOT_TOKEN)
+    user_bot = get_shared_bot(USER_BOT_TOKEN)
+
+    async def prepare(submission):
+        try:
+            await resources.media.file_id_for(
+                admin_bot, submission.video_file_id, user_bot, submission.video_unique_id
+            )
+        except BadRequest as e:
+            logger.warning(f"Video of submission {submission.submission_id} cannot be transferred: {e}")
+            await resources.db.set_submission_media(submission.submission_id, video_error=str(e))
+            return
+        unique_id = resources.media.unique_id_for(submission.video_file_id)
+        if unique_id and not submission.video_unique_id:
+            # Другим репликам file_unique_id нужен, чтобы найти file_id в реестре
+            await resources.db.set_submission_media(submission.submission_id, video_unique_id=unique_id)
+
+    while not stop_event.is_set():
+        try:
+            # Две пачки вперед: следующая пачка модератора уже готова
+            submissions = await resources.db.get_pending_submissions(limit=BATCH_MODERATION_SIZE * 2)
+            results = await asyncio.gather(
+                *(prepare(submission) for submission in submissions if not submission.video_error),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error preparing moderation video: {result}")
+        except Exception as e:
+            logger.error(f"Error in moderation video prefetch: {e}")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=MEDIA_PREFETCH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+async def preview_file_id(context, submission) -> Optional[str]:
+    """Готовый file_id видео для админ-бота или None, пока его не подготовил prefetch."""
+    if submission.video_error:
+        return None
+    try:
+        return await resources.media.known_file_id(
+            context.bot,
+            submission.video_file_id,
+            get_shared_bot(USER_BOT_TOKEN),
+            submission.video_unique_id
         )
-        return AdminStates.VIEWING_STATS
+    except Exception as e:
+        logger.error(f"Error looking up video of submission {submission.submission_id}: {e}")
+        return None
 
-async def handle_moderation(update: Update, context):
-    """Обработчик модерации видео."""
+async def show_moderation_batch(update: Update, context):
+    """Показывает пачку видео на модерацию одной медиагруппой."""
     query = update.callback_query
-    await query.answer()
-    
-    if query.data.startswith("approve_"):
-        submission_id = int(query.data.split("_")[1])
-        await db.update_submission_status(
-            submission_id,
-            "approved",
-            moderator_id=ADMIN_ID
-        )
+    submissions = await resources.db.get_pending_submissions(limit=BATCH_MODERATION_SIZE)
+    if not submissions:
         await query.message.edit_text(
-            "Видео одобрено!",
+            "Нет видео на модерацию.",
             reply_markup=get_admin_menu_keyboard()
         )
         return AdminStates.MAIN_MENU
     
-    elif query.data.startswith("reject_"):
-        submission_id = int(query.data.split("_")[1])
-        await query.message.edit_text(
-            "Укажите причину отказа:",
+    file_ids = await asyncio.gather(*(preview_file_id(context, submission) for submission in submissions))
+    previewed = {index for index, file_id in enumerate(file_ids) if file_id}
+    media = [
+        InputMediaVideo(
+            media=file_id,
+            caption=f"{index}. Пользователь {submission.user_id}, челлендж {submission.challenge_id}"
+        )
+        for index, (submission, file_id) in enumerate(zip(submissions, file_ids), 1)
+        if file_id
+    ]
+    if len(media) == 1:
+        await context.bot.send_video(
+            chat_id=query.message.chat_id,
+            video=media[0].media,
+            caption=media[0].caption
+        )
+    elif media:
+        await context.bot.send_media_group(chat_id=query.message.chat_id, media=media)
+    
+    # Видео без превью модератор не видел: они не отмечены и не попадут в "Выбрать все"
+    missing = [
+        f"{index + 1}. " + (
+            f"⚠️ видео недоступно: {submission.video_error}" if submission.video_error
+            else "⏳ видео еще готовится"
+        )
+        for index, submission in enumerate(submissions)
+        if index not in previewed
+    ]
+    context.user_data['moderation_batch'] = submissions
+    context.user_data['moderation_previewed'] = previewed
+    context.user_data['moderation_selected'] = set(previewed)
+    await query.message.reply_text(
+        f"📦 Видео на модерацию: {len(submissions)}\n"
+        + ("Без превью, не отмечены:\n" + "\n".join(missing) + "\n" if missing else "")
+        + "Отметьте видео и выберите решение:",
+        reply_markup=get_batch_moderation_keyboard(len(submissions), context.user_data['moderation_selected'])
+    )
+    return AdminStates.BATCH_MODERATING
+
+async def apply_batch_decision(context, status: str, reason: Optional[str] = None) -> int:
+    """Применяет решение к выбранным видео. Уведомления и публикацию доставляет outbox."""
+    submissions = context.user_data.pop('moderation_batch', [])
+    selected = context.user_data.pop('moderation_selected', set())
+    context.user_data.pop('moderation_previewed', None)
+    chosen = [submission for index, submission in enumerate(submissions) if index in selected]
+    
+    changed = await resources.db.bulk_update_submission_status(
+        chosen,
+        status,
+        moderator_id=ADMIN_ID,
+        rejection_reason=reason
+    )
+    return len(changed)
+
+async def cancel_batch(update: Update, context):
+    context.user_data.pop('moderation_batch', None)
+    context.user_data.pop('moderation_selected', None)
+    context.user_data.pop('moderation_previewed', None)
+    return await back_to_admin_menu(update, context)
+
+def with_batch(handler):
+    """Передает обработчику текущую пачку и выбор; без пачки возвращает в меню."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context, *args):
+        submissions = context.user_data.get('moderation_batch')
+        if not submissions:
+            return await cancel_batch(update, context)
+        return await handler(update, context, submissions, context.user_data['moderation_selected'], *args)
+    return wrapper
+
+async def refresh_batch_keyboard(update: Update, submissions: list, selected: set):
+    await update.callback_query.message.edit_reply_markup(
+        reply_markup=get_batch_moderation_keyboard(len(submissions), selected)
+    )
+    return AdminStates.BATCH_MODERATING
+
+@with_batch
+async def toggle_batch_item(update: Update, context, submissions: list, selected: set, index: int):
+    selected ^= {index}
+    return await refresh_batch_keyboard(update, submissions, selected)
+
+@with_batch
+async def select_all_batch(update: Update, context, submissions: list, selected: set):
+    selected.update(context.user_data.get('moderation_previewed', range(len(submissions))))
+    return await refresh_batch_keyboard(update, submissions, selected)
+
+@with_batch
+async def select_none_batch(update: Update, context, submissions: list, selected: set):
+    selected.clear()
+    return await refresh_batch_keyboard(update, submissions, selected)
+
+@with_batch
+async def approve_batch(update: Update, context, submissions: list, selected: set):
+    if not selected:
+        return AdminStates.BATCH_MODERATING
+    approved = await apply_batch_decision(context, "approved")
+    await update.callback_query.message.edit_text(
+        f"✅ Одобрено видео: {approved}",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MAIN_MENU
+
+@with_batch
+async def reject_batch(update: Update, context, submissions: list, selected: set):
+    if not selected:
+        return AdminStates.BATCH_MODERATING
+    await update.callback_query.message.edit_text(f"Укажите причину отказа для {len(selected)} видео:")
+    return AdminStates.BATCH_REJECTING
+
+# Роутеры кнопок по состояниям диалога
+menu_router = CallbackRouter()
+menu_router.register(callbacks.MODERATE_VIDEOS, show_next_submission)
+menu_router.register(callbacks.BATCH_MODERATE, show_moderation_batch)
+menu_router.register(callbacks.ADD_CHALLENGE, start_challenge_creation)
+menu_router.register(callbacks.IMPORT_CHALLENGES, start_challenge_import)
+menu_router.register(callbacks.EXPORT_CHALLENGES, export_challenges)
+menu_router.register(callbacks.MANAGE_INFLUENCERS, manage_influencers)
+menu_router.register(callbacks.ADMIN_STATS, show_stats_menu)
+
+stats_router = CallbackRouter()
+stats_router.register(callbacks.STATS_REPORT, show_stats_report)
+stats_router.register(callbacks.BACK_TO_ADMIN_MENU, back_to_admin_menu)
+
+moderation_router = CallbackRouter()
+moderation_router.register(callbacks.APPROVE, approve_submission)
+moderation_router.register(callbacks.REJECT, reject_submission)
+moderation_router.register(callbacks.SKIP, skip_submission)
+
+batch_router = CallbackRouter()
+batch_router.register(callbacks.BATCH_TOGGLE, toggle_batch_item)
+batch_router.register(callbacks.BATCH_ALL, select_all_batch)
+batch_router.register(callbacks.BATCH_NONE, select_none_batch)
+batch_router.register(callbacks.BATCH_APPROVE, approve_batch)
+batch_router.register(callbacks.BATCH_REJECT, reject_batch)
+batch_router.register(callbacks.BATCH_CANCEL, cancel_batch)
+
+async def handle_batch_rejection_reason(update: Update, context):
+    """Обработчик причины отказа для пакета видео."""
+    if not context.user_data.get('moderation_batch'):
+        await update.message.reply_text(
+            "Произошла ошибка. Попробуйте снова.",
             reply_markup=get_admin_menu_keyboard()
         )
-        context.user_data['rejecting_submission'] = submission_id
-        return AdminStates.REJECTING_VIDEO
+        return AdminStates.MAIN_MENU
     
-    elif query.data.startswith("skip_"):
-        submissions = await db.get_pending_submissions()
-        if submissions:
-            submission = submissions[0]
-            await query.message.edit_text(
-                f"Видео на модерацию:\n\n"
-                f"От пользователя: {submission['user_id']}\n"
-                f"Челлендж: {submission['challenge_id']}\n"
-                f"Отправлено: {submission['submitted_at']}",
-                reply_markup=get_moderation_keyboard(submission['submission_id'])
-            )
-        else:
-            await query.message.edit_text(
-                "Нет видео на модерацию.",
-                reply_markup=get_admin_menu_keyboard()
-            )
-            return AdminStates.MAIN_MENU
+    rejected = await apply_batch_decision(context, "rejected", update.message.text)
+    await update.message.reply_text(
+        f"❌ Отклонено видео: {rejected}",
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MAIN_MENU
 
 async def handle_rejection_reason(update: Update, context):
     """Обработчик ввода причины отказа."""
@@ -157,7 +423,7 @@ async def handle_rejection_reason(update: Update, context):
         return AdminStates.MAIN_MENU
     
     reason = update.message.text
-    await db.update_submission_status(
+    await resources.db.update_submission_status(
         submission_id,
         "rejected",
         moderator_id=ADMIN_ID,
@@ -210,7 +476,7 @@ async def handle_challenge_creation(update: Update, context):
                 challenge_data = context.user_data['challenge_data']
                 
                 # Создаем челлендж
-                await db.create_challenge({
+                await resources.db.create_challenge({
                     "title": challenge_data['title'],
                     "description": challenge_data['description'],
                     "category": challenge_data['category'],
@@ -234,10 +500,44 @@ async def handle_challenge_creation(update: Update, context):
                 reply_markup=get_admin_menu_keyboard()
             )
 
-async def main():
+async def handle_challenge_import(update: Update, context):
+    """Обработчик файла для массового импорта челленджей."""
+    document = update.message.document
+    file_name = document.file_name or "challenges.jsonl"
+    if not file_name.lower().endswith(('.jsonl', '.json', '.csv')):
+        await update.message.reply_text(
+            "Поддерживаются только файлы .jsonl и .csv. Попробуйте снова:",
+            reply_markup=get_admin_menu_keyboard()
+        )
+        return AdminStates.IMPORTING_CHALLENGES
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, os.path.basename(file_name))
+        tg_file = await document.get_file()
+        await tg_file.download_to_drive(path)
+        summary = await ChallengeImporter(resources.db, created_by=update.effective_user.id).import_file(path)
+    
+    await update.message.reply_text(
+        summary.format(),
+        reply_markup=get_admin_menu_keyboard()
+    )
+    return AdminStates.MAIN_MENU
+
+async def main(stop_event=None):
     """Запуск бота."""
+    db = resources.db
     try:
-        application = Application.builder().token(ADMIN_BOT_TOKEN).build()
+        application = application_builder(ADMIN_BOT_TOKEN).build()
+        
+        # Обслуживающие задачи выполняются одной репликой за счет аренды в Mongo
+        channel_manager = resources.channel_manager
+        scheduler = JobScheduler(application, db)
+        register_maintenance_jobs(scheduler, db, channel_manager, resources.recommender)
+        scheduler.start()
+        
+        # Побочные эффекты модерации (очки, публикация, уведомления) разбирает outbox
+        outbox = OutboxConsumer(db)
+        register_submission_handlers(outbox, db, channel_manager, resources.notifications)
         
         # Добавляем обработчик ошибок
         application.add_error_handler(error_handler)
@@ -247,16 +547,29 @@ async def main():
             entry_points=[CommandHandler('start', start)],
             states={
                 AdminStates.MAIN_MENU: [
-                    CallbackQueryHandler(handle_admin_menu)
+                    CallbackQueryHandler(menu_router)
                 ],
                 AdminStates.MODERATING_VIDEOS: [
-                    CallbackQueryHandler(handle_moderation)
+                    CallbackQueryHandler(moderation_router)
                 ],
                 AdminStates.REJECTING_VIDEO: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_rejection_reason)
                 ],
+                AdminStates.BATCH_MODERATING: [
+                    CallbackQueryHandler(batch_router)
+                ],
+                AdminStates.BATCH_REJECTING: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, handle_batch_rejection_reason)
+                ],
                 AdminStates.ADDING_CHALLENGE: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_challenge_creation)
+                ],
+                AdminStates.VIEWING_STATS: [
+                    CallbackQueryHandler(stats_router)
+                ],
+                AdminStates.IMPORTING_CHALLENGES: [
+                    MessageHandler(filters.Document.ALL, handle_challenge_import),
+                    CallbackQueryHandler(menu_router)
                 ]
             },
             fallbacks=[CommandHandler('start', start)]
@@ -264,15 +577,33 @@ async def main():
         
         application.add_handler(conv_handler)
         
-        # Запускаем бота
+        # Запускаем бота; TTL-индексы страхуют коллекции от бесконечного роста
         logger.info("Starting Admin Bot...")
-        await application.initialize()
-        await application.start()
-        await application.run_polling(allowed_updates=Update.ALL_TYPES)
+        await run_bot(
+            "admin_bot",
+            application,
+            warm_up={
+                "mongo": resources.warm_mongo,
+                "indexes": db.ensure_indexes,
+                "retention_indexes": lambda: ensure_retention_indexes(db),
+                "scheduler_indexes": scheduler.ensure_indexes
+            },
+            background={
+                "channel_publisher": channel_manager.run_publisher,
+                "outbox": outbox.run,
+                "challenge_counters": db.challenge_counters.run,
+                "media_prefetch": prefetch_moderation_videos
+            },
+            stop_event=stop_event,
+            allowed_updates=Update.ALL_TYPES
+        )
         
     except Exception as e:
         logger.error(f"Error in Admin Bot: {e}")
         raise
+    finally:
+        await db.challenge_counters.flush()
 
 if __name__ == '__main__':
+    setup_logging()
     asyncio.run(main()) 
\ No newline at end of file
@@ -1,13 +1,15 @@
 import logging
 from telegram import Update
-from telegram.ext import Application, CommandHandler
+from telegram.ext import CommandHandler, CallbackQueryHandler, TypeHandler
 from config import INFLUENCER_BOT_TOKEN
+from utils import callbacks
+from utils.callbacks import CallbackRouter
+from utils.keyboards import get_influencer_menu_keyboard
+from utils.helpers import format_influencer_stats
+from utils.logging_config import setup_logging
+from utils.resources import resources, run_bot
+from utils.telegram_transport import application_builder
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 async def start(update: Update, context):
@@ -15,19 +17,40 @@ async def start(update: Update, context):
     user = update.effective_user
     await update.message.reply_text(
         f"Привет, {user.first_name}! 👋\n\n"
-        "Я бот для инфлюенсеров Sparkaph. Рад тебя видеть!"
+        "Я бот для инфлюенсеров Sparkaph. Рад тебя видеть!",
+        reply_markup=get_influencer_menu_keyboard()
     )
 
-async def main():
+async def handle_influencer_stats(update: Update, context):
+    """Показывает дашборд блогера из материализованной статистики."""
+    query = update.callback_query
+    stats = await resources.db.get_influencer_stats(update.effective_user.id)
+    if not stats:
+        text = "📊 Статистика пока не готова. Она обновляется в течение часа после публикации челленджа."
+    else:
+        text = format_influencer_stats(stats)
+    
+    await query.message.edit_text(text, reply_markup=get_influencer_menu_keyboard())
+
+router = CallbackRouter()
+router.register(callbacks.INFLUENCER_STATS, handle_influencer_stats)
+
+async def main(stop_event=None):
     """Запуск бота."""
     try:
-        application = Application.builder().token(INFLUENCER_BOT_TOKEN).build()
+        application = application_builder(INFLUENCER_BOT_TOKEN).build()
+        # Медиа челленджей регистрируется сразу с file_id этого бота
+        application.add_handler(TypeHandler(Update, resources.media.track_media), group=-1)
         application.add_handler(CommandHandler('start', start))
+        application.add_handler(CallbackQueryHandler(router))
         
         logger.info("Starting Influencer Bot...")
-        await application.initialize()
-        await application.start()
-        await application.run_polling()
+        await run_bot(
+            "influencer_bot",
+            application,
+            warm_up={"mongo": resources.warm_mongo},
+            stop_event=stop_event
+        )
         
     except Exception as e:
         logger.error(f"Error in Influencer Bot: {e}")
@@ -35,4 +58,5 @@ async def main():
 
 if __name__ == '__main__':
     import asyncio
-    asyncio.run(main()) 
\ No newline at end of file
+    setup_logging()
+    asyncio.run(main())
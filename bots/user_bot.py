@@ -1,38 +1,125 @@
 import logging
 from telegram import Update
-from telegram.ext import Application, CommandHandler
+from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler, filters
 from config import USER_BOT_TOKEN
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from utils.keyboards import (
+    get_main_menu_keyboard,
+    get_challenge_actions_keyboard,
+    get_search_results_keyboard
 )
+from utils import callbacks
+from utils.callbacks import CallbackRouter
+from utils.helpers import format_challenge_info
+from utils.logging_config import setup_logging
+from utils.resources import resources, run_bot
+from utils.telegram_transport import application_builder
+
 logger = logging.getLogger(__name__)
 
+async def track_activity(update: Update, context):
+    """Отмечает активность пользователя; в базу она попадет со следующим сбросом."""
+    if update.effective_user:
+        resources.db.heartbeats.touch(update.effective_user.id)
+
 async def start(update: Update, context):
     """Обработчик команды /start."""
     user = update.effective_user
     await update.message.reply_text(
         f"Привет, {user.first_name}! 👋\n\n"
-        "Я бот Sparkaph. Рад тебя видеть!"
+        "Я бот Sparkaph. Рад тебя видеть!",
+        reply_markup=get_main_menu_keyboard()
     )
 
-async def main():
+async def random_challenge(update: Update, context):
+    """Обработчик кнопки "Рандом челлендж"."""
+    challenge = await resources.recommender.pick(update.effective_user.id)
+    if not challenge:
+        await update.message.reply_text("🎉 Вы прошли все доступные челленджи! Скоро появятся новые.")
+        return
+    
+    await send_challenge_card(update.message, challenge)
+
+async def send_challenge_card(message, challenge):
+    """Показывает карточку челленджа и засчитывает просмотр."""
+    resources.db.challenge_counters.incr(challenge.challenge_id, "views_count")
+    # Показываем цифры с учетом еще не записанных дельт
+    info = challenge.dict()
+    for field, delta in resources.db.challenge_counters.pending(challenge.challenge_id).items():
+        info[field] += delta
+    await message.reply_text(
+        format_challenge_info(info),
+        reply_markup=get_challenge_actions_keyboard(challenge.challenge_id)
+    )
+
+async def search(update: Update, context):
+    """Обработчик команды /search: поиск по названию, описанию и тегам."""
+    query = " ".join(context.args)
+    if not query:
+        await update.message.reply_text("🔎 Напишите, что искать: /search танцы")
+        return
+
+    await resources.search_index.refresh()
+    results = resources.search_index.search(query)
+    if not results:
+        await update.message.reply_text("😔 Ничего не нашлось. Попробуйте другие слова.")
+        return
+
+    await update.message.reply_text(
+        f"🔎 Нашлось по запросу «{query}»:",
+        reply_markup=get_search_results_keyboard(results)
+    )
+
+async def open_challenge(update: Update, context, challenge_id: int):
+    """Открывает челлендж из результатов поиска."""
+    query = update.callback_query
+    challenge = await resources.db.get_challenge(challenge_id)
+    if not challenge or not challenge.is_active:
+        await query.message.reply_text("Этот челлендж больше недоступен.")
+        return
+    await send_challenge_card(query.message, challenge)
+
+router = CallbackRouter()
+router.register(callbacks.OPEN_CHALLENGE, open_challenge)
+
+async def main(stop_event=None):
     """Запуск бота."""
+    db = resources.db
     try:
-        application = Application.builder().token(USER_BOT_TOKEN).build()
+        application = application_builder(USER_BOT_TOKEN).build()
+        # Группа -1 видит каждый апдейт раньше остальных обработчиков
+        application.add_handler(TypeHandler(Update, track_activity), group=-1)
+        application.add_handler(TypeHandler(Update, resources.media.track_media), group=-1)
         application.add_handler(CommandHandler('start', start))
+        application.add_handler(MessageHandler(filters.Regex("^🎲 Рандом челлендж$"), random_challenge))
+        application.add_handler(CommandHandler('search', search))
+        application.add_handler(CallbackQueryHandler(router, pattern=router.matches))
         
         logger.info("Starting User Bot...")
-        await application.initialize()
-        await application.start()
-        await application.run_polling()
+        # getMe, пул Mongo, каталог, поисковый индекс и лидерборд прогреваются параллельно
+        await run_bot(
+            "user_bot",
+            application,
+            warm_up={
+                "mongo": resources.warm_mongo,
+                "recommender_indexes": resources.recommender.ensure_indexes,
+                "catalog": resources.recommender.warm_up,
+                "search_index": lambda: resources.search_index.refresh(force=True),
+                "leaderboard": db.get_top_users
+            },
+            optional=("catalog", "search_index", "leaderboard"),
+            background={"heartbeats": db.heartbeats.run, "challenge_counters": db.challenge_counters.run},
+            stop_event=stop_event
+        )
         
     except Exception as e:
         logger.error(f"Error in User Bot: {e}")
         raise
+    finally:
+        # Не теряем отметки активности и счетчики, накопленные с последнего сброса
+        await db.heartbeats.flush()
+        await db.challenge_counters.flush()
 
 if __name__ == '__main__':
     import asyncio
-    asyncio.run(main()) 
\ No newline at end of file
+    setup_logging()
+    asyncio.run(main())
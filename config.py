@@ -13,6 +13,11 @@ INFLUENCER_BOT_TOKEN = os.getenv('INFLUENCER_BOT_TOKEN')
 MONGODB_URI = os.getenv('MONGODB_URI')
 DATABASE_NAME = 'Sparkaph'
 
+# Маршрутизация чтений: аналитика читает со вторичных узлов набора реплик.
+# Отставание ограничивается в секундах, минимально допустимое значение — 90
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_ANALYTICS_MAX_STALENESS = int(os.getenv('MONGO_ANALYTICS_MAX_STALENESS', 90))
+
 # Настройки канала
 CHANNEL_ID = os.getenv('CHANNEL_ID')
 
@@ -59,4 +64,136 @@ BADGES = {
 }
 
 # Настройки для модерации
-MODERATION_TIMEOUT = 24 * 60 * 60  # 24 часа в секундах 
\ No newline at end of file
+MODERATION_TIMEOUT = 24 * 60 * 60  # 24 часа в секундах 
+
+# Входящие уведомления: сколько хранить на пользователя и сколько показывать на странице
+NOTIFICATIONS_INBOX_CAP = int(os.getenv('NOTIFICATIONS_INBOX_CAP', 200))
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv('NOTIFICATIONS_PAGE_SIZE', 20))
+
+# Настройки хранения данных
+NOTIFICATIONS_READ_RETENTION_DAYS = int(os.getenv('NOTIFICATIONS_READ_RETENTION_DAYS', 30))
+ERROR_LOGS_RETENTION_DAYS = int(os.getenv('ERROR_LOGS_RETENTION_DAYS', 14))
+# Запас для TTL-индексов: Mongo удаляет документы только если архиватор не успел
+RETENTION_TTL_GRACE_DAYS = int(os.getenv('RETENTION_TTL_GRACE_DAYS', 7))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+# Размер блока идентификаторов, резервируемого процессом за один запрос
+SEQUENCE_BLOCK_SIZE = int(os.getenv('SEQUENCE_BLOCK_SIZE', 100))
+
+# Максимальный возраст материализованной статистики блогера в секундах
+INFLUENCER_STATS_MAX_AGE = int(os.getenv('INFLUENCER_STATS_MAX_AGE', 60 * 60))
+
+# Настройки рекомендаций "Рандом челлендж"
+RECOMMENDER_POOL_SIZE = int(os.getenv('RECOMMENDER_POOL_SIZE', 20))
+RECOMMENDER_POOL_LOW_WATER = int(os.getenv('RECOMMENDER_POOL_LOW_WATER', 5))
+RECOMMENDER_CATALOG_TTL = int(os.getenv('RECOMMENDER_CATALOG_TTL', 5 * 60))
+RECOMMENDER_REFILL_BATCH_SIZE = int(os.getenv('RECOMMENDER_REFILL_BATCH_SIZE', 100))
+
+# Сколько множеств пройденных челленджей держать в памяти процесса
+COMPLETIONS_CACHE_SIZE = int(os.getenv('COMPLETIONS_CACHE_SIZE', 10000))
+COMPLETIONS_CACHE_TTL = float(os.getenv('COMPLETIONS_CACHE_TTL', 60))  # секунд
+
+# Настройки очереди публикаций в канал
+CHANNEL_POST_INTERVAL = float(os.getenv('CHANNEL_POST_INTERVAL', 3.0))  # секунд между постами
+CHANNEL_ALBUM_MAX_SIZE = 10  # ограничение Telegram на медиагруппу
+CHANNEL_PUBLISH_MAX_ATTEMPTS = int(os.getenv('CHANNEL_PUBLISH_MAX_ATTEMPTS', 8))
+CHANNEL_PUBLISH_BACKOFF_BASE = 5  # секунд
+CHANNEL_PUBLISH_BACKOFF_MAX = 60 * 60  # секунд
+
+# Расписания периодических задач (cron, время UTC), пустая строка отключает задачу
+GLOBAL_STATS_CRON = os.getenv('GLOBAL_STATS_CRON', '*/10 * * * *')
+MODERATION_EXPIRY_CRON = os.getenv('MODERATION_EXPIRY_CRON', '*/15 * * * *')
+STREAK_ROLLOVER_CRON = os.getenv('STREAK_ROLLOVER_CRON', '5 0 * * *')
+LEADERBOARD_DAY_RESET_CRON = os.getenv('LEADERBOARD_DAY_RESET_CRON', '0 0 * * *')
+LEADERBOARD_WEEK_RESET_CRON = os.getenv('LEADERBOARD_WEEK_RESET_CRON', '0 0 * * 1')
+RETENTION_ARCHIVE_CRON = os.getenv('RETENTION_ARCHIVE_CRON', '30 3 * * *')
+INFLUENCER_STATS_CRON = os.getenv('INFLUENCER_STATS_CRON', '*/10 * * * *')
+ROLLUP_BACKFILL_CRON = os.getenv('ROLLUP_BACKFILL_CRON', '15 4 * * *')
+RECOMMENDER_REFILL_CRON = os.getenv('RECOMMENDER_REFILL_CRON', '*/5 * * * *')
+RECONCILE_CRON = os.getenv('RECONCILE_CRON', '45 4 * * *')
+# Bot API не отдает просмотры постов канала, поэтому задача выключена по умолчанию
+VIDEO_STATS_CRON = os.getenv('VIDEO_STATS_CRON', '')
+# Выгрузка для аналитики пишет на локальный диск, поэтому выключена по умолчанию
+ANALYTICS_EXPORT_CRON = os.getenv('ANALYTICS_EXPORT_CRON', '')
+
+# Пакетная модерация
+BATCH_MODERATION_SIZE = int(os.getenv('BATCH_MODERATION_SIZE', 10))  # не больше 10 видео в медиагруппе
+NOTIFICATION_CONCURRENCY = int(os.getenv('NOTIFICATION_CONCURRENCY', 10))
+
+# Outbox событий жизненного цикла видео
+POINTS_PER_APPROVAL = int(os.getenv('POINTS_PER_APPROVAL', 10))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+
+# Сверка денормализованных счетчиков
+RECONCILE_CHUNK_SIZE = int(os.getenv('RECONCILE_CHUNK_SIZE', 1000))
+
+# Предохранители внешних зависимостей (Mongo, Bot API)
+CIRCUIT_WINDOW = float(os.getenv('CIRCUIT_WINDOW', 30))  # окно статистики, секунд
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 20))
+CIRCUIT_FAILURE_RATE = float(os.getenv('CIRCUIT_FAILURE_RATE', 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', 2))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv('CIRCUIT_SLOW_CALL_RATE', 0.5))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 15))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', 3))
+# Сколько ждать ответа Mongo на экранах только для чтения, прежде чем показать кеш
+MONGO_READ_TIMEOUT = float(os.getenv('MONGO_READ_TIMEOUT', 3))
+
+# Общий транспорт Bot API: пул соединений на токен и лимиты исходящих запросов
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', 32))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))  # сообщений в секунду на бота
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))  # сообщений в секунду в личный чат
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+TELEGRAM_GROUP_RATE_PER_MINUTE = int(os.getenv('TELEGRAM_GROUP_RATE_PER_MINUTE', 20))
+TELEGRAM_MAX_PARK_SECONDS = float(os.getenv('TELEGRAM_MAX_PARK_SECONDS', 10))
+
+# Кеш пользователей в памяти процесса
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 100000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))  # секунд
+
+# Отложенная запись активности пользователей
+HEARTBEAT_FLUSH_SECONDS = float(os.getenv('HEARTBEAT_FLUSH_SECONDS', 5))
+HEARTBEAT_MAX_PENDING = int(os.getenv('HEARTBEAT_MAX_PENDING', 10000))
+
+# Буферизованные счетчики челленджей (просмотры, прохождения)
+COUNTER_FLUSH_SECONDS = float(os.getenv('COUNTER_FLUSH_SECONDS', 5))
+COUNTER_MAX_PENDING = int(os.getenv('COUNTER_MAX_PENDING', 10000))
+
+# Поиск челленджей
+SEARCH_REFRESH_SECONDS = int(os.getenv('SEARCH_REFRESH_SECONDS', 30))
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 5))
+SEARCH_WATERMARK_LAG = int(os.getenv('SEARCH_WATERMARK_LAG', 300))  # секунд: импорт и часы других хостов отстают
+SEARCH_REBUILD_SECONDS = int(os.getenv('SEARCH_REBUILD_SECONDS', 3600))  # полное перечитывание челленджей
+
+# Трассировка апдейтов (по умолчанию выключена)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0))  # доля апдейтов, 0..1
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 0))  # выгружать апдейты медленнее, 0 — выкл
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', 50 * 1024 * 1024))
+TRACE_FILE_BACKUPS = int(os.getenv('TRACE_FILE_BACKUPS', 5))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'sparkaph')
+
+# Логирование
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FILE = os.getenv('LOG_FILE', '')  # пусто — только stderr
+
+# Запуск и проверки здоровья (/healthz, /readyz)
+HEALTH_PORT = int(os.getenv('PORT', 8080))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))  # секунд на ping Mongo в /readyz
+MONGO_WARM_CONNECTIONS = int(os.getenv('MONGO_WARM_CONNECTIONS', 4))  # соединений пула, открываемых при старте
+
+# Выгрузка для аналитики (CSV.gz и Parquet по дням)
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')  # общий для всех реплик каталог
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))  # документов в пачке курсора
+EXPORT_ROW_GROUP_SIZE = int(os.getenv('EXPORT_ROW_GROUP_SIZE', 20000))  # строк в памяти на открытый день
+EXPORT_MAX_OPEN_PARTITIONS = int(os.getenv('EXPORT_MAX_OPEN_PARTITIONS', 16))
+EXPORT_WATERMARK_LAG = int(os.getenv('EXPORT_WATERMARK_LAG', 180))  # секунд, больше MONGO_ANALYTICS_MAX_STALENESS
+
+# Реестр медиа: file_id одного файла для каждого бота
+MEDIA_STORAGE_CHAT_ID = int(os.getenv('MEDIA_STORAGE_CHAT_ID', ADMIN_ID))  # куда целевой бот загружает копию
+MEDIA_TRANSFER_CONCURRENCY = int(os.getenv('MEDIA_TRANSFER_CONCURRENCY', 2))  # одновременных перезагрузок
+MEDIA_TRANSFER_TIMEOUT = float(os.getenv('MEDIA_TRANSFER_TIMEOUT', 120))  # секунд на скачивание и загрузку
+MEDIA_CACHE_SIZE = int(os.getenv('MEDIA_CACHE_SIZE', 10000))
+MEDIA_PREFETCH_INTERVAL = float(os.getenv('MEDIA_PREFETCH_INTERVAL', 15))  # секунд между подготовками очереди модерации
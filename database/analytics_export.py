@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    EXPORT_DIR,
+    EXPORT_BATCH_SIZE,
+    EXPORT_ROW_GROUP_SIZE,
+    EXPORT_MAX_OPEN_PARTITIONS,
+    EXPORT_WATERMARK_LAG
+)
+from utils.logging_config import setup_logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet необязателен: без pyarrow пишется только CSV
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "parquet")
+
+# Наборы данных: откуда читать, по какому полю резать на дни и по какому
+# выбирать измененное с прошлой выгрузки. Поля перечислены явно: в выгрузку
+# не попадают file_id, тексты отказов и имена пользователей.
+EXPORT_DATASETS: Dict[str, Dict[str, Any]] = {
+    "submissions": {
+        "collection": "submissions",
+        "partition": "submitted_at",
+        "watermark": "last_updated",
+        "fields": {
+            "submission_id": int,
+            "user_id": int,
+            "challenge_id": int,
+            "status": str,
+            "submitted_at": datetime,
+            "moderated_at": datetime,
+            "moderator_id": int,
+            "published_at": datetime,
+            "channel_message_id": int,
+            "likes_count": int,
+            "views_count": int,
+            "last_updated": datetime
+        }
+    },
+    "users": {
+        "collection": "users",
+        "partition": "created_at",
+        # У пользователя нет last_updated; изменения без активности догонит полная выгрузка
+        "watermark": "last_active",
+        "fields": {
+            "user_id": int,
+            "language_code": str,
+            "created_at": datetime,
+            "last_active": datetime,
+            "updates_count": int,
+            "completed_count": int,
+            "streak_days": int,
+            "badges": list,
+            "referred_by": int,
+            "is_influencer": bool,
+            "influencer_category": str
+        }
+    },
+    "challenges": {
+        "collection": "challenges",
+        "partition": "created_at",
+        "watermark": "last_updated",
+        "fields": {
+            "challenge_id": int,
+            "title": str,
+            "category": str,
+            "created_by": int,
+            "created_at": datetime,
+            "difficulty": int,
+            "tags": list,
+            "is_active": bool,
+            "views_count": int,
+            "completions_count": int,
+            "last_updated": datetime
+        }
+    },
+    "activity_rollups": {
+        "collection": "activity_rollups",
+        "partition": "hour",
+        "watermark": "last_updated",
+        "fields": {
+            "entity_type": str,
+            "entity_id": int,
+            "hour": datetime,
+            "submissions": int,
+            "approved": int,
+            "views": int,
+            "likes": int,
+            "last_updated": datetime
+        }
+    }
+}
+
+
+def _coerce(value: Any, field_type: type) -> Any:
+    """Приводит значение к типу колонки: старые документы бывают записаны иначе."""
+    if value is None:
+        return None
+    if field_type is datetime:
+        return value if isinstance(value, datetime) else None
+    if field_type is list:
+        return [str(item) for item in value] if isinstance(value, list) else None
+    try:
+        return field_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ";".join(value)
+    return value
+
+
+def parquet_schema(fields: Dict[str, type]):
+    types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp("ms"),
+        list: pa.list_(pa.string())
+    }
+    return pa.schema([(name, types[field_type]) for name, field_type in fields.items()])
+
+
+class _PartitionFile:
+    """Открытый файл одного дня: CSV.gz и/или Parquet, пишется группами строк."""
+
+    def __init__(self, directory: str, partition: str, name: str, fields: Dict[str, type], formats: Tuple[str, ...], schema):
+        self.paths: List[Tuple[str, str]] = []
+        self.rows: List[tuple] = []
+        self._csv = None
+        self._csv_file = None
+        self._parquet = None
+        self._schema = schema
+        if "csv" in formats:
+            temp, final = self._reserve(directory, "csv", partition, f"{name}.csv.gz")
+            self._csv_file = gzip.open(temp, "wt", encoding="utf-8", newline="", compresslevel=6)
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(list(fields))
+        if "parquet" in formats:
+            temp, final = self._reserve(directory, "parquet", partition, f"{name}.parquet")
+            self._parquet = pq.ParquetWriter(temp, schema, compression="zstd")
+
+    def _reserve(self, directory: str, fmt: str, partition: str, file_name: str) -> Tuple[str, str]:
+        # Форматы в разных деревьях: читатели Parquet не спотыкаются о CSV.
+        # Пока файл пишется, он скрыт от читателей (точка в начале имени).
+        partition_dir = os.path.join(directory, fmt, partition)
+        os.makedirs(partition_dir, exist_ok=True)
+        paths = (os.path.join(partition_dir, f".{file_name}.inprogress"), os.path.join(partition_dir, file_name))
+        self.paths.append(paths)
+        return paths
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        if self._csv:
+            self._csv.writerows([_csv_value(value) for value in row] for row in self.rows)
+        if self._parquet:
+            columns = list(zip(*self.rows))
+            self._parquet.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema
+            ))
+        self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        if self._csv_file:
+            self._csv_file.close()
+        if self._parquet:
+            self._parquet.close()
+
+
+class PartitionedWriter:
+    """Раскладывает поток строк по дням: <dir>/<формат>/date=YYYY-MM-DD/part-<run>-<n>.<ext>.
+
+    Строки идут в порядке курсора, а не по датам, поэтому открыто сразу
+    несколько дней. Их число ограничено max_open: самый давно не
+    использованный день закрывается, а его следующие строки попадут в новый
+    part-файл. Каждый открытый день держит в памяти не больше row_group_size
+    строк, так что память не зависит от объема выгрузки.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        run_id: str,
+        fields: Dict[str, type],
+        formats: Tuple[str, ...],
+        row_group_size: int = EXPORT_ROW_GROUP_SIZE,
+        max_open: int = EXPORT_MAX_OPEN_PARTITIONS
+    ):
+        self.directory = directory
+        self.run_id = run_id
+        self.fields = fields
+        self.formats = formats
+        self.row_group_size = row_group_size
+        self.max_open = max_open
+        self.schema = parquet_schema(fields) if "parquet" in formats else None
+        self._open: "OrderedDict[str, _PartitionFile]" = OrderedDict()
+        self._closed: List[_PartitionFile] = []
+        self._sequence = 0
+        self.rows = 0
+
+    def _file_for(self, day: str) -> _PartitionFile:
+        partition = self._open.get(day)
+        if partition is not None:
+            self._open.move_to_end(day)
+            return partition
+        if len(self._open) >= self.max_open:
+            _, evicted = self._open.popitem(last=False)
+            evicted.close()
+            self._closed.append(evicted)
+        self._sequence += 1
+        partition = self._open[day] = _PartitionFile(
+            self.directory, f"date={day}", f"part-{self.run_id}-{self._sequence:05d}",
+            self.fields, self.formats, self.schema
+        )
+        return partition
+
+    def write_many(self, rows: Iterable[Tuple[str, tuple]]) -> None:
+        """Дописывает пачку (день, строка). Выполняется в пуле потоков."""
+        for day, row in rows:
+            partition = self._file_for(day)
+            partition.rows.append(row)
+            if len(partition.rows) >= self.row_group_size:
+                partition.flush()
+            self.rows += 1
+
+    def _all_files(self) -> List[_PartitionFile]:
+        return self._closed + list(self._open.values())
+
+    def commit(self) -> int:
+        """Закрывает файлы и делает их видимыми. Возвращает число файлов."""
+        for partition in self._open.values():
+            partition.close()
+        count = 0
+        for partition in self._all_files():
+            for temp, final in partition.paths:
+                os.replace(temp, final)
+                count += 1
+        return count
+
+    def abort(self) -> None:
+        """Удаляет недописанные файлы: следующая выгрузка повторит тот же интервал."""
+        for partition in self._all_files():
+            try:
+                partition.close()
+            except Exception:
+                pass
+            for temp, _ in partition.paths:
+                if os.path.exists(temp):
+                    os.remove(temp)
+
+
+class AnalyticsExporter:
+    """Потоковая выгрузка коллекций для аналитики в файлы по дням.
+
+    Читает со вторичных узлов (маршрут analytics) пачками по batch_size
+    с проекцией только нужных полей, пока предыдущая пачка сжимается и
+    пишется в пуле потоков; сортировки в памяти сервера нет. Инкрементальная
+    выгрузка берет документы с полем водяного знака не старше прошлой
+    отметки; новой отметкой становится время старта минус
+    EXPORT_WATERMARK_LAG, чтобы отставание реплики и незакоммиченные записи
+    не потерялись. Документ может попасть в две выгрузки — при чтении
+    побеждает строка с большим значением водяного поля. Отметки хранятся
+    в коллекции export_state, а не рядом с файлами: по расписанию выгрузку
+    выполняет та реплика, что захватила аренду, и каталог выгрузки должен
+    быть общим для всех реплик.
+    """
+
+    def __init__(
+        self,
+        db,
+        directory: str = EXPORT_DIR,
+        formats: Iterable[str] = FORMATS,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ):
+        self.db = db
+        self.state = db.db.export_state
+        self.directory = directory
+        self.batch_size = batch_size
+        formats = tuple(formats)
+        if "parquet" in formats and pq is None:
+            logger.warning("pyarrow is not installed, exporting CSV only")
+            formats = tuple(fmt for fmt in formats if fmt != "parquet") or ("csv",)
+        self.formats = formats
+
+    async def load_watermark(self, dataset: str) -> Optional[datetime]:
+        state = await self.state.find_one({"_id": dataset}, {"watermark": 1})
+        return state["watermark"] if state else None
+
+    async def _save_watermark(self, dataset: str, watermark: datetime, summary: Dict[str, Any]) -> None:
+        await self.state.update_one(
+            {"_id": dataset},
+            {"$set": {**summary, "watermark": watermark, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def ensure_indexes(self) -> None:
+        """Индексы по полям водяного знака, чтобы инкрементальное чтение не сканировало коллекцию."""
+        for spec in EXPORT_DATASETS.values():
+            await self.db.db[spec["collection"]].create_index(spec["watermark"])
+
+    async def export(self, dataset: str, full: bool = False) -> Dict[str, Any]:
+        """Выгружает один набор данных; full игнорирует водяной знак."""
+        spec = EXPORT_DATASETS[dataset]
+        fields: Dict[str, type] = spec["fields"]
+        started = datetime.utcnow()
+        run_id = started.strftime("%Y%m%dT%H%M%S")
+        since = None if full else await self.load_watermark(dataset)
+        next_watermark = started - timedelta(seconds=EXPORT_WATERMARK_LAG)
+
+        query = {spec["watermark"]: {"$gte": since}} if since else {}
+        projection = {"_id": 0, **{name: 1 for name in fields}}
+        cursor = self.db.analytics[spec["collection"]].find(query, projection=projection).batch_size(self.batch_size)
+        if not since:
+            # Полная выгрузка идет по индексу _id: это порядок вставки, он близок к дате
+            # партиции, поэтому дни открываются по очереди, а не вперемешку
+            cursor = cursor.sort("_id", 1)
+
+        writer = PartitionedWriter(os.path.join(self.directory, dataset), run_id, fields, self.formats)
+        loop = asyncio.get_running_loop()
+        pending_write: Optional[asyncio.Future] = None
+        batch: List[Tuple[str, tuple]] = []
+        try:
+            async for doc in cursor:
+                date = doc.get(spec["partition"])
+                day = date.strftime("%Y-%m-%d") if isinstance(date, datetime) else "unknown"
+                batch.append((day, tuple(_coerce(doc.get(name), field_type) for name, field_type in fields.items())))
+                if len(batch) >= self.batch_size:
+                    # Не больше одной пачки в записи: чтение следующей идет параллельно
+                    if pending_write:
+                        await pending_write
+                    pending_write = loop.run_in_executor(None, writer.write_many, batch)
+                    batch = []
+            if pending_write:
+                await pending_write
+            await loop.run_in_executor(None, writer.write_many, batch)
+            files = await loop.run_in_executor(None, writer.commit)
+        except BaseException:
+            if pending_write and not pending_write.done():
+                await asyncio.wait([pending_write])
+            await loop.run_in_executor(None, writer.abort)
+            raise
+
+        summary = {
+            "dataset": dataset,
+            "since": since.isoformat() if since else None,
+            "watermark": next_watermark.isoformat(),
+            "rows": writer.rows,
+            "files": files,
+            "formats": list(self.formats),
+            "seconds": round((datetime.utcnow() - started).total_seconds(), 3)
+        }
+        await self._save_watermark(dataset, next_watermark, summary)
+        logger.info(f"Exported {writer.rows} {dataset} rows into {files} files since {summary['since']}")
+        return summary
+
+    async def run(self, datasets: Iterable[str] = tuple(EXPORT_DATASETS), full: bool = False) -> Dict[str, Any]:
+        """Выгружает наборы по очереди: одна выгрузка за раз меньше нагружает реплику."""
+        return {dataset: await self.export(dataset, full=full) for dataset in datasets}
+
+
+async def main():
+    """Выгрузка для аналитики из командной строки."""
+    from database.operations import Database
+
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка коллекций в CSV.gz/Parquet по дням")
+    parser.add_argument(
+        "--dataset", action="append", choices=list(EXPORT_DATASETS),
+        help="Набор данных, можно повторять (по умолчанию все)"
+    )
+    parser.add_argument("--full", action="store_true", help="Выгрузить все, игнорируя водяной знак")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default="both")
+    parser.add_argument("--dir", default=EXPORT_DIR, help="Каталог выгрузки")
+    parser.add_argument("--ensure-indexes", action="store_true", help="Создать индексы по полям водяного знака")
+    args = parser.parse_args()
+
+    formats = FORMATS if args.format == "both" else (args.format,)
+    exporter = AnalyticsExporter(Database(), directory=args.dir, formats=formats)
+    if args.ensure_indexes:
+        await exporter.ensure_indexes()
+    result = await exporter.run(args.dataset or list(EXPORT_DATASETS), full=args.full)
+    for dataset, summary in result.items():
+        print(f"{dataset:<18} {summary['rows']:>10} rows {summary['files']:>5} files {summary['seconds']:>8}s")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import logging
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from config import COMPLETIONS_CACHE_SIZE, COMPLETIONS_CACHE_TTL
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 500
+DUPLICATE_KEY_ERROR = 11000
+
+
+class CompletionSet:
+    """Компактное множество пройденных челленджей: отсортированный массив int64.
+
+    Проверка "пройден ли челлендж" — бинарный поиск, количество — длина массива,
+    на каждый элемент уходит 8 байт вместо ~36 у int в списке.
+    """
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, challenge_ids: Iterable[int] = ()):
+        self._ids = array("q", sorted(set(challenge_ids)))
+
+    def __contains__(self, challenge_id: int) -> bool:
+        index = bisect_left(self._ids, challenge_id)
+        return index < len(self._ids) and self._ids[index] == challenge_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, challenge_id: int) -> bool:
+        if challenge_id in self:
+            return False
+        insort(self._ids, challenge_id)
+        return True
+
+
+class CompletionStore:
+    """Пройденные челленджи в отдельной коллекции с кешем множеств в памяти.
+
+    Прохождения записывает outbox на любой реплике, поэтому кеш процесса
+    может отставать: множество живет не дольше COMPLETIONS_CACHE_TTL
+    секунд, а has() перепроверяет отрицательный ответ кеша по индексу.
+    """
+
+    def __init__(
+        self,
+        collection,
+        cache_size: int = COMPLETIONS_CACHE_SIZE,
+        ttl: float = COMPLETIONS_CACHE_TTL
+    ):
+        self.collection = collection
+        self.cache_size = cache_size
+        self.ttl = ttl
+        # user_id -> (момент истечения по time.monotonic, множество)
+        self._cache: "OrderedDict[int, Tuple[float, CompletionSet]]" = OrderedDict()
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index(
+            [("user_id", ASCENDING), ("challenge_id", ASCENDING)], unique=True
+        )
+        await self.collection.create_index([("challenge_id", ASCENDING)])
+
+    def _remember(self, user_id: int, completions: CompletionSet) -> None:
+        self._cache[user_id] = (time.monotonic() + self.ttl, completions)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _cached(self, user_id: int) -> Optional[CompletionSet]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return entry[1]
+
+    async def load(self, user_id: int) -> CompletionSet:
+        """Возвращает множество пройденных челленджей пользователя."""
+        cached = self._cached(user_id)
+        if cached is not None:
+            return cached
+        cursor = self.collection.find(
+            {"user_id": user_id}, projection={"_id": 0, "challenge_id": 1}
+        )
+        completions = CompletionSet([doc["challenge_id"] async for doc in cursor])
+        self._remember(user_id, completions)
+        return completions
+
+    async def load_many(self, user_ids: List[int]) -> Dict[int, CompletionSet]:
+        """Загружает множества для пачки пользователей одним запросом."""
+        result = {}
+        for user_id in user_ids:
+            cached = self._cached(user_id)
+            if cached is not None:
+                result[user_id] = cached
+        missing = [user_id for user_id in user_ids if user_id not in result]
+        if missing:
+            grouped: Dict[int, List[int]] = {user_id: [] for user_id in missing}
+            cursor = self.collection.find(
+                {"user_id": {"$in": missing}},
+                projection={"_id": 0, "user_id": 1, "challenge_id": 1}
+            )
+            async for doc in cursor:
+                grouped[doc["user_id"]].append(doc["challenge_id"])
+            for user_id, challenge_ids in grouped.items():
+                result[user_id] = CompletionSet(challenge_ids)
+                self._remember(user_id, result[user_id])
+        return result
+
+    async def add(self, user_id: int, challenge_id: int) -> bool:
+        """Отмечает челлендж пройденным. Возвращает False, если он уже был пройден."""
+        try:
+            await self.collection.insert_one({
+                "user_id": user_id,
+                "challenge_id": challenge_id,
+                "completed_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            return False
+        cached = self._cached(user_id)
+        if cached is not None:
+            cached.add(challenge_id)
+        return True
+
+    async def has(self, user_id: int, challenge_id: int) -> bool:
+        # Пройденный челлендж пройденным и останется, а отсутствие в кеше
+        # может быть устаревшим: его проверяем точечным запросом
+        cached = self._cached(user_id)
+        if cached is not None and challenge_id in cached:
+            return True
+        found = await self.collection.find_one(
+            {"user_id": user_id, "challenge_id": challenge_id}, projection={"_id": 1}
+        )
+        if found and cached is not None:
+            cached.add(challenge_id)
+        return found is not None
+
+
+async def migrate_embedded_completions(db, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Переносит User.completed_challenges в коллекцию challenge_completions пачками.
+
+    Повторный запуск безопасен: уже перенесенные пары отсекаются уникальным индексом.
+    """
+    await db.completions.ensure_indexes()
+    migrated = 0
+    cursor = db.users.find(
+        {"completed_challenges": {"$exists": True}},
+        projection={"_id": 0, "user_id": 1, "completed_challenges": 1}
+    ).batch_size(batch_size)
+
+    batch: List[dict] = []
+    async for user in cursor:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            migrated += await _migrate_batch(db, batch)
+            batch = []
+    if batch:
+        migrated += await _migrate_batch(db, batch)
+
+    logger.info(f"Migrated completions of {migrated} users")
+    return migrated
+
+
+async def _migrate_batch(db, users: List[dict]) -> int:
+    now = datetime.utcnow()
+    docs = [
+        {"user_id": user["user_id"], "challenge_id": challenge_id, "completed_at": now}
+        for user in users
+        for challenge_id in set(user.get("completed_challenges") or [])
+    ]
+    inserted = {user["user_id"]: 0 for user in users}
+    failed = set()
+    if docs:
+        try:
+            await db.challenge_completions.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            failed = {error["index"] for error in errors}
+    for index, doc in enumerate(docs):
+        if index not in failed:
+            inserted[doc["user_id"]] += 1
+
+    await db.users.bulk_write([
+        UpdateOne(
+            {"user_id": user_id},
+            {"$inc": {"completed_count": count}, "$unset": {"completed_challenges": ""}}
+        )
+        for user_id, count in inserted.items()
+    ], ordered=False)
+    return len(users)
+
+
+async def main():
+    """Миграция пройденных челленджей из командной строки."""
+    from database.operations import Database
+
+    parser = argparse.ArgumentParser(description="Перенос пройденных челленджей в отдельную коллекцию")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = Database()
+    print(f"Migrated users: {await migrate_embedded_completions(db, args.batch_size)}")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from config import HEARTBEAT_FLUSH_SECONDS, HEARTBEAT_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatBuffer:
+    """Отложенная запись last_active и счетчика апдейтов пользователя.
+
+    Каждый апдейт только отмечает пользователя в памяти: повторные касания
+    одного пользователя сливаются в одну запись (максимум времени, сумма
+    апдейтов). Раз в HEARTBEAT_FLUSH_SECONDS накопленное уходит одним
+    неупорядоченным bulk_write с $max/$inc, поэтому запись идемпотентна по
+    времени и не откатывает last_active назад. Если отмеченных пользователей
+    набралось HEARTBEAT_MAX_PENDING, сброс происходит сразу, так что при
+    падении процесса теряется не больше одного интервала и не больше
+    HEARTBEAT_MAX_PENDING пользователей. Пока база не принимает сброс,
+    буфер растет до удвоенного лимита, а сверх него отметки отбрасываются и
+    считаются в dropped поштучно.
+    """
+
+    def __init__(
+        self,
+        users,
+        user_cache=None,
+        breaker=None,
+        flush_seconds: float = HEARTBEAT_FLUSH_SECONDS,
+        max_pending: int = HEARTBEAT_MAX_PENDING
+    ):
+        self.users = users
+        self.user_cache = user_cache
+        self.breaker = breaker
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        # user_id -> [последнее время, число апдейтов]
+        self._pending: Dict[int, List] = {}
+        # Примитивы asyncio создаются в работающем цикле: Database живет с импорта модуля
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.touches = 0
+        self.flushes = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def capacity(self) -> int:
+        """Сколько пользователей буфер держит, пока сброс не проходит."""
+        return self.max_pending * 2
+
+    def touch(self, user_id: int, when: Optional[datetime] = None) -> None:
+        """Отмечает активность пользователя. Ничего не пишет в базу."""
+        when = when or datetime.utcnow()
+        self.touches += 1
+        entry = self._pending.get(user_id)
+        if entry is None:
+            if len(self._pending) >= self.capacity:
+                # База не принимает сброс: не копим память бесконечно
+                self.dropped += 1
+                return
+            self._pending[user_id] = [when, 1]
+            if len(self._pending) >= self.max_pending and self._wakeup:
+                self._wakeup.set()
+        else:
+            if when > entry[0]:
+                entry[0] = when
+            entry[1] += 1
+
+    def _merge_back(self, batch: Dict[int, List]) -> None:
+        """Возвращает несброшенные отметки в буфер, не выходя за лимит."""
+        for user_id, (when, count) in batch.items():
+            entry = self._pending.get(user_id)
+            if entry is not None:
+                entry[0] = max(entry[0], when)
+                entry[1] += count
+            elif len(self._pending) < self.capacity:
+                self._pending[user_id] = [when, count]
+            else:
+                self.dropped += count
+
+    async def flush(self) -> int:
+        """Пишет накопленные отметки в базу. Возвращает число пользователей."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            if self._wakeup:
+                self._wakeup.clear()
+            operations = [
+                UpdateOne(
+                    {"user_id": user_id},
+                    {"$max": {"last_active": when}, "$inc": {"updates_count": count}}
+                )
+                for user_id, (when, count) in batch.items()
+            ]
+            try:
+                if self.breaker:
+                    await self.breaker.call(self.users.bulk_write, operations, ordered=False)
+                else:
+                    await self.users.bulk_write(operations, ordered=False)
+            except Exception:
+                self._merge_back(batch)
+                raise
+
+            self.flushes += 1
+            self.written += len(batch)
+            if self.user_cache is not None:
+                # В кеше обновляем только время: счетчик апдейтов догонит его по TTL
+                for user_id, (when, _) in batch.items():
+                    self.user_cache.apply(user_id, {"last_active": when})
+            return len(batch)
+
+    async def run(self, stop_event: Optional[asyncio.Event] = None) -> None:
+        """Сбрасывает буфер по таймеру или по переполнению, пока не выставлен stop_event."""
+        stop_event = stop_event or asyncio.Event()
+        self._wakeup = asyncio.Event()
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing heartbeats ({len(self._pending)} pending): {e}")
+        await self.flush()
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "touches": self.touches,
+            "flushes": self.flushes,
+            "written": self.written,
+            "dropped": self.dropped
+        }
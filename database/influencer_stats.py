@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING
+
+from config import INFLUENCER_STATS_MAX_AGE
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_ID = "influencer_stats_watermark"
+
+# Периоды дашборда блогера в днях, None — за все время
+STATS_PERIODS = {
+    "day": 1,
+    "week": 7,
+    "month": 30,
+    "all": None
+}
+
+
+class InfluencerStatsView:
+    """Материализованная статистика блогеров по их челленджам и видео.
+
+    Обновляется инкрементально: пересчитываются только блогеры, у чьих
+    челленджей что-то изменилось после водяного знака, а также записи старше
+    INFLUENCER_STATS_MAX_AGE, чтобы сдвигались окна "день" и "неделя".
+    Результат записывается через $merge, поэтому дашборд читается одним
+    запросом по _id.
+    """
+
+    def __init__(self, collection, challenges, submissions, stats):
+        self.collection = collection
+        self.challenges = challenges
+        self.submissions = submissions
+        self.stats = stats
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([("refreshed_at", ASCENDING)])
+        await self.challenges.create_index([("created_by", ASCENDING)])
+        await self.challenges.create_index([("last_updated", ASCENDING)])
+        await self.submissions.create_index([("last_updated", ASCENDING)])
+        await self.submissions.create_index([("challenge_id", ASCENDING)])
+
+    async def get(self, influencer_id: int) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": influencer_id})
+
+    async def _changed_influencers(self, since: datetime, now: datetime) -> List[int]:
+        changed_challenges = await self.submissions.distinct(
+            "challenge_id", {"last_updated": {"$gt": since}}
+        )
+        influencers = set(await self.challenges.distinct("created_by", {
+            "$or": [
+                {"challenge_id": {"$in": changed_challenges}},
+                {"last_updated": {"$gt": since}}
+            ]
+        }))
+        stale = await self.collection.distinct(
+            "_id", {"refreshed_at": {"$lt": now - timedelta(seconds=INFLUENCER_STATS_MAX_AGE)}}
+        )
+        influencers.update(stale)
+        return sorted(influencers)
+
+    def _pipeline(self, influencer_ids: List[int], now: datetime) -> List[dict]:
+        group: Dict[str, Any] = {
+            "_id": "$created_by",
+            "challenges": {"$addToSet": "$challenge_id"}
+        }
+        periods: Dict[str, Any] = {}
+        for period, days in STATS_PERIODS.items():
+            in_period = {"$gte": ["$sub.submitted_at", now - timedelta(days=days) if days else datetime.min]}
+            is_approved = {"$and": [in_period, {"$eq": ["$sub.status", "approved"]}]}
+            group[f"{period}_submissions"] = {"$sum": {"$cond": [in_period, 1, 0]}}
+            group[f"{period}_approved"] = {"$sum": {"$cond": [is_approved, 1, 0]}}
+            group[f"{period}_views"] = {"$sum": {"$cond": [in_period, "$sub.views_count", 0]}}
+            group[f"{period}_likes"] = {"$sum": {"$cond": [in_period, "$sub.likes_count", 0]}}
+            group[f"{period}_participants"] = {"$addToSet": {"$cond": [in_period, "$sub.user_id", None]}}
+
+            periods[period] = {
+                "submissions": f"${period}_submissions",
+                "completions": f"${period}_approved",
+                "approval_rate": {"$cond": [
+                    {"$gt": [f"${period}_submissions", 0]},
+                    {"$divide": [f"${period}_approved", f"${period}_submissions"]},
+                    0
+                ]},
+                "reach": {"$size": {"$setDifference": [f"${period}_participants", [None]]}},
+                "views": f"${period}_views",
+                "likes": f"${period}_likes"
+            }
+
+        return [
+            {"$match": {"created_by": {"$in": influencer_ids}}},
+            {"$project": {"_id": 0, "challenge_id": 1, "created_by": 1}},
+            {"$lookup": {
+                "from": self.submissions.name,
+                "localField": "challenge_id",
+                "foreignField": "challenge_id",
+                "pipeline": [{"$project": {
+                    "_id": 0, "user_id": 1, "status": 1, "submitted_at": 1,
+                    "views_count": 1, "likes_count": 1
+                }}],
+                "as": "sub"
+            }},
+            {"$unwind": {"path": "$sub", "preserveNullAndEmptyArrays": True}},
+            {"$group": group},
+            {"$project": {
+                "_id": 1,
+                "challenges_count": {"$size": "$challenges"},
+                "periods": periods,
+                "refreshed_at": {"$literal": now}
+            }},
+            {"$merge": {
+                "into": self.collection.name,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ]
+
+    async def refresh(self, full: bool = False) -> int:
+        """Пересчитывает статистику блогеров, изменившуюся после водяного знака."""
+        # Водяной знак фиксируется до чтения: изменения во время пересчета попадут в следующий
+        now = datetime.utcnow()
+        watermark = await self.stats.find_one({"_id": WATERMARK_ID})
+        since = datetime.min if full or not watermark else watermark["value"]
+
+        influencer_ids = await self._changed_influencers(since, now)
+        if influencer_ids:
+            await self.challenges.aggregate(
+                self._pipeline(influencer_ids, now), allowDiskUse=True
+            ).to_list(None)
+
+        await self.stats.update_one(
+            {"_id": WATERMARK_ID},
+            {"$set": {"value": now}},
+            upsert=True
+        )
+        logger.info(f"Refreshed stats for {len(influencer_ids)} influencers")
+        return len(influencer_ids)
+
+
+async def main():
+    """Обновление статистики блогеров из командной строки."""
+    from database.operations import Database
+
+    parser = argparse.ArgumentParser(description="Обновление статистики блогеров")
+    parser.add_argument("--full", action="store_true", help="Пересчитать всех блогеров")
+    args = parser.parse_args()
+
+    db = Database()
+    await db.influencer_stats_view.ensure_indexes()
+    print(f"Refreshed: {await db.influencer_stats_view.refresh(full=args.full)}")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
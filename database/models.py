@@ -10,8 +10,11 @@ class User(BaseModel):
     language_code: str = "ru"
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_active: datetime = Field(default_factory=datetime.utcnow)
+    updates_count: int = 0  # пишется с задержкой, см. HeartbeatBuffer
     badges: List[str] = []
-    completed_challenges: List[int] = []
+    completed_count: int = 0  # сами челленджи хранятся в challenge_completions
+    unread_notifications: int = 0
+    inbox_size: int = 0
     streak_days: int = 0
     referral_code: str
     referred_by: Optional[int] = None
@@ -31,33 +34,42 @@ class Challenge(BaseModel):
     views_count: int = 0
     completions_count: int = 0
     media_url: Optional[str] = None  # URL примера выполнения
+    last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class VideoSubmission(BaseModel):
     submission_id: int
     user_id: int
     challenge_id: int
     video_file_id: str
+    video_unique_id: Optional[str] = None  # file_unique_id, общий для всех ботов
+    video_error: Optional[str] = None  # почему видео не удалось передать админ-боту
     status: str = "pending"  # pending, approved, rejected
     submitted_at: datetime = Field(default_factory=datetime.utcnow)
     moderated_at: Optional[datetime] = None
     moderator_id: Optional[int] = None
     rejection_reason: Optional[str] = None
     channel_message_id: Optional[int] = None
+    published_at: Optional[datetime] = None
     likes_count: int = 0
     views_count: int = 0
+    last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class LeaderboardEntry(BaseModel):
     user_id: int
     username: Optional[str]
     points: int = 0
+    points_day: int = 0
+    points_week: int = 0
     completed_challenges: int = 0
     streak_days: int = 0
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class Notification(BaseModel):
+    notification_id: Optional[str] = None  # _id документа, заполняется при чтении
     user_id: int
     type: str  # challenge_new, video_approved, video_rejected, etc.
     message: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     is_read: bool = False
+    read_at: Optional[datetime] = None
     data: dict = {}  # Дополнительные данные для разных типов уведомлений 
\ No newline at end of file
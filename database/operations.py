@@ -1,13 +1,70 @@
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, WTimeoutError
 from .models import User, Challenge, VideoSubmission, LeaderboardEntry, Notification
-from config import MONGODB_URI, DATABASE_NAME
+from .sequences import SequenceAllocator
+from .rollups import ActivityRollups
+from .influencer_stats import InfluencerStatsView
+from .completions import CompletionStore, CompletionSet
+from .routing import READ_ROUTES
+from .user_cache import UserCache
+from .heartbeat import HeartbeatBuffer
+from .counters import CounterBuffer
+from config import (
+    MONGODB_URI,
+    DATABASE_NAME,
+    OUTBOX_RETENTION_DAYS,
+    NOTIFICATIONS_INBOX_CAP,
+    NOTIFICATIONS_PAGE_SIZE,
+    MONGO_READ_TIMEOUT
+)
+from utils.circuit_breaker import CircuitBreaker, guard_methods
+from utils.tracing import MongoCommandTracer, trace_methods, tracer
 
+# Входящие обрезаются, только когда перерастут лимит на этот запас
+INBOX_TRIM_SLACK = max(NOTIFICATIONS_INBOX_CAP // 10, 1)
+
+# Отказом Mongo считаются сетевые ошибки и таймауты, но не ошибки запроса (дубликат ключа и т.п.)
+mongo_breaker = CircuitBreaker("mongo", (ConnectionFailure, ExecutionTimeout, WTimeoutError))
+
+# Экраны только для чтения (каталог, лидерборд, статистика): пока Mongo недоступна,
+# они показывают последний удачный ответ
+STALE_READ_METHODS = [
+    "get_challenge",
+    "get_active_challenges",
+    "get_top_users",
+    "get_user_stats",
+    "get_challenge_stats",
+    "get_user_activity_stats",
+    "get_challenge_activity_stats",
+    "get_activity_stats",
+    "get_top_activity",
+    "get_global_stats",
+    "get_influencer_stats"
+]
+
+
+# get_user сам ходит в базу через предохранитель, чтобы попадания в кеш работали и при сбое.
+# Спан снаружи предохранителя: в трассе видно и ожидание таймаута.
+@trace_methods("db")
+@guard_methods(
+    mongo_breaker,
+    cached=STALE_READ_METHODS,
+    timeout=MONGO_READ_TIMEOUT,
+    unguarded=["get_user", "ping"]
+)
 class Database:
     def __init__(self):
-        self.client = AsyncIOMotorClient(MONGODB_URI)
+        self.client = AsyncIOMotorClient(
+            MONGODB_URI, event_listeners=[MongoCommandTracer()] if tracer.enabled else []
+        )
         self.db = self.client[DATABASE_NAME]
+        self._routes = {"primary": self.db}
+        # Та же база, но чтения уходят на вторичные узлы (см. READ_ROUTES)
+        self.analytics = self.routed("analytics")
         
         # Коллекции
         self.users = self.db.users
@@ -17,26 +74,179 @@ class Database:
         self.notifications = self.db.notifications
         self.error_logs = self.db.error_logs
         self.stats = self.db.stats
+        self.counters = self.db.counters
+        self.activity_rollups = self.db.activity_rollups
+        self.influencer_stats = self.db.influencer_stats
+        self.challenge_completions = self.db.challenge_completions
+        self.publish_queue = self.db.publish_queue
+        self.channel_state = self.db.channel_state
+        self.outbox = self.db.outbox
+        self.media_files = self.db.media_files
+
+        self.sequences = SequenceAllocator(self.counters)
+        self.rollups = ActivityRollups(
+            self.activity_rollups, self.challenges, reads=self.analytics.activity_rollups
+        )
+        self.completions = CompletionStore(self.challenge_completions)
+        self.user_cache = UserCache()
+        self.heartbeats = HeartbeatBuffer(self.users, self.user_cache, mongo_breaker)
+        # Просмотры и прохождения челленджей пишутся пачками, а не по документу на событие
+        self.challenge_counters = CounterBuffer(self.challenges, "challenge_id", mongo_breaker)
+        self.influencer_stats_view = InfluencerStatsView(
+            self.influencer_stats, self.challenges, self.submissions, self.stats
+        )
+
+    async def ping(self) -> None:
+        """Проверка доступности Mongo; мимо предохранителя, чтобы видеть ее реальное состояние."""
+        await self.client.admin.command("ping")
+
+    async def ensure_indexes(self) -> None:
+        """Создает уникальные индексы для идентификаторов."""
+        await self.users.create_index([("user_id", ASCENDING)], unique=True)
+        await self.challenges.create_index([("challenge_id", ASCENDING)], unique=True)
+        await self.submissions.create_index([("submission_id", ASCENDING)], unique=True)
+        await self.rollups.ensure_indexes()
+        await self.influencer_stats_view.ensure_indexes()
+        await self.completions.ensure_indexes()
+        await self.publish_queue.create_index([("submission_id", ASCENDING)], unique=True)
+        await self.publish_queue.create_index(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING), ("challenge_id", ASCENDING)]
+        )
+        await self.submissions.create_index([("status", ASCENDING), ("submitted_at", ASCENDING)])
+        await self.outbox.create_index([("status", ASCENDING), ("available_at", ASCENDING)])
+        await self.outbox.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+        await self.outbox.create_index([("claim_id", ASCENDING)], sparse=True)
+        await self.outbox.create_index(
+            [("processed_at", ASCENDING)], expireAfterSeconds=OUTBOX_RETENTION_DAYS * 24 * 60 * 60
+        )
+        await self.submissions.create_index([("channel_message_id", ASCENDING)], sparse=True)
+        await self.users.create_index([("last_active", ASCENDING)])
+        # _id в конце ключа — для постраничного чтения по (created_at, _id)
+        await self.notifications.create_index(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        await self.notifications.create_index(
+            [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+
+    def routed(self, route: str):
+        """Возвращает базу, чтения из которой идут по маршруту route."""
+        if route not in self._routes:
+            self._routes[route] = self.client.get_database(
+                DATABASE_NAME, read_preference=READ_ROUTES[route]
+            )
+        return self._routes[route]
+
+    # Транзакции и outbox
+    async def _with_transaction(self, callback):
+        """Выполняет callback(session) в транзакции и возвращает его результат."""
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(callback)
+
+    @staticmethod
+    def _outbox_event(event_type: str, payload: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        return {
+            "type": event_type,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "processed_handlers": [],
+            "created_at": now,
+            "available_at": now
+        }
+
+    @staticmethod
+    def _submission_event_payload(
+        submission: Dict[str, Any],
+        status: str,
+        rejection_reason: Optional[str]
+    ) -> Dict[str, Any]:
+        return {
+            "submission_id": submission["submission_id"],
+            "user_id": submission["user_id"],
+            "challenge_id": submission["challenge_id"],
+            "video_file_id": submission["video_file_id"],
+            "status": status,
+            "rejection_reason": rejection_reason
+        }
+
+    # Генерация идентификаторов
+    async def _next_ids(self, name: str, collection, count: int) -> List[int]:
+        if not self.sequences.is_seeded(name):
+            # Один раз за процесс поднимаем счетчик выше существующих записей
+            await self.sequences.seed(name, collection, name)
+        return await self.sequences.next_ids(name, count)
+
+    async def next_challenge_ids(self, count: int = 1) -> List[int]:
+        return await self._next_ids("challenge_id", self.challenges, count)
+
+    async def next_submission_ids(self, count: int = 1) -> List[int]:
+        return await self._next_ids("submission_id", self.submissions, count)
 
     # Операции с пользователями
     async def get_user(self, user_id: int) -> Optional[User]:
-        user_data = await self.users.find_one({"user_id": user_id})
+        """Возвращает пользователя из кеша процесса или из базы."""
+        user = self.user_cache.get(user_id)
+        if user is not None:
+            return user
+        return await self.user_cache.load(user_id, lambda: mongo_breaker.call(self._fetch_user, user_id))
+
+    async def _fetch_user(self, user_id: int) -> Optional[User]:
+        # Старые документы еще могут содержать список completed_challenges
+        user_data = await self.users.find_one(
+            {"user_id": user_id}, projection={"completed_challenges": 0}
+        )
         return User(**user_data) if user_data else None
 
     async def create_user(self, user: User) -> None:
         await self.users.insert_one(user.dict())
+        self.user_cache.put(user)
 
     async def update_user(self, user_id: int, update_data: Dict[str, Any]) -> None:
         await self.users.update_one(
             {"user_id": user_id},
             {"$set": update_data}
         )
+        self.user_cache.apply(user_id, update_data)
+
+    async def rollover_streaks(self) -> int:
+        """Сбрасывает серии пользователей, не заходивших ни вчера, ни сегодня."""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        result = await self.users.update_many(
+            {"streak_days": {"$gt": 0}, "last_active": {"$lt": today - timedelta(days=1)}},
+            {"$set": {"streak_days": 0}}
+        )
+        if result.modified_count:
+            self.user_cache.clear()
+        return result.modified_count
+
+    # Пройденные челленджи
+    async def add_completion(self, user_id: int, challenge_id: int) -> bool:
+        """Отмечает челлендж пройденным. Возвращает False, если он уже был пройден."""
+        if not await self.completions.add(user_id, challenge_id):
+            return False
+        await self.users.update_one(
+            {"user_id": user_id},
+            {"$inc": {"completed_count": 1}}
+        )
+        self.user_cache.invalidate(user_id)
+        return True
+
+    async def has_completed(self, user_id: int, challenge_id: int) -> bool:
+        return await self.completions.has(user_id, challenge_id)
+
+    async def get_completed_challenges(self, user_id: int) -> CompletionSet:
+        return await self.completions.load(user_id)
 
     # Операции с челленджами
     async def get_challenge(self, challenge_id: int) -> Optional[Challenge]:
         challenge_data = await self.challenges.find_one({"challenge_id": challenge_id})
         return Challenge(**challenge_data) if challenge_data else None
 
+    async def get_challenges_by_ids(self, challenge_ids: List[int]) -> Dict[int, Challenge]:
+        cursor = self.challenges.find({"challenge_id": {"$in": list(challenge_ids)}})
+        return {doc["challenge_id"]: Challenge(**doc) async for doc in cursor}
+
     async def get_active_challenges(self, category: Optional[str] = None) -> List[Challenge]:
         query = {"is_active": True}
         if category:
@@ -45,17 +255,93 @@ class Database:
         cursor = self.challenges.find(query)
         return [Challenge(**doc) async for doc in cursor]
 
-    async def create_challenge(self, challenge: Challenge) -> None:
+    async def create_challenge(self, challenge: Union[Challenge, Dict[str, Any]]) -> int:
+        if not isinstance(challenge, Challenge):
+            if not challenge.get("challenge_id"):
+                challenge = {**challenge, "challenge_id": (await self.next_challenge_ids())[0]}
+            challenge = Challenge(**challenge)
         await self.challenges.insert_one(challenge.dict())
+        return challenge.challenge_id
 
     # Операции с видео
-    async def create_submission(self, submission: VideoSubmission) -> None:
-        await self.submissions.insert_one(submission.dict())
+    async def create_submission(self, submission: Union[VideoSubmission, Dict[str, Any]]) -> int:
+        if not isinstance(submission, VideoSubmission):
+            if not submission.get("submission_id"):
+                submission = {**submission, "submission_id": (await self.next_submission_ids())[0]}
+            submission = VideoSubmission(**submission)
+        submission_data = submission.dict()
+        await self.submissions.insert_one(submission_data)
+        await self.rollups.increment(submission_data, {
+            "submissions": 1,
+            "approved": 1 if submission.status == "approved" else 0,
+            "views": submission.views_count,
+            "likes": submission.likes_count
+        })
+        return submission.submission_id
 
-    async def get_pending_submissions(self) -> List[VideoSubmission]:
-        cursor = self.submissions.find({"status": "pending"})
+    async def get_pending_submissions(self, limit: int = 0) -> List[VideoSubmission]:
+        cursor = self.submissions.find({"status": "pending"}).sort("submitted_at", ASCENDING).limit(limit)
         return [VideoSubmission(**doc) async for doc in cursor]
 
+    async def bulk_update_submission_status(
+        self,
+        submissions: List[VideoSubmission],
+        status: str,
+        moderator_id: Optional[int] = None,
+        rejection_reason: Optional[str] = None
+    ) -> List[VideoSubmission]:
+        """Применяет одно решение модератора к пачке видео одним bulk_write.
+
+        Обновляются только видео, все еще ожидающие модерации. Возвращает те,
+        чей статус действительно изменился.
+        """
+        if not submissions:
+            return []
+        now = datetime.utcnow()
+        batch_id = ObjectId()
+        update_data = {
+            "status": status,
+            "moderated_at": now,
+            "moderator_id": moderator_id,
+            "moderation_batch_id": batch_id,
+            "last_updated": now
+        }
+        if rejection_reason:
+            update_data["rejection_reason"] = rejection_reason
+
+        async def write(session) -> List[VideoSubmission]:
+            await self.submissions.bulk_write([
+                UpdateOne(
+                    {"submission_id": submission.submission_id, "status": "pending"},
+                    {"$set": update_data}
+                )
+                for submission in submissions
+            ], ordered=False, session=session)
+
+            # Видео, которые успел обработать другой модератор, не учитываем
+            changed_ids = set(await self.submissions.distinct("submission_id", {
+                "submission_id": {"$in": [submission.submission_id for submission in submissions]},
+                "moderation_batch_id": batch_id
+            }, session=session))
+            changed = [submission for submission in submissions if submission.submission_id in changed_ids]
+            if changed:
+                await self.outbox.insert_many([
+                    self._outbox_event(
+                        f"submission.{status}",
+                        self._submission_event_payload(submission.dict(), status, rejection_reason),
+                        now
+                    )
+                    for submission in changed
+                ], session=session)
+            return changed
+
+        changed = await self._with_transaction(write)
+        if status == "approved":
+            await self.rollups.increment_many([
+                (submission.dict(), {"approved": 1}) for submission in changed
+            ])
+        return changed
+
     async def update_submission_status(
         self,
         submission_id: int,
@@ -63,65 +349,260 @@ class Database:
         moderator_id: Optional[int] = None,
         rejection_reason: Optional[str] = None
     ) -> None:
+        """Меняет статус видео и в той же транзакции пишет событие в outbox."""
+        now = datetime.utcnow()
         update_data = {
             "status": status,
-            "moderated_at": datetime.utcnow(),
-            "moderator_id": moderator_id
+            "moderated_at": now,
+            "moderator_id": moderator_id,
+            "last_updated": now
         }
         if rejection_reason:
             update_data["rejection_reason"] = rejection_reason
 
-        await self.submissions.update_one(
-            {"submission_id": submission_id},
-            {"$set": update_data}
+        async def write(session) -> Optional[dict]:
+            previous = await self.submissions.find_one_and_update(
+                {"submission_id": submission_id},
+                {"$set": update_data},
+                projection={
+                    "_id": 0, "submission_id": 1, "user_id": 1, "challenge_id": 1,
+                    "video_file_id": 1, "submitted_at": 1, "status": 1
+                },
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if previous and previous["status"] != status:
+                await self.outbox.insert_one(
+                    self._outbox_event(
+                        f"submission.{status}",
+                        self._submission_event_payload(previous, status, rejection_reason),
+                        now
+                    ),
+                    session=session
+                )
+            return previous
+
+        previous = await self._with_transaction(write)
+        if previous:
+            was_approved = previous["status"] == "approved"
+            is_approved = status == "approved"
+            await self.rollups.increment(previous, {"approved": int(is_approved) - int(was_approved)})
+
+    async def get_recently_published(self, days: int = 7) -> List[VideoSubmission]:
+        """Получает видео, опубликованные в канале за последние days дней."""
+        cursor = self.submissions.find({
+            "channel_message_id": {"$ne": None},
+            "published_at": {"$gte": datetime.utcnow() - timedelta(days=days)}
+        })
+        return [VideoSubmission(**doc) async for doc in cursor]
+
+    async def set_submission_media(
+        self,
+        submission_id: int,
+        video_unique_id: Optional[str] = None,
+        video_error: Optional[str] = None
+    ) -> None:
+        """Запоминает file_unique_id видео и/или постоянную ошибку его передачи."""
+        update_data = {"last_updated": datetime.utcnow()}
+        if video_unique_id:
+            update_data["video_unique_id"] = video_unique_id
+        if video_error:
+            update_data["video_error"] = video_error
+        await self.submissions.update_one({"submission_id": submission_id}, {"$set": update_data})
+
+    async def mark_submissions_published(self, published: Dict[int, int]) -> None:
+        """Сохраняет id сообщений в канале для опубликованных видео одним bulk_write."""
+        if not published:
+            return
+        now = datetime.utcnow()
+        await self.submissions.bulk_write([
+            UpdateOne(
+                {"submission_id": submission_id},
+                {"$set": {"channel_message_id": message_id, "published_at": now, "last_updated": now}}
+            )
+            for submission_id, message_id in published.items()
+        ], ordered=False)
+
+    async def expire_pending_submissions(self, timeout_seconds: int) -> int:
+        """Переводит видео, не промодерированные за timeout_seconds, в статус expired."""
+        now = datetime.utcnow()
+        result = await self.submissions.update_many(
+            {"status": "pending", "submitted_at": {"$lt": now - timedelta(seconds=timeout_seconds)}},
+            {"$set": {"status": "expired", "last_updated": now}}
         )
+        return result.modified_count
 
     # Операции с лидербордом
-    async def update_leaderboard(self, user_id: int, points: int) -> None:
+    async def update_leaderboard(self, user_id: int, points: int, session=None) -> None:
         await self.leaderboard.update_one(
             {"user_id": user_id},
             {
-                "$inc": {"points": points},
+                "$inc": {"points": points, "points_day": points, "points_week": points},
                 "$set": {"last_updated": datetime.utcnow()}
             },
-            upsert=True
+            upsert=True,
+            session=session
         )
 
-    async def get_top_users(self, limit: int = 10) -> List[LeaderboardEntry]:
-        cursor = self.leaderboard.find().sort("points", -1).limit(limit)
+    async def get_top_users(self, limit: int = 10, period: str = "all") -> List[LeaderboardEntry]:
+        field = "points" if period == "all" else f"points_{period}"
+        cursor = self.leaderboard.find().sort(field, -1).limit(limit)
         return [LeaderboardEntry(**doc) async for doc in cursor]
 
+    async def reset_leaderboard_period(self, period: str) -> int:
+        """Обнуляет очки за период ("day" или "week")."""
+        field = f"points_{period}"
+        result = await self.leaderboard.update_many(
+            {field: {"$ne": 0}},
+            {"$set": {field: 0}}
+        )
+        return result.modified_count
+
     # Операции с уведомлениями
-    async def create_notification(self, notification: Notification) -> None:
-        await self.notifications.insert_one(notification.dict())
+    async def create_notification(self, notification: Union[Notification, Dict[str, Any]]) -> None:
+        if not isinstance(notification, Notification):
+            notification = Notification(**notification)
+        await self.notifications.insert_one(notification.dict(exclude={"notification_id"}))
+        user = await self.users.find_one_and_update(
+            {"user_id": notification.user_id},
+            {"$inc": {"unread_notifications": int(not notification.is_read), "inbox_size": 1}},
+            projection={"_id": 0, "inbox_size": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        self.user_cache.invalidate(notification.user_id)
+        if user and user["inbox_size"] > NOTIFICATIONS_INBOX_CAP + INBOX_TRIM_SLACK:
+            await self.trim_inbox(notification.user_id)
+
+    async def create_notifications(self, notifications: List[Notification]) -> None:
+        """Сохраняет пачку уведомлений одним insert_many и обновляет счетчики одним bulk_write."""
+        if not notifications:
+            return
+        await self.notifications.insert_many(
+            [notification.dict(exclude={"notification_id"}) for notification in notifications], ordered=False
+        )
+        counters: Dict[int, Dict[str, int]] = {}
+        for notification in notifications:
+            row = counters.setdefault(notification.user_id, {"unread_notifications": 0, "inbox_size": 0})
+            row["unread_notifications"] += int(not notification.is_read)
+            row["inbox_size"] += 1
+        await self.users.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": deltas})
+            for user_id, deltas in counters.items()
+        ], ordered=False)
+        for user_id in counters:
+            self.user_cache.invalidate(user_id)
+
+        overflowing = await self.users.distinct("user_id", {
+            "user_id": {"$in": list(counters)},
+            "inbox_size": {"$gt": NOTIFICATIONS_INBOX_CAP + INBOX_TRIM_SLACK}
+        })
+        for user_id in overflowing:
+            await self.trim_inbox(user_id)
+
+    async def trim_inbox(self, user_id: int) -> None:
+        """Удаляет самые старые уведомления сверх лимита и пересчитывает счетчики входящих."""
+        boundary = await self.notifications.find(
+            {"user_id": user_id}, projection={"created_at": 1}
+        ).sort("created_at", DESCENDING).skip(NOTIFICATIONS_INBOX_CAP - 1).limit(1).to_list(1)
+        if boundary:
+            await self.notifications.delete_many({
+                "user_id": user_id,
+                "created_at": {"$lt": boundary[0]["created_at"]}
+            })
+        await self.recount_inbox(user_id)
+
+    async def recount_inbox(self, user_id: int) -> None:
+        """Пересчитывает счетчики входящих по самим уведомлениям (их не больше лимита)."""
+        await self.users.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "inbox_size": await self.notifications.count_documents({"user_id": user_id}),
+                "unread_notifications": await self.notifications.count_documents(
+                    {"user_id": user_id, "is_read": False}
+                )
+            }}
+        )
+        self.user_cache.invalidate(user_id)
 
     async def get_user_notifications(
         self,
         user_id: int,
-        unread_only: bool = False
-    ) -> List[Notification]:
-        query = {"user_id": user_id}
+        unread_only: bool = False,
+        limit: int = NOTIFICATIONS_PAGE_SIZE,
+        before: Optional[Tuple[datetime, str]] = None
+    ) -> Tuple[List[Notification], Optional[Tuple[datetime, str]]]:
+        """Возвращает страницу уведомлений от новых к старым и ключ следующей.
+
+        Ключ — (created_at, _id) последнего уведомления страницы: insert_many
+        пишет пачку с одинаковым created_at, и граница страницы по одному
+        времени пропустила бы часть пачки. Следующая страница запрашивается
+        с before, равным ключу; None — страниц больше нет.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
         if unread_only:
             query["is_read"] = False
+        if before:
+            created_at, notification_id = before
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": ObjectId(notification_id)}}
+            ]
+
+        cursor = self.notifications.find(query).sort(
+            [("created_at", DESCENDING), ("_id", DESCENDING)]
+        ).limit(limit)
+        page = [Notification(notification_id=str(doc.pop("_id")), **doc) async for doc in cursor]
+        if len(page) < limit:
+            return page, None
+        return page, (page[-1].created_at, page[-1].notification_id)
+
+    async def get_unread_count(self, user_id: int) -> int:
+        user = await self.users.find_one(
+            {"user_id": user_id}, projection={"_id": 0, "unread_notifications": 1}
+        )
+        return user.get("unread_notifications", 0) if user else 0
 
-        cursor = self.notifications.find(query).sort("created_at", -1)
-        return [Notification(**doc) async for doc in cursor]
+    async def mark_notification_as_read(self, notification_id: Union[str, ObjectId]) -> bool:
+        """Отмечает уведомление прочитанным. Возвращает False, если оно уже было прочитано."""
+        notification = await self.notifications.find_one_and_update(
+            {"_id": ObjectId(notification_id), "is_read": False},
+            {"$set": {"is_read": True, "read_at": datetime.utcnow()}},
+            projection={"user_id": 1}
+        )
+        if not notification:
+            return False
+        # Счетчик уменьшает только тот, кто действительно сменил флаг
+        await self.users.update_one(
+            {"user_id": notification["user_id"]},
+            {"$inc": {"unread_notifications": -1}}
+        )
+        self.user_cache.invalidate(notification["user_id"])
+        return True
 
-    async def mark_notification_as_read(self, notification_id: str) -> None:
-        await self.notifications.update_one(
-            {"_id": notification_id},
-            {"$set": {"is_read": True}}
+    async def mark_all_notifications_as_read(self, user_id: int) -> int:
+        """Отмечает прочитанными все уведомления пользователя одним update_many."""
+        result = await self.notifications.update_many(
+            {"user_id": user_id, "is_read": False},
+            {"$set": {"is_read": True, "read_at": datetime.utcnow()}}
         )
+        if result.modified_count:
+            await self.users.update_one(
+                {"user_id": user_id},
+                {"$inc": {"unread_notifications": -result.modified_count}}
+            )
+            self.user_cache.invalidate(user_id)
+        return result.modified_count
 
     # Статистика
-    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_stats(self, user_id: int, route: str = "analytics") -> Dict[str, Any]:
         user = await self.get_user(user_id)
         if not user:
             return {}
+        submissions_reads = self.routed(route).submissions
 
-        completed_challenges = len(user.completed_challenges)
-        submissions = await self.submissions.count_documents({"user_id": user_id})
-        approved_submissions = await self.submissions.count_documents({
+        completed_challenges = user.completed_count
+        submissions = await submissions_reads.count_documents({"user_id": user_id})
+        approved_submissions = await submissions_reads.count_documents({
             "user_id": user_id,
             "status": "approved"
         })
@@ -134,13 +615,14 @@ class Database:
             "badges": user.badges
         }
 
-    async def get_challenge_stats(self, challenge_id: int) -> Dict[str, Any]:
+    async def get_challenge_stats(self, challenge_id: int, route: str = "analytics") -> Dict[str, Any]:
         challenge = await self.get_challenge(challenge_id)
         if not challenge:
             return {}
+        submissions_reads = self.routed(route).submissions
 
-        submissions = await self.submissions.count_documents({"challenge_id": challenge_id})
-        approved_submissions = await self.submissions.count_documents({
+        submissions = await submissions_reads.count_documents({"challenge_id": challenge_id})
+        approved_submissions = await submissions_reads.count_documents({
             "challenge_id": challenge_id,
             "status": "approved"
         })
@@ -171,7 +653,7 @@ class Database:
         likes_count: int
     ) -> None:
         """Обновляет статистику видео."""
-        await self.submissions.update_one(
+        previous = await self.submissions.find_one_and_update(
             {"submission_id": submission_id},
             {
                 "$set": {
@@ -179,8 +661,18 @@ class Database:
                     "likes_count": likes_count,
                     "last_updated": datetime.utcnow()
                 }
-            }
+            },
+            projection={
+                "_id": 0, "user_id": 1, "challenge_id": 1, "submitted_at": 1,
+                "views_count": 1, "likes_count": 1
+            },
+            return_document=ReturnDocument.BEFORE
         )
+        if previous:
+            await self.rollups.increment(previous, {
+                "views": views_count - previous.get("views_count", 0),
+                "likes": likes_count - previous.get("likes_count", 0)
+            })
 
     async def get_user_activity_stats(
         self,
@@ -188,37 +680,7 @@ class Database:
         days: int = 30
     ) -> Dict[str, Any]:
         """Получает статистику активности пользователя."""
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        submissions = await self.submissions.count_documents({
-            "user_id": user_id,
-            "submitted_at": {"$gte": start_date}
-        })
-        
-        approved_submissions = await self.submissions.count_documents({
-            "user_id": user_id,
-            "status": "approved",
-            "submitted_at": {"$gte": start_date}
-        })
-        
-        total_views = await self.submissions.aggregate([
-            {"$match": {
-                "user_id": user_id,
-                "submitted_at": {"$gte": start_date}
-            }},
-            {"$group": {
-                "_id": None,
-                "total_views": {"$sum": "$views_count"},
-                "total_likes": {"$sum": "$likes_count"}
-            }}
-        ]).to_list(1)
-        
-        return {
-            "submissions": submissions,
-            "approved_submissions": approved_submissions,
-            "total_views": total_views[0]["total_views"] if total_views else 0,
-            "total_likes": total_views[0]["total_likes"] if total_views else 0
-        }
+        return await self.get_activity_stats("user", user_id, days)
 
     async def get_challenge_activity_stats(
         self,
@@ -226,46 +688,42 @@ class Database:
         days: int = 30
     ) -> Dict[str, Any]:
         """Получает статистику активности челленджа."""
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        submissions = await self.submissions.count_documents({
-            "challenge_id": challenge_id,
-            "submitted_at": {"$gte": start_date}
-        })
-        
-        approved_submissions = await self.submissions.count_documents({
-            "challenge_id": challenge_id,
-            "status": "approved",
-            "submitted_at": {"$gte": start_date}
-        })
-        
-        total_views = await self.submissions.aggregate([
-            {"$match": {
-                "challenge_id": challenge_id,
-                "submitted_at": {"$gte": start_date}
-            }},
-            {"$group": {
-                "_id": None,
-                "total_views": {"$sum": "$views_count"},
-                "total_likes": {"$sum": "$likes_count"}
-            }}
-        ]).to_list(1)
-        
+        return await self.get_activity_stats("challenge", challenge_id, days)
+
+    async def get_activity_stats(
+        self,
+        entity_type: str,
+        entity_id: int = 0,
+        days: int = 30
+    ) -> Dict[str, Any]:
+        """Получает статистику активности сущности по почасовым агрегатам."""
+        totals = await self.rollups.window_totals(entity_type, entity_id, days)
         return {
-            "submissions": submissions,
-            "approved_submissions": approved_submissions,
-            "total_views": total_views[0]["total_views"] if total_views else 0,
-            "total_likes": total_views[0]["total_likes"] if total_views else 0
+            "submissions": totals["submissions"],
+            "approved_submissions": totals["approved"],
+            "total_views": totals["views"],
+            "total_likes": totals["likes"]
         }
 
-    async def get_global_stats(self) -> Dict[str, Any]:
+    async def get_top_activity(
+        self,
+        entity_type: str,
+        days: int = 7,
+        metric: str = "views",
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Получает самые активные сущности за период по почасовым агрегатам."""
+        return await self.rollups.top_entities(entity_type, days, metric, limit)
+
+    async def get_global_stats(self, route: str = "analytics") -> Dict[str, Any]:
         """Получает глобальную статистику."""
-        total_users = await self.users.count_documents({})
-        total_challenges = await self.challenges.count_documents({})
-        total_submissions = await self.submissions.count_documents({})
-        total_approved = await self.submissions.count_documents({"status": "approved"})
+        reads = self.routed(route)
+        total_users = await reads.users.count_documents({})
+        total_challenges = await reads.challenges.count_documents({})
+        total_submissions = await reads.submissions.count_documents({})
+        total_approved = await reads.submissions.count_documents({"status": "approved"})
         
-        total_views = await self.submissions.aggregate([
+        total_views = await reads.submissions.aggregate([
             {"$group": {
                 "_id": None,
                 "total_views": {"$sum": "$views_count"},
@@ -282,6 +740,10 @@ class Database:
             "total_likes": total_views[0]["total_likes"] if total_views else 0
         }
 
+    async def get_influencer_stats(self, influencer_id: int) -> Optional[Dict[str, Any]]:
+        """Получает материализованную статистику блогера."""
+        return await self.influencer_stats_view.get(influencer_id)
+
     async def update_global_stats(self) -> None:
         """Обновляет глобальную статистику."""
         stats = await self.get_global_stats()
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from config import COUNTER_FLUSH_SECONDS, POINTS_PER_APPROVAL, RECONCILE_CHUNK_SIZE
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Пауза между чанками, чтобы сверка не вытесняла рабочую нагрузку
+RECONCILE_CHUNK_PAUSE = 0.1
+# Дельта недавнего прохождения может еще лежать в CounterBuffer какой-то реплики
+# (в том числе вернувшись туда после неудачного сброса), а $inc недавнего
+# одобрения или прохождения — еще не дойти до счетчика
+COUNTER_SETTLE_SECONDS = max(60, 10 * COUNTER_FLUSH_SECONDS)
+
+
+class CounterSpec:
+    """Описание сверяемых счетчиков одной коллекции.
+
+    Ключи перебираются по возрастанию из keys_from, для каждого чанка ключей
+    source(keys) возвращает правильные значения полей, а текущие читаются
+    из target одним запросом по индексу на key. Ключ, которого нет в ответе
+    source, сейчас не сверяется. keys_query сужает перебор keys_from;
+    повторяющиеся ключи (несколько видео одного пользователя) отбрасываются.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target,
+        key: str,
+        fields: List[str],
+        source: Callable[[List[int]], Awaitable[Dict[int, Dict[str, int]]]],
+        keys_from=None,
+        keys_query: Optional[dict] = None,
+        upsert: bool = False
+    ):
+        self.name = name
+        self.target = target
+        self.key = key
+        self.fields = fields
+        self.source = source
+        self.keys_from = keys_from if keys_from is not None else target
+        self.keys_query = keys_query or {}
+        self.upsert = upsert
+
+
+class CounterReconciler:
+    """Пересчитывает денормализованные счетчики из исходных данных.
+
+    Работает чанками по RECONCILE_CHUNK_SIZE ключей: на чанк приходится одна
+    агрегация по индексу и один bulk_write только с отличающимися строками.
+    После каждого чанка последний ключ сохраняется в reconcile_checkpoints,
+    поэтому прерванная сверка продолжается с того же места.
+    """
+
+    def __init__(self, db, chunk_size: int = RECONCILE_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.checkpoints = db.db.reconcile_checkpoints
+        self.specs: Dict[str, CounterSpec] = {
+            spec.name: spec for spec in [
+                CounterSpec(
+                    "challenges", db.challenges, "challenge_id",
+                    ["completions_count"], self._challenge_counters
+                ),
+                CounterSpec("users", db.users, "user_id", ["completed_count"], self._user_counters),
+                CounterSpec(
+                    "inbox", db.users, "user_id",
+                    ["unread_notifications", "inbox_size"], self._inbox_counters
+                ),
+                # Строки лидерборда создает только outbox, поэтому ключи берутся из одобренных видео
+                CounterSpec(
+                    "leaderboard", db.leaderboard, "user_id", ["points"], self._leaderboard_points,
+                    keys_from=db.submissions, keys_query={"status": "approved"}, upsert=True
+                )
+            ]
+        }
+
+    async def ensure_indexes(self) -> None:
+        await self.db.submissions.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        await self.db.submissions.create_index([("challenge_id", ASCENDING)])
+        await self.db.leaderboard.create_index([("user_id", ASCENDING)])
+        await self.db.completions.ensure_indexes()
+
+    async def _group(self, collection, match: dict, key: str, values: Dict[str, Any]) -> Dict[int, Dict[str, int]]:
+        group = {"_id": f"${key}"}
+        group.update(values)
+        cursor = collection.aggregate([{"$match": match}, {"$group": group}], allowDiskUse=True)
+        return {doc.pop("_id"): doc async for doc in cursor}
+
+    async def _challenge_counters(self, keys: List[int]) -> Dict[int, Dict[str, int]]:
+        # views_count считает открытия карточки челленджа, источника для него нет
+        completions = await self._group(
+            self.db.challenge_completions, {"challenge_id": {"$in": keys}},
+            "challenge_id", {"completions_count": {"$sum": 1}, "latest": {"$max": "$completed_at"}}
+        )
+        # Недавнее прохождение уже есть в challenge_completions, но его $inc может
+        # еще не дойти до челленджа: перезапись сейчас посчитала бы его дважды
+        settled_before = self._settled_before()
+        return {
+            key: {"completions_count": completions.get(key, {}).get("completions_count", 0)}
+            for key in keys
+            if key not in completions or (completions[key]["latest"] or datetime.min) < settled_before
+        }
+
+    @staticmethod
+    def _settled_before() -> datetime:
+        return datetime.utcnow() - timedelta(seconds=COUNTER_SETTLE_SECONDS)
+
+    async def _user_counters(self, keys: List[int]) -> Dict[int, Dict[str, int]]:
+        completed = await self._group(
+            self.db.challenge_completions, {"user_id": {"$in": keys}},
+            "user_id", {"completed_count": {"$sum": 1}, "latest": {"$max": "$completed_at"}}
+        )
+        # add_completion вставляет прохождение раньше, чем делает $inc пользователю
+        settled_before = self._settled_before()
+        return {
+            key: {"completed_count": completed.get(key, {}).get("completed_count", 0)}
+            for key in keys
+            if key not in completed or (completed[key]["latest"] or datetime.min) < settled_before
+        }
+
+    async def _inbox_counters(self, keys: List[int]) -> Dict[int, Dict[str, int]]:
+        counters = await self._group(
+            self.db.notifications, {"user_id": {"$in": keys}}, "user_id", {
+                "unread_notifications": {"$sum": {"$cond": ["$is_read", 0, 1]}},
+                "inbox_size": {"$sum": 1}
+            }
+        )
+        return {
+            key: counters.get(key, {"unread_notifications": 0, "inbox_size": 0})
+            for key in keys
+        }
+
+    async def _leaderboard_points(self, keys: List[int]) -> Dict[int, Dict[str, int]]:
+        approved = await self._group(
+            self.db.submissions, {"user_id": {"$in": keys}, "status": "approved"},
+            "user_id", {"approved": {"$sum": 1}, "latest": {"$max": "$moderated_at"}}
+        )
+        # Очки за одобрение начисляет outbox: пока award_points не выполнен (в том
+        # числе ждет повтора), перезапись засчитала бы одобрение дважды. Outbox
+        # читается после видео, чтобы одобрение между запросами не проскочило
+        unawarded = set(await self.db.outbox.distinct("payload.user_id", {
+            "type": "submission.approved",
+            "status": "pending",
+            "payload.user_id": {"$in": keys},
+            "processed_handlers": {"$ne": "award_points"}
+        }))
+        settled_before = self._settled_before()
+        return {
+            key: {"points": approved.get(key, {}).get("approved", 0) * POINTS_PER_APPROVAL}
+            for key in keys
+            if key not in unawarded
+            and (key not in approved or (approved[key]["latest"] or datetime.min) < settled_before)
+        }
+
+    async def _next_keys(self, spec: CounterSpec, after: Optional[int]) -> List[int]:
+        query = dict(spec.keys_query)
+        if after is not None:
+            query[spec.key] = {"$gt": after}
+        cursor = spec.keys_from.find(query, projection={"_id": 0, spec.key: 1}).sort(spec.key, ASCENDING)
+        keys: List[int] = []
+        async for doc in cursor:
+            if keys and keys[-1] == doc[spec.key]:
+                continue
+            keys.append(doc[spec.key])
+            if len(keys) >= self.chunk_size:
+                break
+        await cursor.close()
+        return keys
+
+    async def _reconcile_chunk(self, spec: CounterSpec, keys: List[int]) -> int:
+        expected = await spec.source(keys)
+        projection = {"_id": 0, spec.key: 1}
+        projection.update({field: 1 for field in spec.fields})
+        cursor = spec.target.find({spec.key: {"$in": keys}}, projection=projection)
+        current = {doc[spec.key]: doc async for doc in cursor}
+
+        operations = []
+        for key in keys:
+            values = expected.get(key)
+            if values is None:
+                continue
+            row = current.get(key)
+            if row is None:
+                # Строки нет: создаем ее только там, где это допустимо и значение ненулевое
+                if spec.upsert and any(values.values()):
+                    operations.append(UpdateOne({spec.key: key}, {"$set": values}, upsert=True))
+                continue
+            diff = {field: value for field, value in values.items() if row.get(field, 0) != value}
+            if diff:
+                # Условие на старые значения: если счетчик успели изменить, строку поправит следующая сверка
+                query = {spec.key: key}
+                query.update({field: row.get(field) for field in diff})
+                operations.append(UpdateOne(query, {"$set": diff}))
+        if operations:
+            await spec.target.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def reconcile(self, name: str, restart: bool = False) -> int:
+        """Сверяет счетчики одной коллекции, продолжая с сохраненной точки. Возвращает число исправлений."""
+        spec = self.specs[name]
+        checkpoint = None if restart else await self.checkpoints.find_one({"_id": name})
+        after = checkpoint["last_key"] if checkpoint else None
+        fixed = checkpoint["fixed"] if checkpoint else 0
+        if checkpoint:
+            logger.info(f"Resuming {name} reconciliation after {spec.key}={after}")
+
+        while True:
+            keys = await self._next_keys(spec, after)
+            if not keys:
+                break
+            fixed += await self._reconcile_chunk(spec, keys)
+            after = keys[-1]
+            await self.checkpoints.update_one(
+                {"_id": name},
+                {
+                    "$set": {"last_key": after, "fixed": fixed, "updated_at": datetime.utcnow()},
+                    "$setOnInsert": {"started_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+            await asyncio.sleep(RECONCILE_CHUNK_PAUSE)
+
+        await self.checkpoints.delete_one({"_id": name})
+        logger.info(f"Reconciled {name}: {fixed} rows fixed")
+        return fixed
+
+    async def run(self, names: Optional[List[str]] = None, restart: bool = False) -> Dict[str, int]:
+        """Сверяет все (или перечисленные) коллекции по очереди."""
+        await self.ensure_indexes()
+        return {name: await self.reconcile(name, restart) for name in names or list(self.specs)}
+
+
+async def main():
+    """Сверка счетчиков из командной строки."""
+    from database.operations import Database
+
+    parser = argparse.ArgumentParser(description="Сверка денормализованных счетчиков")
+    parser.add_argument("names", nargs="*", help="Что сверять: challenges, users, inbox, leaderboard")
+    parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Начать заново, игнорируя сохраненную точку")
+    args = parser.parse_args()
+
+    reconciler = CounterReconciler(Database(), chunk_size=args.chunk_size)
+    for name, fixed in (await reconciler.run(args.names, restart=args.restart)).items():
+        print(f"{name}: {fixed} fixed")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from bson import json_util
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from config import (
+    NOTIFICATIONS_READ_RETENTION_DAYS,
+    ERROR_LOGS_RETENTION_DAYS,
+    RETENTION_TTL_GRACE_DAYS,
+    ARCHIVE_DIR,
+    ARCHIVE_BATCH_SIZE
+)
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 24 * 60 * 60
+
+# Политики хранения: какие документы считаются устаревшими и по какому полю
+RETENTION_POLICIES = {
+    "notifications": {
+        "date_field": "read_at",
+        "filter": {"is_read": True},
+        "days": NOTIFICATIONS_READ_RETENTION_DAYS
+    },
+    "error_logs": {
+        "date_field": "created_at",
+        "filter": {},
+        "days": ERROR_LOGS_RETENTION_DAYS
+    }
+}
+
+
+async def ensure_retention_indexes(db) -> None:
+    """Создает TTL-индексы для коллекций с ограниченным сроком хранения.
+
+    TTL срабатывает позже архиватора на RETENTION_TTL_GRACE_DAYS и служит
+    страховкой на случай, если архиватор давно не запускался.
+    """
+    for name, policy in RETENTION_POLICIES.items():
+        collection = db.db[name]
+        expire_after = (policy["days"] + RETENTION_TTL_GRACE_DAYS) * DAY_SECONDS
+        index_name = f"ttl_{policy['date_field']}"
+        options = {"name": index_name, "expireAfterSeconds": expire_after}
+        if policy["filter"]:
+            options["partialFilterExpression"] = policy["filter"]
+        try:
+            await collection.create_index([(policy["date_field"], ASCENDING)], **options)
+        except OperationFailure:
+            # Срок хранения изменился — обновляем индекс без пересоздания
+            await db.db.command({
+                "collMod": name,
+                "index": {"name": index_name, "expireAfterSeconds": expire_after}
+            })
+
+
+class RetentionArchiver:
+    """Переносит устаревшие документы в сжатые помесячные JSONL-файлы и удаляет их."""
+
+    def __init__(self, db, archive_dir: str = ARCHIVE_DIR, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+
+    def _archive_path(self, collection_name: str, month: str) -> str:
+        directory = os.path.join(self.archive_dir, collection_name)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{month}.jsonl.gz")
+
+    def _write_batch(self, collection_name: str, date_field: str, docs: List[dict]) -> None:
+        """Дописывает пачку документов в файлы по месяцу даты хранения."""
+        by_month: Dict[str, List[str]] = {}
+        for doc in docs:
+            date = doc.get(date_field) or doc.get("created_at") or datetime.utcnow()
+            by_month.setdefault(date.strftime("%Y-%m"), []).append(
+                json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS)
+            )
+
+        for month, lines in by_month.items():
+            # gzip допускает дозапись новым членом архива
+            with gzip.open(self._archive_path(collection_name, month), "at", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def archive_collection(self, collection_name: str) -> int:
+        """Архивирует и удаляет устаревшие документы одной коллекции."""
+        policy = RETENTION_POLICIES[collection_name]
+        collection = self.db.db[collection_name]
+        cutoff = datetime.utcnow() - timedelta(days=policy["days"])
+        query = dict(policy["filter"])
+        query[policy["date_field"]] = {"$lt": cutoff}
+
+        archived = 0
+        batch: List[dict] = []
+        cursor = collection.find(query).sort("_id", ASCENDING).batch_size(self.batch_size)
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                archived += await self._flush(collection, collection_name, policy, batch)
+                batch = []
+        if batch:
+            archived += await self._flush(collection, collection_name, policy, batch)
+
+        logger.info(f"Archived {archived} documents from {collection_name}")
+        return archived
+
+    async def _flush(self, collection, collection_name: str, policy: dict, batch: List[dict]) -> int:
+        # Файл пишется в пуле потоков, чтобы не блокировать цикл событий
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self._write_batch, collection_name, policy["date_field"], batch
+        )
+        # Удаляем только после того, как пачка надежно записана на диск
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        return result.deleted_count
+
+    async def run(self) -> Dict[str, Any]:
+        """Архивирует все коллекции с политиками хранения."""
+        return {name: await self.archive_collection(name) for name in RETENTION_POLICIES}
+
+
+async def main():
+    """Запуск архивации из командной строки."""
+    from database.operations import Database
+
+    db = Database()
+    await ensure_retention_indexes(db)
+    result = await RetentionArchiver(db).run()
+    for name, count in result.items():
+        print(f"{name}: {count}")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from config import MODERATION_TIMEOUT
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_METRICS = ["submissions", "approved", "views", "likes"]
+ENTITY_TYPES = ["global", "user", "challenge", "influencer"]
+
+
+def truncate_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _empty_totals() -> Dict[str, int]:
+    return {metric: 0 for metric in ROLLUP_METRICS}
+
+
+class ActivityRollups:
+    """Почасовые агрегаты активности по сущностям (пользователь, челлендж, блогер, все).
+
+    Строка агрегата ключуется (entity_type, entity_id, hour) и хранит счетчики
+    отправок, одобрений, просмотров и лайков видео, отправленных в этот час.
+    Счетчики обновляются через $inc при каждой записи, поэтому запрос за любое
+    окно суммирует не больше 24 строк на день окна. Запросы окон идут через
+    reads — коллекцию с маршрутом чтения для аналитики.
+    """
+
+    def __init__(self, collection, challenges, reads=None):
+        self.collection = collection
+        self.challenges = challenges
+        self.reads = reads if reads is not None else collection
+        # challenge_id -> created_by, автор челленджа не меняется
+        self._creators: Dict[int, Optional[int]] = {}
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index(
+            [("entity_type", ASCENDING), ("entity_id", ASCENDING), ("hour", ASCENDING)],
+            unique=True
+        )
+        await self.collection.create_index([("entity_type", ASCENDING), ("hour", ASCENDING)])
+
+    async def _creator_of(self, challenge_id: int) -> Optional[int]:
+        if challenge_id not in self._creators:
+            challenge = await self.challenges.find_one(
+                {"challenge_id": challenge_id}, projection={"created_by": 1}
+            )
+            self._creators[challenge_id] = challenge["created_by"] if challenge else None
+        return self._creators[challenge_id]
+
+    async def _entities(self, submission: Dict[str, Any]) -> List[tuple]:
+        entities = [
+            ("global", 0),
+            ("user", submission["user_id"]),
+            ("challenge", submission["challenge_id"])
+        ]
+        creator = await self._creator_of(submission["challenge_id"])
+        if creator is not None:
+            entities.append(("influencer", creator))
+        return entities
+
+    async def increment(self, submission: Dict[str, Any], deltas: Dict[str, int]) -> None:
+        """Прибавляет дельты к часу отправки видео для всех связанных сущностей."""
+        await self.increment_many([(submission, deltas)])
+
+    async def increment_many(self, changes: List[Tuple[Dict[str, Any], Dict[str, int]]]) -> None:
+        """Прибавляет дельты для пачки видео, сводя их в одну строку на (сущность, час)."""
+        merged: Dict[tuple, Dict[str, int]] = {}
+        now = datetime.utcnow()
+        for submission, deltas in changes:
+            hour = truncate_hour(submission["submitted_at"])
+            for entity_type, entity_id in await self._entities(submission):
+                row = merged.setdefault((entity_type, entity_id, hour), {})
+                for metric, value in deltas.items():
+                    row[metric] = row.get(metric, 0) + value
+
+        operations = [
+            UpdateOne(
+                {"entity_type": entity_type, "entity_id": entity_id, "hour": hour},
+                {
+                    "$inc": {metric: value for metric, value in deltas.items() if value},
+                    # По last_updated инкрементальная выгрузка находит поздние правки старых часов
+                    "$set": {"last_updated": now}
+                },
+                upsert=True
+            )
+            for (entity_type, entity_id, hour), deltas in merged.items()
+            if any(deltas.values())
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def window_totals(self, entity_type: str, entity_id: int, days: int) -> Dict[str, int]:
+        """Суммирует агрегаты сущности за последние days дней."""
+        start = truncate_hour(datetime.utcnow() - timedelta(days=days))
+        group = {"_id": None}
+        group.update({metric: {"$sum": f"${metric}"} for metric in ROLLUP_METRICS})
+        result = await self.reads.aggregate([
+            {"$match": {
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "hour": {"$gte": start}
+            }},
+            {"$group": group}
+        ]).to_list(1)
+
+        totals = _empty_totals()
+        if result:
+            totals.update({metric: result[0][metric] for metric in ROLLUP_METRICS})
+        return totals
+
+    async def top_entities(
+        self,
+        entity_type: str,
+        days: int,
+        metric: str = "views",
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Возвращает сущности с наибольшим значением метрики за окно."""
+        start = truncate_hour(datetime.utcnow() - timedelta(days=days))
+        group = {"_id": "$entity_id"}
+        group.update({name: {"$sum": f"${name}"} for name in ROLLUP_METRICS})
+        cursor = self.reads.aggregate([
+            {"$match": {"entity_type": entity_type, "hour": {"$gte": start}}},
+            {"$group": group},
+            {"$sort": {metric: DESCENDING}},
+            {"$limit": limit}
+        ])
+        return [
+            {"entity_id": doc["_id"], **{name: doc[name] for name in ROLLUP_METRICS}}
+            async for doc in cursor
+        ]
+
+    def _backfill_pipeline(
+        self,
+        entity_type: str,
+        since: Optional[datetime],
+        until: Optional[datetime] = None
+    ) -> List[dict]:
+        pipeline: List[dict] = []
+        submitted_at = {}
+        if since:
+            submitted_at["$gte"] = truncate_hour(since)
+        if until:
+            submitted_at["$lt"] = truncate_hour(until)
+        if submitted_at:
+            pipeline.append({"$match": {"submitted_at": submitted_at}})
+
+        if entity_type == "influencer":
+            pipeline += [
+                {"$lookup": {
+                    "from": self.challenges.name,
+                    "localField": "challenge_id",
+                    "foreignField": "challenge_id",
+                    "pipeline": [{"$project": {"_id": 0, "created_by": 1}}],
+                    "as": "challenge"
+                }},
+                {"$unwind": "$challenge"}
+            ]
+        entity_id = {
+            "global": 0,
+            "user": "$user_id",
+            "challenge": "$challenge_id",
+            "influencer": "$challenge.created_by"
+        }[entity_type]
+
+        pipeline += [
+            {"$group": {
+                "_id": {
+                    "entity_id": entity_id,
+                    "hour": {"$dateTrunc": {"date": "$submitted_at", "unit": "hour"}}
+                },
+                "submissions": {"$sum": 1},
+                "approved": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, 1, 0]}},
+                "views": {"$sum": "$views_count"},
+                "likes": {"$sum": "$likes_count"}
+            }},
+            {"$project": {
+                "_id": 0,
+                "entity_type": {"$literal": entity_type},
+                "entity_id": "$_id.entity_id",
+                "hour": "$_id.hour",
+                **{metric: 1 for metric in ROLLUP_METRICS},
+                "last_updated": "$$NOW"
+            }},
+            {"$merge": {
+                "into": self.collection.name,
+                "on": ["entity_type", "entity_id", "hour"],
+                "whenMatched": [{"$set": {
+                    **{metric: f"$$new.{metric}" for metric in ROLLUP_METRICS},
+                    "last_updated": "$$new.last_updated"
+                }}],
+                "whenNotMatched": "insert"
+            }}
+        ]
+        return pipeline
+
+    async def backfill(
+        self,
+        submissions,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> None:
+        """Пересчитывает агрегаты из сырых отправок за часы [since, until).
+
+        $merge перезаписывает счетчики через $set, а живые increment_many
+        продолжают работать: $inc, попавший между чтением отправок и
+        записью агрегата, теряется или учитывается дважды. Одобрение
+        попадает в час отправки видео, а не в час модерации, поэтому по
+        умолчанию пересчитываются только часы старше MODERATION_TIMEOUT:
+        видео из них уже одобрены, отклонены или истекли. Видео, до
+        которого задача истечения еще не дошла, и поздние просмотры и лайки
+        старых видео все равно могут попасть в это окно; такую ошибку
+        исправит следующий пересчет, пока час входит в его окно.
+        """
+        await self.ensure_indexes()
+        until = until or datetime.utcnow() - timedelta(seconds=MODERATION_TIMEOUT)
+        for entity_type in ENTITY_TYPES:
+            await submissions.aggregate(
+                self._backfill_pipeline(entity_type, since, until), allowDiskUse=True
+            ).to_list(None)
+            logger.info(f"Backfilled {entity_type} rollups")
+
+
+async def main():
+    """Пересчет агрегатов из командной строки."""
+    from database.operations import Database
+
+    parser = argparse.ArgumentParser(description="Пересчет почасовых агрегатов активности")
+    parser.add_argument("--days", type=int, default=None, help="Пересчитать только последние N дней (кроме последних MODERATION_TIMEOUT)")
+    args = parser.parse_args()
+
+    db = Database()
+    since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+    await db.rollups.backfill(db.submissions, since=since)
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
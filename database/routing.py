@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import logging
+from typing import Dict, List, Union
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred
+)
+
+from config import (
+    MONGODB_URI,
+    DATABASE_NAME,
+    MONGO_ANALYTICS_READ_PREFERENCE,
+    MONGO_ANALYTICS_MAX_STALENESS
+)
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+ReadPreference = Union[Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest]
+
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+
+def make_read_preference(mode: str, max_staleness: int = -1) -> ReadPreference:
+    """Собирает read preference по имени режима. max_staleness в секундах, -1 — без ограничения."""
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference: {mode!r}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCE_MODES[mode](max_staleness=max_staleness)
+
+
+# Маршруты чтения. Все записи и пользовательские чтения идут на primary,
+# дашборды и агрегаты статистики — на вторичные с ограничением отставания.
+# Задачи, которые пишут по результатам чтения (сверка, $merge-пересчеты
+# с водяным знаком), остаются на primary: устаревшее чтение там опасно.
+READ_ROUTES: Dict[str, ReadPreference] = {
+    "primary": Primary(),
+    "analytics": make_read_preference(MONGO_ANALYTICS_READ_PREFERENCE, MONGO_ANALYTICS_MAX_STALENESS)
+}
+
+
+class _ServerRecorder(monitoring.CommandListener):
+    """Запоминает, на какой сервер ушла каждая команда."""
+
+    def __init__(self):
+        self.servers: List[tuple] = []
+
+    def started(self, event):
+        self.servers.append((event.command_name, event.connection_id))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def check_routing() -> Dict[str, dict]:
+    """Выполняет по одному чтению на каждый маршрут и сообщает, какой узел его обслужил."""
+    recorder = _ServerRecorder()
+    client = AsyncIOMotorClient(MONGODB_URI, event_listeners=[recorder])
+    try:
+        hello = await client.admin.command("hello")
+        primary = hello.get("primary")
+        report = {"set_name": hello.get("setName"), "hosts": hello.get("hosts", []), "routes": {}}
+
+        for route, read_preference in READ_ROUTES.items():
+            database = client.get_database(DATABASE_NAME, read_preference=read_preference)
+            recorder.servers.clear()
+            await database.stats.find_one({"_id": "global"})
+            server = next((server for command, server in recorder.servers if command == "find"), None)
+            if server is None:
+                raise RuntimeError(f"No find command was recorded for route {route!r}")
+            host, port = server
+            address = f"{host}:{port}"
+            report["routes"][route] = {
+                "mode": read_preference.mongos_mode,
+                "max_staleness": read_preference.max_staleness,
+                "server": address,
+                "is_primary": address == primary
+            }
+    finally:
+        client.close()
+    return report
+
+
+async def main():
+    """Проверка маршрутизации чтений из командной строки."""
+    parser = argparse.ArgumentParser(description="Проверка маршрутизации чтений по узлам набора реплик")
+    parser.parse_args()
+
+    report = await check_routing()
+    if not report["set_name"]:
+        print("Not a replica set: all routes are served by the single server")
+    else:
+        print(f"Replica set {report['set_name']}: {', '.join(report['hosts'])}")
+    for route, info in report["routes"].items():
+        role = "PRIMARY" if info["is_primary"] else "SECONDARY"
+        print(f"{route:<10} {info['mode']:<18} max_staleness={info['max_staleness']:<4} -> {info['server']} ({role})")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from config import SEQUENCE_BLOCK_SIZE
+
+
+class SequenceAllocator:
+    """Выдает целочисленные идентификаторы блоками (hi/lo).
+
+    В коллекции counters хранится верхняя граница последнего выданного блока.
+    Процесс атомарно резервирует блок через $inc и раздает номера из памяти,
+    поэтому в Mongo идет один запрос на блок, а не на каждую запись.
+    Номера из недоиспользованного блока теряются при перезапуске — это
+    допустимые пропуски, повторов не бывает.
+    """
+
+    def __init__(self, counters, block_size: int = SEQUENCE_BLOCK_SIZE):
+        self.counters = counters
+        self.block_size = block_size
+        # name -> (следующий номер, последний номер блока)
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._seeded: Dict[str, bool] = {}
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        return self._locks[name]
+
+    async def seed(self, name: str, collection, field: str) -> None:
+        """Поднимает счетчик выше уже существующих в коллекции идентификаторов."""
+        last = await collection.find_one(
+            {field: {"$type": "number"}}, projection={field: 1}, sort=[(field, -1)]
+        )
+        await self.counters.update_one(
+            {"_id": name},
+            {"$max": {"value": last[field] if last else 0}},
+            upsert=True
+        )
+        self._seeded[name] = True
+
+    def is_seeded(self, name: str) -> bool:
+        return self._seeded.get(name, False)
+
+    async def _reserve(self, name: str, size: int) -> Tuple[int, int]:
+        doc = await self.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"value": size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["value"] - size + 1, doc["value"]
+
+    async def next_ids(self, name: str, count: int) -> List[int]:
+        """Возвращает count новых идентификаторов."""
+        ids: List[int] = []
+        async with self._lock(name):
+            while len(ids) < count:
+                next_id, last_id = self._blocks.get(name, (1, 0))
+                if next_id > last_id:
+                    # Для крупных вставок резервируем сразу весь остаток
+                    size = max(self.block_size, count - len(ids))
+                    next_id, last_id = await self._reserve(name, size)
+                take = min(count - len(ids), last_id - next_id + 1)
+                ids.extend(range(next_id, next_id + take))
+                self._blocks[name] = (next_id + take, last_id)
+        return ids
+
+    async def next_id(self, name: str) -> int:
+        """Возвращает один новый идентификатор."""
+        return (await self.next_ids(name, 1))[0]
+
+    def remaining(self, name: str) -> Optional[int]:
+        """Сколько номеров осталось в текущем блоке процесса."""
+        if name not in self._blocks:
+            return None
+        next_id, last_id = self._blocks[name]
+        return last_id - next_id + 1
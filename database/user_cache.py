@@ -0,0 +1,166 @@
+import asyncio
+import marshal
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+from .models import User
+
+EPOCH = datetime(1970, 1, 1)
+USER_FIELDS: Tuple[str, ...] = tuple(User.model_fields)
+FIELD_INDEX = {name: index for index, name in enumerate(USER_FIELDS)}
+DATETIME_FIELDS = {
+    name for name, field in User.model_fields.items() if field.annotation is datetime
+}
+LIST_FIELDS = {"badges"}
+# Заголовок записи: момент истечения (time.monotonic)
+EXPIRES = struct.Struct("d")
+
+
+def _encode(name: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if name in DATETIME_FIELDS:
+        return (value - EPOCH).total_seconds()
+    if name in LIST_FIELDS:
+        return tuple(value)
+    return value
+
+
+def _decode(name: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if name in DATETIME_FIELDS:
+        return EPOCH + timedelta(seconds=value)
+    if name in LIST_FIELDS:
+        return list(value)
+    return value
+
+
+class UserCache:
+    """LRU-кеш пользователей с TTL в памяти процесса.
+
+    Пользователь хранится одной строкой байт: срок жизни и marshal кортежа
+    значений полей (даты — числами). Так запись занимает около двухсот байт
+    вместо нескольких килобайт у модели pydantic. Модель собирается на каждое
+    чтение через model_construct без валидации, поэтому вызывающий может
+    менять ее, не портя кеш. Одновременные промахи по одному user_id
+    сводятся в один запрос. Запись во время такого запроса отвязывает его:
+    прочитанный до записи пользователь не попадет в кеш, а следующие
+    промахи не будут ждать устаревший ответ.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, bytes]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _values(self, user_id: int) -> Optional[tuple]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if EXPIRES.unpack_from(entry)[0] < time.monotonic():
+            del self._entries[user_id]
+            self.expirations += 1
+            return None
+        return marshal.loads(entry[EXPIRES.size:])
+
+    def get(self, user_id: int) -> Optional[User]:
+        values = self._values(user_id)
+        if values is None:
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return User.model_construct(**{
+            name: _decode(name, value) for name, value in zip(USER_FIELDS, values)
+        })
+
+    def put(self, user: User) -> None:
+        values = tuple(_encode(name, getattr(user, name)) for name in USER_FIELDS)
+        self._store(user.user_id, values)
+
+    def _store(self, user_id: int, values: tuple) -> None:
+        self._entries[user_id] = EXPIRES.pack(time.monotonic() + self.ttl) + marshal.dumps(values)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def apply(self, user_id: int, update_data: Dict[str, Any]) -> None:
+        """Применяет $set к закешированному пользователю или сбрасывает его, если поля незнакомы."""
+        if any(name not in FIELD_INDEX for name in update_data):
+            self.invalidate(user_id)
+            return
+        self._inflight.pop(user_id, None)
+        values = self._values(user_id)
+        if values is None:
+            return
+        values = list(values)
+        for name, value in update_data.items():
+            values[FIELD_INDEX[name]] = _encode(name, value)
+        self._store(user_id, tuple(values))
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        self._inflight.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def load(self, user_id: int, loader: Callable[[], Awaitable[Optional[User]]]) -> Optional[User]:
+        """Загружает пользователя при промахе; параллельные промахи ждут один запрос."""
+        future = self._inflight.get(user_id)
+        if future is not None:
+            self.coalesced += 1
+            user = await asyncio.shield(future)
+            return user.model_copy(deep=True) if user else None
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            user = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже получит вызывающий, ожидающих может не быть
+            future.exception()
+            raise
+        else:
+            future.set_result(user)
+            # Запрос отвязан записью: он мог прочитать документ до нее
+            if user is not None and self._inflight.get(user_id) is future:
+                self.put(user)
+            # Объект из future копируют ожидающие: вызывающий получает свою копию
+            return user.model_copy(deep=True) if user else None
+        finally:
+            if self._inflight.get(user_id) is future:
+                del self._inflight[user_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -1,36 +1,54 @@
+import time
+
+# Время импорта — заметная часть холодного старта, поэтому меряем его отдельно
+_import_started = time.perf_counter()
+
 import asyncio
 import logging
+import signal
 from bots.user_bot import main as user_bot_main
 from bots.admin_bot import main as admin_bot_main
 from bots.influencer_bot import main as influencer_bot_main
+from utils.logging_config import setup_logging
+from utils.resources import start_health_server
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 async def run_all_bots():
-    """Запускает все боты последовательно."""
+    """Запускает все боты параллельно вместе с /healthz и /readyz."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop_event.set)
+        except NotImplementedError:
+            # Windows: остается KeyboardInterrupt
+            pass
+
+    runner = await start_health_server()
     try:
         logger.info("Starting bots...")
-        
-        # Запускаем боты последовательно
-        await user_bot_main()
-        await asyncio.sleep(2)  # Ждем 2 секунды
-        await admin_bot_main()
-        await asyncio.sleep(2)  # Ждем 2 секунды
-        await influencer_bot_main()
-        
+        await asyncio.gather(
+            user_bot_main(stop_event),
+            admin_bot_main(stop_event),
+            influencer_bot_main(stop_event)
+        )
+
     except Exception as e:
         logger.error(f"Error running bots: {e}")
+        stop_event.set()
         raise
+    finally:
+        await runner.cleanup()
 
 if __name__ == '__main__':
+    setup_logging()
+    logger.info(f"Imports took {IMPORT_SECONDS:.3f}s (details: python -X importtime run.py)")
     try:
         asyncio.run(run_all_bots())
     except KeyboardInterrupt:
         logger.info("Bots stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}") 
\ No newline at end of file
+        logger.error(f"Fatal error: {e}")
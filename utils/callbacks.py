@@ -0,0 +1,260 @@
+import functools
+import logging
+import timeit
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на callback_data в байтах UTF-8
+MAX_CALLBACK_DATA = 64
+SEPARATOR = ":"
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+class CallbackDataError(ValueError):
+    """callback_data не удалось разобрать: чужой формат, устаревшая кнопка или подделка."""
+
+
+def _encode_int(value: int) -> str:
+    if value < 0:
+        return "-" + _encode_int(-value)
+    encoded = ""
+    while True:
+        value, digit = divmod(value, 36)
+        encoded = DIGITS[digit] + encoded
+        if not value:
+            return encoded
+
+
+def _encode_str(value: str) -> str:
+    return value.replace("%", "%25").replace(SEPARATOR, "%3A")
+
+
+def _decode_str(value: str) -> str:
+    if "%" not in value:
+        return value
+    return value.replace("%3A", SEPARATOR).replace("%25", "%")
+
+
+ENCODERS = {int: _encode_int, str: _encode_str}
+DECODERS = {int: functools.partial(int, base=36), str: _decode_str}
+
+
+class CallbackAction:
+    """Тип кнопки: постоянный код и типы аргументов.
+
+    Код попадает в уже отправленные клавиатуры, поэтому его нельзя менять
+    или переиспользовать, пока такие кнопки могут оставаться в чатах.
+    """
+
+    __slots__ = ("code", "name", "arg_types", "prefix", "decoders")
+
+    def __init__(self, code: int, name: str, *arg_types: type):
+        self.code = code
+        self.name = name
+        self.arg_types = arg_types
+        self.prefix = _encode_int(code)
+        self.decoders = tuple(DECODERS[arg_type] for arg_type in arg_types)
+
+    def __repr__(self) -> str:
+        return f"CallbackAction({self.name})"
+
+    def pack(self, *args) -> str:
+        """Собирает callback_data для кнопки с этим действием."""
+        if len(args) != len(self.arg_types):
+            raise TypeError(f"{self.name} takes {len(self.arg_types)} arguments, got {len(args)}")
+        parts = [self.prefix]
+        for arg_type, value in zip(self.arg_types, args):
+            if not isinstance(value, arg_type):
+                raise TypeError(f"{self.name}: expected {arg_type.__name__}, got {value!r}")
+            parts.append(ENCODERS[arg_type](value))
+        data = SEPARATOR.join(parts)
+        if len(data.encode()) > MAX_CALLBACK_DATA:
+            raise ValueError(f"{self.name}: callback data is longer than {MAX_CALLBACK_DATA} bytes")
+        return data
+
+
+ACTIONS: Dict[str, CallbackAction] = {}
+
+
+def action(code: int, name: str, *arg_types: type) -> CallbackAction:
+    """Объявляет действие кнопки; коды и имена должны быть уникальны."""
+    prefix = _encode_int(code)
+    if prefix in ACTIONS:
+        raise ValueError(f"Callback code {code} is already used by {ACTIONS[prefix].name}")
+    ACTIONS[prefix] = CallbackAction(code, name, *arg_types)
+    return ACTIONS[prefix]
+
+
+def unpack(data: str) -> Tuple[CallbackAction, tuple]:
+    """Разбирает callback_data в действие и типизированные аргументы."""
+    parts = data.split(SEPARATOR)
+    callback_action = ACTIONS.get(parts[0])
+    if callback_action is None:
+        raise CallbackDataError(f"Unknown callback action: {data!r}")
+    decoders = callback_action.decoders
+    if len(parts) != len(decoders) + 1:
+        raise CallbackDataError(f"Malformed callback data for {callback_action.name}: {data!r}")
+    if not decoders:
+        return callback_action, ()
+    try:
+        if len(decoders) == 1:
+            args = (decoders[0](parts[1]),)
+        else:
+            args = tuple([decode(value) for decode, value in zip(decoders, parts[1:])])
+    except ValueError as e:
+        raise CallbackDataError(f"Malformed callback data for {callback_action.name}: {data!r}") from e
+    return callback_action, args
+
+
+# Действия всех клавиатур. Коды сгруппированы по ботам: 1-29 пользовательский,
+# 30-69 админский, 70-89 блогерский, 90+ общие.
+CATEGORY = action(1, "category", str)
+BACK_TO_MAIN = action(2, "back_to_main")
+START_CHALLENGE = action(3, "start_challenge", int)
+FAVORITE = action(4, "favorite", int)
+SHARE = action(5, "share", int)
+BACK_TO_CHALLENGES = action(6, "back_to_challenges")
+OPEN_CHALLENGE = action(7, "open_challenge", int)
+WHAT_IS_THIS = action(8, "what_is_this")
+HOW_TO_PARTICIPATE = action(9, "how_to_participate")
+VIEW_EXAMPLES = action(10, "view_examples")
+LANGUAGE = action(11, "language", str)
+LEADERBOARD = action(12, "leaderboard", str)
+
+MODERATE_VIDEOS = action(30, "moderate_videos")
+BATCH_MODERATE = action(31, "batch_moderate")
+ADD_CHALLENGE = action(32, "add_challenge")
+IMPORT_CHALLENGES = action(33, "import_challenges")
+EXPORT_CHALLENGES = action(34, "export_challenges")
+MANAGE_INFLUENCERS = action(35, "manage_influencers")
+ADMIN_STATS = action(36, "admin_stats")
+STATS_REPORT = action(37, "stats_report", str)
+BACK_TO_ADMIN_MENU = action(38, "back_to_admin_menu")
+APPROVE = action(39, "approve", int)
+REJECT = action(40, "reject", int)
+SKIP = action(41, "skip", int)
+BATCH_TOGGLE = action(42, "batch_toggle", int)
+BATCH_ALL = action(43, "batch_all")
+BATCH_NONE = action(44, "batch_none")
+BATCH_APPROVE = action(45, "batch_approve")
+BATCH_REJECT = action(46, "batch_reject")
+BATCH_CANCEL = action(47, "batch_cancel")
+
+CREATE_CHALLENGE = action(70, "create_challenge")
+INFLUENCER_STATS = action(71, "influencer_stats")
+MY_CHALLENGES = action(72, "my_challenges")
+CHALLENGE_TITLE = action(73, "challenge_title")
+CHALLENGE_DESCRIPTION = action(74, "challenge_description")
+CHALLENGE_MEDIA = action(75, "challenge_media")
+PUBLISH_CHALLENGE = action(76, "publish_challenge")
+
+CONFIRM = action(90, "confirm", str, int)
+CANCEL = action(91, "cancel", str, int)
+PAGE = action(92, "page", str, int)
+
+
+class CallbackRouter:
+    """Диспетчер нажатий: действие -> обработчик за один поиск в словаре.
+
+    Обработчик вызывается как handler(update, context, *args) с уже
+    разобранными аргументами кнопки, на нажатие роутер отвечает сам.
+    matches годится как pattern для CallbackQueryHandler, чтобы роутер
+    забирал только свои кнопки.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+
+    def register(self, callback_action: CallbackAction, handler: Callable[..., Awaitable[Any]]) -> None:
+        self._handlers[callback_action.prefix] = handler
+
+    def on(self, callback_action: CallbackAction):
+        """Декоратор для register."""
+        def decorate(handler):
+            self.register(callback_action, handler)
+            return handler
+        return decorate
+
+    def matches(self, data: object) -> bool:
+        return isinstance(data, str) and data.split(SEPARATOR, 1)[0] in self._handlers
+
+    async def __call__(self, update: Update, context) -> Optional[object]:
+        query = update.callback_query
+        try:
+            callback_action, args = unpack(query.data)
+        except CallbackDataError as e:
+            logger.warning(f"Ignoring callback: {e}")
+            await query.answer("Эта кнопка устарела.")
+            return None
+        handler = self._handlers.get(callback_action.prefix)
+        if handler is None:
+            logger.warning(f"No handler for callback {callback_action.name} here")
+            await query.answer()
+            return None
+        await query.answer()
+        return await handler(update, context, *args)
+
+
+def _legacy_dispatch(data: str) -> tuple:
+    """Прежний разбор строк вида approve_{id} цепочкой startswith и split("_")."""
+    if data == "moderate_videos":
+        return ("moderate_videos",)
+    elif data == "batch_moderate":
+        return ("batch_moderate",)
+    elif data == "add_challenge":
+        return ("add_challenge",)
+    elif data == "import_challenges":
+        return ("import_challenges",)
+    elif data == "export_challenges":
+        return ("export_challenges",)
+    elif data == "manage_influencers":
+        return ("manage_influencers",)
+    elif data == "admin_stats":
+        return ("admin_stats",)
+    elif data.startswith("stats_"):
+        return ("stats", data.split("_")[1])
+    elif data.startswith("category_"):
+        return ("category", data.split("_")[1])
+    elif data.startswith("start_challenge_"):
+        return ("start_challenge", int(data.split("_")[2]))
+    elif data.startswith("favorite_"):
+        return ("favorite", int(data.split("_")[1]))
+    elif data.startswith("share_"):
+        return ("share", int(data.split("_")[1]))
+    elif data.startswith("approve_"):
+        return ("approve", int(data.split("_")[1]))
+    elif data.startswith("reject_"):
+        return ("reject", int(data.split("_")[1]))
+    elif data.startswith("skip_"):
+        return ("skip", int(data.split("_")[1]))
+    elif data.startswith("batch_toggle_"):
+        return ("batch_toggle", int(data.rsplit("_", 1)[1]))
+    return ()
+
+
+def benchmark(number: int = 200000) -> Dict[str, float]:
+    """Сравнивает разбор и диспетчеризацию с прежними строками. Время — мкс на нажатие."""
+    legacy = ["moderate_videos", "approve_123456", "batch_toggle_7", "category_Танцы"]
+    packed = [MODERATE_VIDEOS.pack(), APPROVE.pack(123456), BATCH_TOGGLE.pack(7), CATEGORY.pack("Танцы")]
+    handlers = {prefix: callback_action.name for prefix, callback_action in ACTIONS.items()}
+
+    def new_dispatch(data: str) -> tuple:
+        callback_action, args = unpack(data)
+        return (handlers[callback_action.prefix],) + args
+
+    results = {}
+    for label, dispatch, samples in (("legacy", _legacy_dispatch, legacy), ("codec", new_dispatch, packed)):
+        for sample in samples:
+            seconds = timeit.timeit(lambda: dispatch(sample), number=number)
+            results[f"{label} {sample}"] = seconds / number * 1e6
+    return results
+
+
+if __name__ == '__main__':
+    for name, microseconds in benchmark().items():
+        print(f"{name:<28} {microseconds:.3f} us")
+    for data in (APPROVE.pack(123456), CATEGORY.pack("Танцы"), PAGE.pack("leaderboard", 10 ** 6)):
+        print(f"{data!r}: {len(data.encode())} bytes")
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError as ModelValidationError
+from pymongo.errors import BulkWriteError
+
+from config import ADMIN_ID
+from database.models import Challenge
+from database.operations import Database
+from utils.error_handler import ValidationError, validate_challenge_data
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+# Сколько отклоненных строк показывать в итоговом сообщении
+REJECTED_PREVIEW_LIMIT = 10
+
+IMPORT_FIELDS = ['title', 'description', 'category', 'difficulty', 'tags', 'media_url', 'is_active']
+EXPORT_FIELDS = [
+    'challenge_id', 'title', 'description', 'category', 'difficulty', 'tags',
+    'media_url', 'is_active', 'created_by', 'created_at',
+    'views_count', 'completions_count', 'submissions', 'approved_submissions'
+]
+
+
+class ImportSummary:
+    """Итог импорта: сколько строк принято и почему отклонены остальные."""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected: List[Tuple[int, str]] = []
+
+    def reject(self, line_no: int, reason: str) -> None:
+        self.rejected.append((line_no, reason))
+
+    def format(self) -> str:
+        text = (
+            f"📥 Импорт завершен\n\n"
+            f"✅ Принято: {self.accepted}\n"
+            f"❌ Отклонено: {len(self.rejected)}"
+        )
+        if self.rejected:
+            preview = "\n".join(
+                f"Строка {line_no}: {reason}"
+                for line_no, reason in self.rejected[:REJECTED_PREVIEW_LIMIT]
+            )
+            text += f"\n\n{preview}"
+            if len(self.rejected) > REJECTED_PREVIEW_LIMIT:
+                text += f"\n... и еще {len(self.rejected) - REJECTED_PREVIEW_LIMIT}"
+        return text
+
+
+def _detect_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def _iter_rows(path: str) -> Iterator[Tuple[int, Any]]:
+    """Построчно читает JSONL или CSV, не загружая файл целиком."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if _detect_format(path) == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Номер строки с учетом заголовка
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, e
+
+
+def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит строку файла к данным челленджа."""
+    data = {
+        field: row[field].strip() if isinstance(row[field], str) else row[field]
+        for field in IMPORT_FIELDS
+        if row.get(field) not in (None, '')
+    }
+    # В CSV все значения строковые
+    if isinstance(data.get('difficulty'), str) and data['difficulty'].isdigit():
+        data['difficulty'] = int(data['difficulty'])
+    if isinstance(data.get('tags'), str):
+        data['tags'] = [tag.strip() for tag in data['tags'].split(';') if tag.strip()]
+    if isinstance(data.get('is_active'), str):
+        data['is_active'] = data['is_active'].lower() in ('1', 'true', 'yes', 'да')
+    return data
+
+
+class ChallengeImporter:
+    """Потоковый импорт челленджей пачками insert_many."""
+
+    def __init__(self, db: Database, created_by: int = ADMIN_ID, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.created_by = created_by
+        self.batch_size = batch_size
+
+    async def _insert_batch(self, batch: List[Tuple[int, Challenge]], summary: ImportSummary) -> None:
+        ids = await self.db.next_challenge_ids(len(batch))
+        docs = []
+        for challenge_id, (_, challenge) in zip(ids, batch):
+            challenge.challenge_id = challenge_id
+            docs.append(challenge.dict())
+
+        try:
+            result = await self.db.challenges.insert_many(docs, ordered=False)
+            summary.accepted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            summary.accepted += len(docs) - len(failed)
+            for index in sorted(failed):
+                summary.reject(batch[index][0], "Ошибка записи в базу")
+
+    async def import_file(self, path: str) -> ImportSummary:
+        """Импортирует челленджи из JSONL или CSV файла."""
+        summary = ImportSummary()
+        batch: List[Tuple[int, Challenge]] = []
+
+        for line_no, row in _iter_rows(path):
+            if isinstance(row, Exception):
+                summary.reject(line_no, f"Некорректный JSON: {row.msg}")
+                continue
+            if not isinstance(row, dict):
+                summary.reject(line_no, "Ожидался объект")
+                continue
+            try:
+                data = _normalize_row(row)
+                validate_challenge_data(data)
+                # Идентификатор выдается при записи пачки
+                challenge = Challenge(challenge_id=0, created_by=self.created_by, **data)
+            except ValidationError as e:
+                summary.reject(line_no, str(e))
+                continue
+            except ModelValidationError as e:
+                summary.reject(line_no, e.errors()[0]['msg'])
+                continue
+            except (AttributeError, TypeError):
+                summary.reject(line_no, "Некорректный тип поля")
+                continue
+
+            batch.append((line_no, challenge))
+            if len(batch) >= self.batch_size:
+                await self._insert_batch(batch, summary)
+                batch = []
+
+        if batch:
+            await self._insert_batch(batch, summary)
+
+        logger.info(f"Imported {summary.accepted} challenges, rejected {len(summary.rejected)}")
+        return summary
+
+
+class ChallengeExporter:
+    """Потоковая выгрузка каталога челленджей вместе со статистикой."""
+
+    def __init__(self, db: Database, batch_size: int = EXPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+
+    async def _submission_counts(self) -> Dict[int, Dict[str, int]]:
+        """Считает отправки по всем челленджам одним проходом."""
+        cursor = self.db.submissions.aggregate([
+            {"$group": {
+                "_id": "$challenge_id",
+                "submissions": {"$sum": 1},
+                "approved_submissions": {
+                    "$sum": {"$cond": [{"$eq": ["$status", "approved"]}, 1, 0]}
+                }
+            }}
+        ])
+        return {
+            doc["_id"]: {
+                "submissions": doc["submissions"],
+                "approved_submissions": doc["approved_submissions"]
+            }
+            async for doc in cursor
+        }
+
+    async def export_file(self, path: str) -> int:
+        """Выгружает каталог в JSONL или CSV, формат определяется по расширению."""
+        counts = await self._submission_counts()
+        is_csv = _detect_format(path) == 'csv'
+        exported = 0
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS, extrasaction='ignore') if is_csv else None
+            if writer:
+                writer.writeheader()
+
+            cursor = self.db.challenges.find(
+                {}, projection={"_id": 0}
+            ).sort("challenge_id", 1).batch_size(self.batch_size)
+            async for doc in cursor:
+                doc.update(counts.get(doc["challenge_id"], {"submissions": 0, "approved_submissions": 0}))
+                doc["created_at"] = doc["created_at"].isoformat() if doc.get("created_at") else None
+                if writer:
+                    doc["tags"] = ";".join(doc.get("tags", []))
+                    writer.writerow(doc)
+                else:
+                    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                exported += 1
+
+        logger.info(f"Exported {exported} challenges to {path}")
+        return exported
+
+
+async def main():
+    """Импорт и экспорт челленджей из командной строки."""
+    parser = argparse.ArgumentParser(description="Импорт и экспорт челленджей")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Загрузить челленджи из JSONL/CSV")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--created-by", type=int, default=ADMIN_ID)
+    export_parser = subparsers.add_parser("export", help="Выгрузить каталог в JSONL/CSV")
+    export_parser.add_argument("path")
+    args = parser.parse_args()
+
+    db = Database()
+    if args.command == "import":
+        if not os.path.exists(args.path):
+            parser.error(f"File not found: {args.path}")
+        summary = await ChallengeImporter(db, created_by=args.created_by).import_file(args.path)
+        print(summary.format())
+    else:
+        exported = await ChallengeExporter(db).export_file(args.path)
+        print(f"Exported: {exported}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
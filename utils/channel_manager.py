@@ -1,44 +1,230 @@
-from telegram import Bot
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from telegram import InputMediaVideo
+from telegram.error import RetryAfter, TelegramError
 from database.operations import Database
-from config import CHANNEL_ID, USER_BOT_TOKEN
-from utils.notifications import NotificationManager
+from utils.circuit_breaker import CircuitOpenError, GuardedBot, telegram_breaker
+from utils.telegram_transport import PRIORITY_BACKGROUND, get_shared_bot, priority_scope
+from config import (
+    CHANNEL_ID,
+    USER_BOT_TOKEN,
+    CHANNEL_POST_INTERVAL,
+    CHANNEL_ALBUM_MAX_SIZE,
+    CHANNEL_PUBLISH_MAX_ATTEMPTS,
+    CHANNEL_PUBLISH_BACKOFF_BASE,
+    CHANNEL_PUBLISH_BACKOFF_MAX
+)
+
+# Сколько секунд публикация считается занятой репликой, которая ее забрала
+PUBLISH_CLAIM_TIMEOUT = 120
+# Пауза опроса пустой очереди
+PUBLISH_IDLE_INTERVAL = 2
+# Документ channel_state с моментом, раньше которого следующий пост не отправляется
+PUBLISH_STATE_ID = "publisher"
 
 class ChannelManager:
-    def __init__(self):
-        self.bot = Bot(token=USER_BOT_TOKEN)
-        self.db = Database()
-        self.notifications = NotificationManager()
+    def __init__(self, db: Optional[Database] = None):
+        self.bot = GuardedBot(get_shared_bot(USER_BOT_TOKEN), telegram_breaker)
+        self.db = db or Database()
+
+    async def publish_video(
+        self,
+        video_file_id: str,
+        caption: str,
+        user_id: int,
+        challenge_id: int,
+        submission_id: int
+    ):
+        """Ставит видео в очередь публикации в канале."""
+        now = datetime.utcnow()
+        # Повторная постановка того же видео ничего не меняет
+        await self.db.publish_queue.update_one(
+            {"submission_id": submission_id},
+            {"$setOnInsert": {
+                "submission_id": submission_id,
+                "challenge_id": challenge_id,
+                "user_id": user_id,
+                "video_file_id": video_file_id,
+                "caption": caption,
+                "status": "queued",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now
+            }},
+            upsert=True
+        )
 
-    async def publish_video(self, video_file_id: str, caption: str, user_id: int, challenge_id: int):
-        """Публикует видео в канале."""
+    async def _reserve_slot(self) -> float:
+        """Занимает окно для поста, общее для всех реплик.
+
+        Возвращает 0, если окно занято этой репликой, иначе сколько ждать.
+        """
+        now = datetime.utcnow()
         try:
-            # Отправляем видео в канал
+            # Без подходящего документа upsert пытается вставить существующий _id
+            await self.db.channel_state.update_one(
+                {"_id": PUBLISH_STATE_ID, "next_post_at": {"$not": {"$gt": now}}},
+                {"$set": {"next_post_at": now + timedelta(seconds=CHANNEL_POST_INTERVAL)}},
+                upsert=True
+            )
+            return 0.0
+        except DuplicateKeyError:
+            state = await self.db.channel_state.find_one({"_id": PUBLISH_STATE_ID})
+            # Окно освободилось между запросами — повторим попытку почти сразу
+            wait = (state["next_post_at"] - now).total_seconds() if state else 0.0
+            return max(wait, 0.1)
+
+    async def _defer_posts(self, seconds: float) -> None:
+        """Отодвигает следующий пост всех реплик (RetryAfter, разомкнутый предохранитель)."""
+        await self.db.channel_state.update_one(
+            {"_id": PUBLISH_STATE_ID},
+            {"$max": {"next_post_at": datetime.utcnow() + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+
+    async def _claim(self, extra_query: Optional[dict] = None) -> Optional[dict]:
+        """Забирает одну готовую к отправке публикацию, чтобы ее не взяла другая реплика."""
+        now = datetime.utcnow()
+        query = {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            # Публикация, зависшая у упавшей реплики
+            {"status": "sending", "locked_until": {"$lt": now}}
+        ]}
+        if extra_query:
+            query.update(extra_query)
+        return await self.db.publish_queue.find_one_and_update(
+            query,
+            {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=PUBLISH_CLAIM_TIMEOUT)}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _claim_post(self) -> List[dict]:
+        """Забирает публикацию и до CHANNEL_ALBUM_MAX_SIZE видео того же челленджа для альбома."""
+        first = await self._claim()
+        if not first:
+            return []
+        items = [first]
+        while len(items) < CHANNEL_ALBUM_MAX_SIZE:
+            item = await self._claim({"challenge_id": first["challenge_id"]})
+            if not item:
+                break
+            items.append(item)
+        return items
+
+    async def _send_post(self, items: List[dict]) -> List[int]:
+        if len(items) == 1:
             message = await self.bot.send_video(
                 chat_id=CHANNEL_ID,
-                video=video_file_id,
-                caption=caption
+                video=items[0]["video_file_id"],
+                caption=items[0]["caption"]
             )
-            
-            # Обновляем информацию о видео в базе
-            await self.db.update_submission_status(
-                submission_id=challenge_id,
-                status="published",
-                channel_message_id=message.message_id
+            return [message.message_id]
+
+        messages = await self.bot.send_media_group(
+            chat_id=CHANNEL_ID,
+            media=[InputMediaVideo(media=item["video_file_id"], caption=item["caption"]) for item in items]
+        )
+        return [message.message_id for message in messages]
+
+    async def _complete(self, items: List[dict], message_ids: List[int]) -> None:
+        """Отмечает публикации выполненными и обновляет видео одним bulk_write на коллекцию."""
+        now = datetime.utcnow()
+        published = {item["submission_id"]: message_id for item, message_id in zip(items, message_ids)}
+        await self.db.publish_queue.bulk_write([
+            UpdateOne(
+                {"_id": item["_id"]},
+                {"$set": {"status": "done", "message_id": published[item["submission_id"]], "published_at": now},
+                 "$unset": {"locked_until": ""}}
             )
-            
-            # Уведомляем пользователя
-            challenge = await self.db.get_challenge(challenge_id)
-            if challenge:
-                await self.notifications.notify_video_approved(
-                    user_id=user_id,
-                    challenge_title=challenge.title
-                )
-            
-            return message.message_id
-        except Exception as e:
-            print(f"Error publishing video: {e}")
+            for item in items
+        ], ordered=False)
+        await self.db.mark_submissions_published(published)
+
+    async def _reschedule(self, items: List[dict], delay: Optional[float] = None, error: Optional[str] = None) -> None:
+        """Возвращает публикации в очередь: после RetryAfter без штрафа, иначе с экспоненциальной задержкой."""
+        now = datetime.utcnow()
+        operations = []
+        for item in items:
+            attempts = item["attempts"] + (0 if delay is not None else 1)
+            if delay is None and attempts >= CHANNEL_PUBLISH_MAX_ATTEMPTS:
+                update = {"status": "failed", "attempts": attempts, "last_error": error}
+            else:
+                backoff = delay if delay is not None else min(
+                    CHANNEL_PUBLISH_BACKOFF_BASE * 2 ** attempts, CHANNEL_PUBLISH_BACKOFF_MAX
+                ) * random.uniform(0.8, 1.2)
+                update = {
+                    "status": "queued",
+                    "attempts": attempts,
+                    "next_attempt_at": now + timedelta(seconds=backoff),
+                    "last_error": error
+                }
+            operations.append(UpdateOne(
+                {"_id": item["_id"]},
+                {"$set": update, "$unset": {"locked_until": ""}}
+            ))
+        await self.db.publish_queue.bulk_write(operations, ordered=False)
+
+    async def process_next_post(self) -> Optional[float]:
+        """Публикует один пост (видео или альбом).
+
+        Интервал CHANNEL_POST_INTERVAL выдерживается для всех реплик сразу:
+        момент следующего поста хранится в channel_state. Возвращает паузу
+        перед следующей попыткой или None, если очередь пуста.
+
+        Доставка — не менее одного раза: если реплика упадет между отправкой
+        и _complete, после PUBLISH_CLAIM_TIMEOUT другая реплика заберет
+        публикацию и видео выйдет в канале повторно.
+        """
+        wait = await self._reserve_slot()
+        if wait > 0:
+            return wait
+        items = await self._claim_post()
+        if not items:
             return None
 
+        try:
+            message_ids = await self._send_post(items)
+        except RetryAfter as e:
+            await self._reschedule(items, delay=e.retry_after)
+            await self._defer_posts(e.retry_after)
+            return max(e.retry_after, CHANNEL_POST_INTERVAL)
+        except CircuitOpenError as e:
+            # Bot API недоступен: возвращаем пост без штрафа и ждем восстановления
+            await self._reschedule(items, delay=e.retry_in)
+            await self._defer_posts(e.retry_in)
+            return max(e.retry_in, CHANNEL_POST_INTERVAL)
+        except TelegramError as e:
+            print(f"Error publishing video: {e}")
+            await self._reschedule(items, error=str(e))
+            return CHANNEL_POST_INTERVAL
+
+        # Авторов уведомляет outbox при одобрении, здесь только публикация
+        await self._complete(items, message_ids)
+        return CHANNEL_POST_INTERVAL
+
+    async def run_publisher(self, stop_event: Optional[asyncio.Event] = None):
+        """Публикует видео из очереди, выдерживая интервал между постами."""
+        stop_event = stop_event or asyncio.Event()
+        with priority_scope(PRIORITY_BACKGROUND):
+            await self._publish_loop(stop_event)
+
+    async def _publish_loop(self, stop_event: asyncio.Event):
+        while not stop_event.is_set():
+            try:
+                pause = await self.process_next_post()
+            except Exception as e:
+                print(f"Error in channel publisher: {e}")
+                pause = PUBLISH_IDLE_INTERVAL
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=pause or PUBLISH_IDLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
     async def update_video_stats(self, message_id: int):
         """Обновляет статистику видео (просмотры, лайки)."""
         try:
@@ -49,14 +235,24 @@ class ChannelManager:
             )
             
             # Обновляем статистику в базе
+            submission = await self.db.submissions.find_one(
+                {"channel_message_id": message_id}, projection={"submission_id": 1}
+            )
+            if not submission:
+                return
             await self.db.update_submission_stats(
-                submission_id=message_id,
+                submission_id=submission["submission_id"],
                 views_count=message.views,
                 likes_count=message.likes
             )
         except Exception as e:
             print(f"Error updating video stats: {e}")
 
+    async def update_recent_video_stats(self, days: int = 7):
+        """Обновляет статистику недавно опубликованных видео."""
+        for submission in await self.db.get_recently_published(days):
+            await self.update_video_stats(submission.channel_message_id)
+
     async def delete_video(self, message_id: int):
         """Удаляет видео из канала."""
         try:
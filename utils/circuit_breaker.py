@@ -0,0 +1,284 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Type
+
+from telegram.error import NetworkError
+
+from config import (
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_FAILURE_RATE,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_SLOW_CALL_RATE,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_HALF_OPEN_CALLS
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Сколько последних удачных ответов держать для деградации
+STALE_CACHE_SIZE = 1024
+
+# Предохранители, через которые уже идет текущий вызов: вложенные методы
+# (публичный метод Database, вызывающий другой) не считаются второй раз
+_active_breakers: ContextVar[frozenset] = ContextVar("active_breakers", default=frozenset())
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонен: зависимость считается недоступной."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit {name} is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Предохранитель для внешней зависимости (Mongo, Bot API).
+
+    Считает ошибки и медленные вызовы в скользящем окне CIRCUIT_WINDOW секунд.
+    Когда их доля превышает порог, размыкается: вызовы сразу получают
+    CircuitOpenError, вместо того чтобы ждать таймаута драйвера. Через
+    CIRCUIT_OPEN_SECONDS пропускает несколько пробных вызовов и замыкается,
+    если они прошли успешно.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_exceptions: Tuple[Type[BaseException], ...],
+        window: float = CIRCUIT_WINDOW,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+        slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS
+    ):
+        self.name = name
+        self.failure_exceptions = failure_exceptions
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        # (время завершения, ошибка, длительность)
+        self._calls: deque = deque()
+        self._probes_in_flight = 0
+        self._probes_succeeded = 0
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._calls.clear()
+        logger.warning(f"Circuit {self.name} opened")
+
+    def _allow(self, now: float) -> bool:
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_succeeded = 0
+            logger.info(f"Circuit {self.name} is half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_calls:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def _record(self, now: float, failed: bool, duration: float) -> None:
+        if self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            if failed or duration > self.slow_call_seconds:
+                self._open(now)
+            else:
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.half_open_calls:
+                    self.state = CLOSED
+                    logger.info(f"Circuit {self.name} closed")
+            return
+        if self.state != CLOSED:
+            return
+
+        self._calls.append((now, failed, duration))
+        self._trim(now)
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, is_failure, _ in self._calls if is_failure)
+        slow = sum(1 for _, _, call_duration in self._calls if call_duration > self.slow_call_seconds)
+        if failures / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+            self._open(now)
+
+    async def call(self, func: Callable[..., Awaitable], *args, timeout: Optional[float] = None, **kwargs):
+        """Выполняет вызов через предохранитель. timeout ограничивает ожидание ответа."""
+        now = time.monotonic()
+        if not self._allow(now):
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.open_seconds - (now - self.opened_at))
+
+        started = time.monotonic()
+        failed = False
+        try:
+            if timeout:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout)
+            return await func(*args, **kwargs)
+        except (asyncio.TimeoutError,) + self.failure_exceptions:
+            failed = True
+            raise
+        finally:
+            finished = time.monotonic()
+            self._record(finished, failed, finished - started)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Состояние предохранителя и доли ошибок и медленных вызовов в окне."""
+        self._trim(time.monotonic())
+        total = len(self._calls)
+        durations = sorted(duration for _, _, duration in self._calls)
+        return {
+            "state": self.state,
+            "calls": total,
+            "failure_rate": sum(1 for _, failed, _ in self._calls if failed) / total if total else 0.0,
+            "slow_rate": sum(1 for duration in durations if duration > self.slow_call_seconds) / total if total else 0.0,
+            "p99_latency": durations[int(total * 0.99) - 1] if total >= 100 else (durations[-1] if durations else 0.0),
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+
+class StaleCache:
+    """Последние удачные ответы для выдачи, пока зависимость недоступна."""
+
+    def __init__(self, size: int = STALE_CACHE_SIZE):
+        self.size = size
+        self._values: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+
+    def put(self, key: tuple, value: Any) -> None:
+        self._values[key] = (time.time(), value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.size:
+            self._values.popitem(last=False)
+
+    def get(self, key: tuple) -> Optional[Tuple[float, Any]]:
+        entry = self._values.get(key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+
+def guard_methods(
+    breaker: CircuitBreaker,
+    cached: Iterable[str] = (),
+    cache: Optional[StaleCache] = None,
+    timeout: Optional[float] = None,
+    unguarded: Iterable[str] = ()
+):
+    """Декоратор класса: пропускает публичные корутины через предохранитель.
+
+    Методы из cached — экраны только для чтения: их удачные ответы
+    запоминаются, и пока предохранитель разомкнут или вызов упал, отдается
+    последний удачный ответ. Для них же действует timeout, чтобы ожидание
+    пользователя было ограничено. Методы из unguarded не оборачиваются.
+    Через предохранитель проходит только внешний вызов: вложенные вызовы
+    защищенных методов выполняются напрямую и не считаются повторно.
+    """
+    cached = set(cached)
+    unguarded = set(unguarded)
+    cache = cache if cache is not None else StaleCache()
+
+    def outermost(method):
+        """Выполняет метод, отмечая предохранитель активным для вложенных вызовов."""
+        @functools.wraps(method)
+        async def run(*args, **kwargs):
+            token = _active_breakers.set(_active_breakers.get() | {breaker})
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _active_breakers.reset(token)
+        return run
+
+    def wrap(name: str, method):
+        inner = outermost(method)
+
+        if name in cached:
+            @functools.wraps(method)
+            async def cached_method(self, *args, **kwargs):
+                if breaker in _active_breakers.get():
+                    return await method(self, *args, **kwargs)
+                key = (name, args, tuple(sorted(kwargs.items())))
+                try:
+                    value = await breaker.call(inner, self, *args, timeout=timeout, **kwargs)
+                except (CircuitOpenError, asyncio.TimeoutError) + breaker.failure_exceptions as e:
+                    entry = cache.get(key)
+                    if entry is None:
+                        raise
+                    logger.warning(f"Serving stale {name} from {time.time() - entry[0]:.0f}s ago: {e}")
+                    return entry[1]
+                cache.put(key, value)
+                return value
+            return cached_method
+
+        @functools.wraps(method)
+        async def guarded_method(self, *args, **kwargs):
+            if breaker in _active_breakers.get():
+                return await method(self, *args, **kwargs)
+            return await breaker.call(inner, self, *args, **kwargs)
+        return guarded_method
+
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or name in unguarded:
+                continue
+            if inspect.iscoroutinefunction(method):
+                setattr(cls, name, wrap(name, method))
+        cls.breaker = breaker
+        cls.stale_cache = cache
+        return cls
+
+    return decorate
+
+
+# Общий предохранитель исходящих вызовов Bot API. Ошибки самого запроса
+# (BadRequest, Forbidden) и RetryAfter не считаются отказом зависимости.
+telegram_breaker = CircuitBreaker("telegram", (NetworkError,))
+
+
+class GuardedBot:
+    """Обертка над telegram.Bot: методы API вызываются через предохранитель."""
+
+    def __init__(self, bot, breaker: CircuitBreaker):
+        self._bot = bot
+        self.breaker = breaker
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._bot, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def call(*args, **kwargs):
+            return await self.breaker.call(attribute, *args, **kwargs)
+        return call
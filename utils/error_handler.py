@@ -3,19 +3,16 @@ import traceback
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
+from typing import Optional
 from database.operations import Database
+from utils.resources import resources
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    filename='bot.log'
-)
 logger = logging.getLogger(__name__)
 
 class ErrorHandler:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None):
+        # Общий клиент процесса, а не новый на каждую ошибку
+        self.db = db or resources.db
 
     async def log_error(self, error: Exception, context: ContextTypes.DEFAULT_TYPE):
         """Логирует ошибку в файл и базу данных."""
@@ -73,6 +73,43 @@ def format_challenge_stats(stats: dict) -> str:
 ✅ Одобрено видео: {stats['approved_submissions']}
 """
 
+def format_activity_stats(stats: dict, days: int) -> str:
+    """Форматирует статистику активности за период."""
+    return f"""
+📊 Активность за {days} дн.:
+
+📱 Отправлено видео: {stats['submissions']}
+✅ Одобрено видео: {stats['approved_submissions']}
+👁 Просмотров: {stats['total_views']}
+❤️ Лайков: {stats['total_likes']}
+"""
+
+def format_top_activity(title: str, rows: List[dict], label: str) -> str:
+    """Форматирует топ сущностей по активности."""
+    if not rows:
+        return f"{title}\n\nНет данных за период."
+    lines = [
+        f"{position}. {label} {row['entity_id']} — 📱 {row['submissions']} ✅ {row['approved']} "
+        f"👁 {row['views']} ❤️ {row['likes']}"
+        for position, row in enumerate(rows, 1)
+    ]
+    return f"{title}\n\n" + "\n".join(lines)
+
+def format_influencer_stats(stats: dict) -> str:
+    """Форматирует статистику блогера по периодам."""
+    titles = {"day": "📅 За день", "week": "📅 За неделю", "month": "📅 За месяц", "all": "📅 За все время"}
+    blocks = []
+    for period, title in titles.items():
+        data = stats['periods'][period]
+        blocks.append(
+            f"{title}:\n"
+            f"👥 Охват: {data['reach']}\n"
+            f"✅ Выполнений: {data['completions']} ({data['approval_rate']:.0%} одобрено)\n"
+            f"👁 Просмотров: {data['views']}\n"
+            f"❤️ Лайков: {data['likes']}"
+        )
+    return f"📊 Ваша статистика\n🎯 Челленджей: {stats['challenges_count']}\n\n" + "\n\n".join(blocks)
+
 def get_random_challenge(challenges: List[dict]) -> Optional[dict]:
     """Возвращает случайный челлендж из списка."""
     if not challenges:
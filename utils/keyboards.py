@@ -1,5 +1,6 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from config import CHALLENGE_CATEGORIES
+from utils import callbacks
 
 # Общие клавиатуры
 def get_main_menu_keyboard(is_admin: bool = False, is_influencer: bool = False) -> ReplyKeyboardMarkup:
@@ -20,37 +21,44 @@ def get_main_menu_keyboard(is_admin: bool = False, is_influencer: bool = False)
 def get_categories_keyboard() -> InlineKeyboardMarkup:
     buttons = []
     for category in CHALLENGE_CATEGORIES:
-        buttons.append([InlineKeyboardButton(category, callback_data=f"category_{category}")])
-    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
+        buttons.append([InlineKeyboardButton(category, callback_data=callbacks.CATEGORY.pack(category))])
+    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=callbacks.BACK_TO_MAIN.pack())])
     return InlineKeyboardMarkup(buttons)
 
 def get_challenge_actions_keyboard(challenge_id: int) -> InlineKeyboardMarkup:
     buttons = [
         [
-            InlineKeyboardButton("✅ Начать", callback_data=f"start_challenge_{challenge_id}"),
-            InlineKeyboardButton("⭐ В избранное", callback_data=f"favorite_{challenge_id}")
+            InlineKeyboardButton("✅ Начать", callback_data=callbacks.START_CHALLENGE.pack(challenge_id)),
+            InlineKeyboardButton("⭐ В избранное", callback_data=callbacks.FAVORITE.pack(challenge_id))
         ],
         [
-            InlineKeyboardButton("📱 Поделиться", callback_data=f"share_{challenge_id}"),
-            InlineKeyboardButton("🔙 Назад", callback_data="back_to_challenges")
+            InlineKeyboardButton("📱 Поделиться", callback_data=callbacks.SHARE.pack(challenge_id)),
+            InlineKeyboardButton("🔙 Назад", callback_data=callbacks.BACK_TO_CHALLENGES.pack())
         ]
     ]
     return InlineKeyboardMarkup(buttons)
 
 # Клавиатуры для пользовательского бота
+def get_search_results_keyboard(results: list) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(f"🎯 {result['title']}", callback_data=callbacks.OPEN_CHALLENGE.pack(result['challenge_id']))]
+        for result in results
+    ]
+    return InlineKeyboardMarkup(buttons)
+
 def get_onboarding_keyboard() -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton("❓ Что это?", callback_data="what_is_this")],
-        [InlineKeyboardButton("🎯 Как участвовать?", callback_data="how_to_participate")],
-        [InlineKeyboardButton("📱 Посмотреть примеры", callback_data="view_examples")]
+        [InlineKeyboardButton("❓ Что это?", callback_data=callbacks.WHAT_IS_THIS.pack())],
+        [InlineKeyboardButton("🎯 Как участвовать?", callback_data=callbacks.HOW_TO_PARTICIPATE.pack())],
+        [InlineKeyboardButton("📱 Посмотреть примеры", callback_data=callbacks.VIEW_EXAMPLES.pack())]
     ]
     return InlineKeyboardMarkup(buttons)
 
 def get_language_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         [
-            InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton("🇬🇧 English", callback_data="lang_en")
+            InlineKeyboardButton("🇷🇺 Русский", callback_data=callbacks.LANGUAGE.pack("ru")),
+            InlineKeyboardButton("🇬🇧 English", callback_data=callbacks.LANGUAGE.pack("en"))
         ]
     ]
     return InlineKeyboardMarkup(buttons)
@@ -58,48 +66,85 @@ def get_language_keyboard() -> InlineKeyboardMarkup:
 def get_leaderboard_period_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         [
-            InlineKeyboardButton("📅 День", callback_data="leaderboard_day"),
-            InlineKeyboardButton("📅 Неделя", callback_data="leaderboard_week")
+            InlineKeyboardButton("📅 День", callback_data=callbacks.LEADERBOARD.pack("day")),
+            InlineKeyboardButton("📅 Неделя", callback_data=callbacks.LEADERBOARD.pack("week"))
         ],
-        [InlineKeyboardButton("📅 Все время", callback_data="leaderboard_all")]
+        [InlineKeyboardButton("📅 Все время", callback_data=callbacks.LEADERBOARD.pack("all"))]
     ]
     return InlineKeyboardMarkup(buttons)
 
 # Клавиатуры для админ-бота
 def get_admin_menu_keyboard() -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton("📝 Модерация видео", callback_data="moderate_videos")],
-        [InlineKeyboardButton("➕ Добавить челлендж", callback_data="add_challenge")],
-        [InlineKeyboardButton("👥 Управление блогерами", callback_data="manage_influencers")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
+        [InlineKeyboardButton("📝 Модерация видео", callback_data=callbacks.MODERATE_VIDEOS.pack())],
+        [InlineKeyboardButton("📦 Пакетная модерация", callback_data=callbacks.BATCH_MODERATE.pack())],
+        [InlineKeyboardButton("➕ Добавить челлендж", callback_data=callbacks.ADD_CHALLENGE.pack())],
+        [
+            InlineKeyboardButton("📥 Импорт челленджей", callback_data=callbacks.IMPORT_CHALLENGES.pack()),
+            InlineKeyboardButton("📤 Экспорт челленджей", callback_data=callbacks.EXPORT_CHALLENGES.pack())
+        ],
+        [InlineKeyboardButton("👥 Управление блогерами", callback_data=callbacks.MANAGE_INFLUENCERS.pack())],
+        [InlineKeyboardButton("📊 Статистика", callback_data=callbacks.ADMIN_STATS.pack())]
+    ]
+    return InlineKeyboardMarkup(buttons)
+
+def get_stats_keyboard() -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton("📊 Общая статистика", callback_data=callbacks.STATS_REPORT.pack("global"))],
+        [InlineKeyboardButton("🎯 По челленджам", callback_data=callbacks.STATS_REPORT.pack("challenges"))],
+        [InlineKeyboardButton("👥 По блогерам", callback_data=callbacks.STATS_REPORT.pack("influencers"))],
+        [InlineKeyboardButton("🚀 По виральности", callback_data=callbacks.STATS_REPORT.pack("viral"))],
+        [InlineKeyboardButton("🔙 Назад", callback_data=callbacks.BACK_TO_ADMIN_MENU.pack())]
     ]
     return InlineKeyboardMarkup(buttons)
 
 def get_moderation_keyboard(submission_id: int) -> InlineKeyboardMarkup:
     buttons = [
         [
-            InlineKeyboardButton("✅ Одобрить", callback_data=f"approve_{submission_id}"),
-            InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{submission_id}")
+            InlineKeyboardButton("✅ Одобрить", callback_data=callbacks.APPROVE.pack(submission_id)),
+            InlineKeyboardButton("❌ Отклонить", callback_data=callbacks.REJECT.pack(submission_id))
+        ],
+        [InlineKeyboardButton("⏭ Пропустить", callback_data=callbacks.SKIP.pack(submission_id))]
+    ]
+    return InlineKeyboardMarkup(buttons)
+
+def get_batch_moderation_keyboard(count: int, selected: set) -> InlineKeyboardMarkup:
+    toggles = [
+        InlineKeyboardButton(
+            f"{'☑️' if index in selected else '⬜'} {index + 1}",
+            callback_data=callbacks.BATCH_TOGGLE.pack(index)
+        )
+        for index in range(count)
+    ]
+    buttons = [toggles[i:i + 5] for i in range(0, len(toggles), 5)]
+    buttons += [
+        [
+            InlineKeyboardButton("☑️ Выбрать все", callback_data=callbacks.BATCH_ALL.pack()),
+            InlineKeyboardButton("⬜ Снять все", callback_data=callbacks.BATCH_NONE.pack())
+        ],
+        [
+            InlineKeyboardButton(f"✅ Одобрить ({len(selected)})", callback_data=callbacks.BATCH_APPROVE.pack()),
+            InlineKeyboardButton(f"❌ Отклонить ({len(selected)})", callback_data=callbacks.BATCH_REJECT.pack())
         ],
-        [InlineKeyboardButton("⏭ Пропустить", callback_data=f"skip_{submission_id}")]
+        [InlineKeyboardButton("🔙 Назад", callback_data=callbacks.BATCH_CANCEL.pack())]
     ]
     return InlineKeyboardMarkup(buttons)
 
 # Клавиатуры для блогерского бота
 def get_influencer_menu_keyboard() -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton("➕ Создать челлендж", callback_data="create_challenge")],
-        [InlineKeyboardButton("📊 Моя статистика", callback_data="influencer_stats")],
-        [InlineKeyboardButton("📱 Мои челленджи", callback_data="my_challenges")]
+        [InlineKeyboardButton("➕ Создать челлендж", callback_data=callbacks.CREATE_CHALLENGE.pack())],
+        [InlineKeyboardButton("📊 Моя статистика", callback_data=callbacks.INFLUENCER_STATS.pack())],
+        [InlineKeyboardButton("📱 Мои челленджи", callback_data=callbacks.MY_CHALLENGES.pack())]
     ]
     return InlineKeyboardMarkup(buttons)
 
 def get_challenge_creation_keyboard() -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton("📝 Название", callback_data="challenge_title")],
-        [InlineKeyboardButton("📄 Описание", callback_data="challenge_description")],
-        [InlineKeyboardButton("📁 Медиа", callback_data="challenge_media")],
-        [InlineKeyboardButton("✅ Опубликовать", callback_data="publish_challenge")]
+        [InlineKeyboardButton("📝 Название", callback_data=callbacks.CHALLENGE_TITLE.pack())],
+        [InlineKeyboardButton("📄 Описание", callback_data=callbacks.CHALLENGE_DESCRIPTION.pack())],
+        [InlineKeyboardButton("📁 Медиа", callback_data=callbacks.CHALLENGE_MEDIA.pack())],
+        [InlineKeyboardButton("✅ Опубликовать", callback_data=callbacks.PUBLISH_CHALLENGE.pack())]
     ]
     return InlineKeyboardMarkup(buttons)
 
@@ -107,8 +152,8 @@ def get_challenge_creation_keyboard() -> InlineKeyboardMarkup:
 def get_confirmation_keyboard(action: str, item_id: int) -> InlineKeyboardMarkup:
     buttons = [
         [
-            InlineKeyboardButton("✅ Да", callback_data=f"confirm_{action}_{item_id}"),
-            InlineKeyboardButton("❌ Нет", callback_data=f"cancel_{action}_{item_id}")
+            InlineKeyboardButton("✅ Да", callback_data=callbacks.CONFIRM.pack(action, item_id)),
+            InlineKeyboardButton("❌ Нет", callback_data=callbacks.CANCEL.pack(action, item_id))
         ]
     ]
     return InlineKeyboardMarkup(buttons)
@@ -116,7 +161,7 @@ def get_confirmation_keyboard(action: str, item_id: int) -> InlineKeyboardMarkup
 def get_pagination_keyboard(current_page: int, total_pages: int, prefix: str) -> InlineKeyboardMarkup:
     buttons = []
     if current_page > 1:
-        buttons.append(InlineKeyboardButton("⬅️", callback_data=f"{prefix}_page_{current_page-1}"))
+        buttons.append(InlineKeyboardButton("⬅️", callback_data=callbacks.PAGE.pack(prefix, current_page - 1)))
     if current_page < total_pages:
-        buttons.append(InlineKeyboardButton("➡️", callback_data=f"{prefix}_page_{current_page+1}"))
+        buttons.append(InlineKeyboardButton("➡️", callback_data=callbacks.PAGE.pack(prefix, current_page + 1)))
     return InlineKeyboardMarkup([buttons]) 
\ No newline at end of file
@@ -0,0 +1,23 @@
+import logging
+
+from config import LOG_LEVEL, LOG_FILE
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(level: str = LOG_LEVEL, filename: str = LOG_FILE) -> None:
+    """Настраивает корневой логгер один раз на процесс.
+
+    Вызывается только из точек входа (run.py, __main__ ботов и CLI), а не
+    при импорте модулей: иначе побеждает тот basicConfig, чей модуль
+    импортировался первым.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handlers = [logging.StreamHandler()]
+    if filename:
+        handlers.append(logging.FileHandler(filename, encoding='utf-8'))
+    logging.basicConfig(format=LOG_FORMAT, level=level.upper(), handlers=handlers)
+    # httpx пишет INFO на каждый запрос к Bot API
+    logging.getLogger('httpx').setLevel(logging.WARNING)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config import (
+    MODERATION_TIMEOUT,
+    GLOBAL_STATS_CRON,
+    MODERATION_EXPIRY_CRON,
+    STREAK_ROLLOVER_CRON,
+    LEADERBOARD_DAY_RESET_CRON,
+    LEADERBOARD_WEEK_RESET_CRON,
+    RETENTION_ARCHIVE_CRON,
+    INFLUENCER_STATS_CRON,
+    ROLLUP_BACKFILL_CRON,
+    RECOMMENDER_REFILL_CRON,
+    RECONCILE_CRON,
+    VIDEO_STATS_CRON,
+    ANALYTICS_EXPORT_CRON
+)
+from database.analytics_export import AnalyticsExporter
+from database.operations import Database
+from database.reconcile import CounterReconciler
+from database.retention import RetentionArchiver
+from utils.channel_manager import ChannelManager
+from utils.recommender import ChallengeRecommender
+from utils.scheduler import JobScheduler
+
+# Сколько последних дней пересчитывает ночная сверка агрегатов
+ROLLUP_BACKFILL_DAYS = 2
+
+
+def register_maintenance_jobs(
+    scheduler: JobScheduler,
+    db: Database,
+    channel_manager: Optional[ChannelManager] = None,
+    recommender: Optional[ChallengeRecommender] = None
+) -> None:
+    """Регистрирует обслуживающие задачи, которые должны выполняться раз на кластер."""
+    scheduler.register("global_stats", GLOBAL_STATS_CRON, db.update_global_stats)
+    scheduler.register(
+        "moderation_expiry", MODERATION_EXPIRY_CRON,
+        lambda: db.expire_pending_submissions(MODERATION_TIMEOUT)
+    )
+    scheduler.register("streak_rollover", STREAK_ROLLOVER_CRON, db.rollover_streaks)
+    scheduler.register(
+        "leaderboard_day_reset", LEADERBOARD_DAY_RESET_CRON,
+        lambda: db.reset_leaderboard_period("day")
+    )
+    scheduler.register(
+        "leaderboard_week_reset", LEADERBOARD_WEEK_RESET_CRON,
+        lambda: db.reset_leaderboard_period("week")
+    )
+    scheduler.register(
+        "retention_archive", RETENTION_ARCHIVE_CRON,
+        RetentionArchiver(db).run, lease_seconds=60 * 60
+    )
+    scheduler.register("influencer_stats", INFLUENCER_STATS_CRON, db.influencer_stats_view.refresh)
+    scheduler.register(
+        "rollup_backfill", ROLLUP_BACKFILL_CRON,
+        lambda: db.rollups.backfill(
+            db.submissions, since=datetime.utcnow() - timedelta(days=ROLLUP_BACKFILL_DAYS)
+        ),
+        lease_seconds=60 * 60
+    )
+    scheduler.register(
+        "counter_reconcile", RECONCILE_CRON,
+        CounterReconciler(db).run, lease_seconds=60 * 60
+    )
+    scheduler.register(
+        "analytics_export", ANALYTICS_EXPORT_CRON,
+        AnalyticsExporter(db).run, lease_seconds=2 * 60 * 60
+    )
+    if recommender:
+        scheduler.register("recommender_refill", RECOMMENDER_REFILL_CRON, recommender.refill_low_pools)
+    if channel_manager:
+        scheduler.register("video_stats", VIDEO_STATS_CRON, channel_manager.update_recent_video_stats)
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+from telegram import Bot, Message, Update
+from telegram.error import RetryAfter, TelegramError
+
+from config import (
+    MEDIA_STORAGE_CHAT_ID,
+    MEDIA_TRANSFER_CONCURRENCY,
+    MEDIA_TRANSFER_TIMEOUT,
+    MEDIA_CACHE_SIZE
+)
+from utils.telegram_transport import get_shared_request
+
+logger = logging.getLogger(__name__)
+
+# Вид медиа -> (метод Bot API для загрузки, поле файла в Message)
+MEDIA_KINDS = {
+    "video": ("sendVideo", "video"),
+    "animation": ("sendAnimation", "animation"),
+    "photo": ("sendPhoto", "photo"),
+    "document": ("sendDocument", "document")
+}
+# Размер куска при скачивании: в памяти держим только его, остальное на диске
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def bot_key(bot: Bot) -> str:
+    """id бота — первая часть токена, без обращения к getMe."""
+    return bot.token.split(":", 1)[0]
+
+
+def message_media(message: Optional[Message]) -> Optional[Tuple[str, Any]]:
+    """Возвращает (вид, файл) медиа сообщения или None."""
+    if message is None:
+        return None
+    # animation проверяется раньше document: у GIF заполнены оба поля
+    for kind in ("video", "animation", "document"):
+        media = getattr(message, kind)
+        if media:
+            return kind, media
+    if message.photo:
+        return "photo", message.photo[-1]
+    return None
+
+
+class MediaRegistry:
+    """file_id одного и того же файла для каждого бота.
+
+    file_id действителен только у бота, который его получил, а
+    file_unique_id общий для всех. Реестр хранит в media_files документ
+    {_id: file_unique_id, file_ids: {id бота: file_id}}. Если у нужного
+    бота file_id еще нет, файл один раз скачивается исходным ботом во
+    временный файл и загружается целевым в служебный чат; полученный
+    file_id записывается и дальше переиспользуется без передачи байтов.
+    Одновременных перезагрузок не больше MEDIA_TRANSFER_CONCURRENCY,
+    повторные запросы того же файла ждут уже идущую.
+    """
+
+    def __init__(
+        self,
+        collection,
+        storage_chat_id: int = MEDIA_STORAGE_CHAT_ID,
+        concurrency: int = MEDIA_TRANSFER_CONCURRENCY,
+        cache_size: int = MEDIA_CACHE_SIZE,
+        timeout: float = MEDIA_TRANSFER_TIMEOUT
+    ):
+        self.collection = collection
+        self.storage_chat_id = storage_chat_id
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.timeout = timeout
+        # file_unique_id -> {id бота: file_id}
+        self._file_ids: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        # file_id -> file_unique_id, чтобы не спрашивать getFile повторно
+        self._unique_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._transfers: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Семафор создается внутри работающего цикла событий
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.transfers = 0
+        self.bytes_transferred = 0
+
+    def _remember(self, unique_id: str, bot_id: str, file_id: str) -> None:
+        file_ids = self._file_ids.setdefault(unique_id, {})
+        file_ids[bot_id] = file_id
+        self._file_ids.move_to_end(unique_id)
+        self._unique_ids[file_id] = unique_id
+        self._unique_ids.move_to_end(file_id)
+        while len(self._file_ids) > self.cache_size:
+            self._file_ids.popitem(last=False)
+        while len(self._unique_ids) > self.cache_size:
+            self._unique_ids.popitem(last=False)
+
+    async def _known(self, unique_id: str) -> Dict[str, str]:
+        """file_id по ботам: из кеша процесса, иначе из Mongo."""
+        if unique_id in self._file_ids:
+            self._file_ids.move_to_end(unique_id)
+            return self._file_ids[unique_id]
+        document = await self.collection.find_one({"_id": unique_id}, {"file_ids": 1})
+        file_ids = (document or {}).get("file_ids", {})
+        for bot_id, file_id in file_ids.items():
+            self._remember(unique_id, bot_id, file_id)
+        return file_ids
+
+    async def register(
+        self,
+        bot: Bot,
+        file_unique_id: str,
+        file_id: str,
+        kind: str = "video",
+        file_size: Optional[int] = None
+    ) -> None:
+        """Запоминает file_id файла для бота."""
+        bot_id = bot_key(bot)
+        if self._file_ids.get(file_unique_id, {}).get(bot_id) == file_id:
+            return
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": file_unique_id},
+            {
+                "$set": {f"file_ids.{bot_id}": file_id, "kind": kind, "updated_at": now},
+                "$setOnInsert": {"file_size": file_size, "created_at": now}
+            },
+            upsert=True
+        )
+        self._remember(file_unique_id, bot_id, file_id)
+
+    async def track_media(self, update: Update, context) -> None:
+        """Обработчик группы -1: регистрирует медиа, пришедшее боту."""
+        found = message_media(update.effective_message)
+        if found is None:
+            return
+        kind, media = found
+        try:
+            await self.register(context.bot, media.file_unique_id, media.file_id, kind, media.file_size)
+        except Exception as e:
+            logger.error(f"Error registering media {media.file_unique_id}: {e}")
+
+    def unique_id_for(self, file_id: str) -> Optional[str]:
+        """file_unique_id, если он уже встречался процессу."""
+        return self._unique_ids.get(file_id)
+
+    async def known_file_id(
+        self,
+        target_bot: Bot,
+        file_id: str,
+        source_bot: Bot,
+        file_unique_id: Optional[str] = None
+    ) -> Optional[str]:
+        """file_id для target_bot, если он уже есть в реестре. Файл не передает."""
+        target_id = bot_key(target_bot)
+        if target_id == bot_key(source_bot):
+            return file_id
+        unique_id = file_unique_id or self._unique_ids.get(file_id)
+        if not unique_id:
+            return None
+        known = (await self._known(unique_id)).get(target_id)
+        if known:
+            self.hits += 1
+        return known
+
+    async def file_id_for(
+        self,
+        target_bot: Bot,
+        file_id: str,
+        source_bot: Bot,
+        file_unique_id: Optional[str] = None,
+        kind: str = "video"
+    ) -> str:
+        """Возвращает file_id, которым target_bot может отправить файл source_bot.
+
+        Без file_unique_id он берется из кеша или одним getFile исходного бота.
+        """
+        known = await self.known_file_id(target_bot, file_id, source_bot, file_unique_id)
+        if known:
+            return known
+
+        unique_id = file_unique_id or self._unique_ids.get(file_id)
+        key = (unique_id or file_id, bot_key(target_bot))
+        task = self._transfers.get(key)
+        if task is None:
+            task = self._transfers[key] = asyncio.ensure_future(
+                self._transfer(target_bot, file_id, source_bot, unique_id, kind)
+            )
+            task.add_done_callback(lambda _: self._transfers.pop(key, None))
+        # Отмена одного ожидающего не должна обрывать передачу для остальных
+        return await asyncio.shield(task)
+
+    async def _transfer(
+        self,
+        target_bot: Bot,
+        file_id: str,
+        source_bot: Bot,
+        unique_id: Optional[str],
+        kind: str
+    ) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        target_id = bot_key(target_bot)
+        async with self._semaphore:
+            source_file = await source_bot.get_file(file_id)
+            unique_id = source_file.file_unique_id
+            await self.register(source_bot, unique_id, file_id, kind, source_file.file_size)
+            # Пока ждали семафор, файл мог перезагрузить другой процесс
+            self._file_ids.pop(unique_id, None)
+            known = (await self._known(unique_id)).get(target_id)
+            if known:
+                self.hits += 1
+                return known
+
+            filename = os.path.basename(source_file.file_path) or unique_id
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            with tempfile.TemporaryFile() as buffer:
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.get(source_file.file_path) as response:
+                        response.raise_for_status()
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            buffer.write(chunk)
+                    size = buffer.tell()
+                    buffer.seek(0)
+                    new_file_id, message_id = await self._upload(session, target_bot, kind, buffer, filename)
+
+        await self.register(target_bot, unique_id, new_file_id, kind, size)
+        self.transfers += 1
+        self.bytes_transferred += size
+        logger.info(f"Transferred media {unique_id} ({size} bytes) to bot {target_id}")
+        try:
+            await target_bot.delete_message(chat_id=self.storage_chat_id, message_id=message_id)
+        except TelegramError as e:
+            logger.warning(f"Could not delete storage message {message_id}: {e}")
+        return new_file_id
+
+    async def _upload(
+        self,
+        session: aiohttp.ClientSession,
+        bot: Bot,
+        kind: str,
+        buffer,
+        filename: str
+    ) -> Tuple[str, int]:
+        """Загружает файл потоком с диска и возвращает (file_id, id сообщения).
+
+        HTTPX-транспорт PTB собирает тело запроса в памяти целиком, поэтому
+        загрузка идет мимо него через aiohttp, но под тем же лимитером токена.
+        """
+        method, field = MEDIA_KINDS[kind]
+        request = get_shared_request(bot.token)
+        await request.limiter.acquire(self.storage_chat_id)
+        form = aiohttp.FormData()
+        form.add_field("chat_id", str(self.storage_chat_id))
+        form.add_field("disable_notification", "true")
+        form.add_field(field, buffer, filename=filename)
+        async with session.post(f"{bot.base_url}/{method}", data=form) as response:
+            payload = await response.json(content_type=None)
+        if not payload.get("ok"):
+            retry_after = payload.get("parameters", {}).get("retry_after")
+            if retry_after:
+                request.limiter.park(self.storage_chat_id, retry_after)
+                raise RetryAfter(retry_after)
+            raise TelegramError(payload.get("description", f"{method} failed"))
+        message = payload["result"]
+        media = message[field][-1] if kind == "photo" else message[field]
+        return media["file_id"], message["message_id"]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._file_ids),
+            "in_flight": len(self._transfers),
+            "hits": self.hits,
+            "transfers": self.transfers,
+            "bytes_transferred": self.bytes_transferred
+        }
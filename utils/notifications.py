@@ -1,11 +1,16 @@
-from telegram import Bot
+import asyncio
+from typing import Any, Dict, List, Optional
+from telegram.error import BadRequest, Forbidden
+from database.models import Notification, VideoSubmission
 from database.operations import Database
-from config import USER_BOT_TOKEN
+from config import USER_BOT_TOKEN, NOTIFICATION_CONCURRENCY
+from utils.circuit_breaker import GuardedBot, telegram_breaker
+from utils.telegram_transport import PRIORITY_BROADCAST, get_shared_bot, priority_scope
 
 class NotificationManager:
-    def __init__(self):
-        self.bot = Bot(token=USER_BOT_TOKEN)
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None):
+        self.bot = GuardedBot(get_shared_bot(USER_BOT_TOKEN), telegram_breaker)
+        self.db = db or Database()
 
     async def send_notification(self, user_id: int, message: str):
         """Отправляет уведомление пользователю."""
@@ -23,6 +28,78 @@ class NotificationManager:
         except Exception as e:
             print(f"Error sending notification to {user_id}: {e}")
 
+    async def send_notifications(self, notifications: List[Notification]) -> List[Notification]:
+        """Отправляет пачку уведомлений параллельно и сохраняет отправленные одним insert_many.
+
+        Возвращает уведомления, которые стоит повторить: сбой сети, 429,
+        разомкнутый предохранитель. Заблокированный бот или удаленный чат
+        повтором не лечатся, такие уведомления только логируются.
+        """
+        semaphore = asyncio.Semaphore(NOTIFICATION_CONCURRENCY)
+        sent: List[Notification] = []
+        failed: List[Notification] = []
+
+        async def send(notification: Notification) -> None:
+            async with semaphore:
+                try:
+                    await self.bot.send_message(chat_id=notification.user_id, text=notification.message)
+                except (Forbidden, BadRequest) as e:
+                    print(f"Notification to {notification.user_id} dropped: {e}")
+                except Exception as e:
+                    print(f"Error sending notification to {notification.user_id}: {e}")
+                    failed.append(notification)
+                else:
+                    sent.append(notification)
+
+        # Рассылка уступает очередь ответам пользователям
+        with priority_scope(PRIORITY_BROADCAST):
+            await asyncio.gather(*(send(notification) for notification in notifications))
+        if sent:
+            try:
+                await self.db.create_notifications(sent)
+            except Exception as e:
+                # Сообщения уже доставлены: повтор разослал бы их второй раз
+                print(f"Error saving notifications: {e}")
+        return failed
+
+    @staticmethod
+    def moderation_notification(submission: Dict[str, Any], challenge_title: str) -> Notification:
+        """Собирает уведомление о решении модератора по данным видео."""
+        if submission["status"] == "approved":
+            message = f"✅ Ваше видео для челленджа '{challenge_title}' было одобрено!"
+        else:
+            message = (
+                f"❌ Ваше видео для челленджа '{challenge_title}' было отклонено.\n"
+                f"Причина: {submission.get('rejection_reason')}"
+            )
+        return Notification(
+            user_id=submission["user_id"],
+            type=f"video_{submission['status']}",
+            message=message,
+            data={"submission_id": submission["submission_id"]}
+        )
+
+    async def notify_moderation_results(
+        self,
+        submissions: List[VideoSubmission],
+        status: str,
+        challenge_titles: Dict[int, str],
+        reason: Optional[str] = None
+    ):
+        """Уведомляет авторов о пакетном решении модератора."""
+        await self.send_notifications([
+            self.moderation_notification(
+                {
+                    "user_id": submission.user_id,
+                    "submission_id": submission.submission_id,
+                    "status": status,
+                    "rejection_reason": reason
+                },
+                challenge_titles.get(submission.challenge_id, str(submission.challenge_id))
+            )
+            for submission in submissions
+        ])
+
     async def notify_video_approved(self, user_id: int, challenge_title: str):
         """Уведомляет о одобрении видео."""
         message = f"✅ Ваше видео для челленджа '{challenge_title}' было одобрено!"
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from config import (
+    POINTS_PER_APPROVAL,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_MAX_ATTEMPTS
+)
+from database.operations import Database
+from utils.channel_manager import ChannelManager
+from utils.notifications import NotificationManager
+from utils.telegram_transport import PRIORITY_BACKGROUND, priority_scope
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд пачка событий считается занятой репликой, которая ее забрала
+OUTBOX_CLAIM_TIMEOUT = 60
+# Пауза опроса пустого outbox
+OUTBOX_IDLE_INTERVAL = 1
+OUTBOX_BACKOFF_BASE = 2
+OUTBOX_BACKOFF_MAX = 15 * 60
+
+# handler(events, session) — session передается только транзакционным обработчикам
+OutboxHandler = Callable[[List[dict], Optional[object]], Awaitable[None]]
+
+
+class PartialHandlerFailure(Exception):
+    """Обработчик выполнил только часть пачки; failed — события для повтора."""
+
+    def __init__(self, failed: List[dict], message: str):
+        super().__init__(message)
+        self.failed = failed
+
+
+class RegisteredHandler:
+    def __init__(self, name: str, func: OutboxHandler, transactional: bool):
+        self.name = name
+        self.func = func
+        self.transactional = transactional
+
+
+class OutboxConsumer:
+    """Обработчик событий outbox с доставкой "хотя бы один раз".
+
+    События пишутся в outbox в той же транзакции, что и изменение статуса
+    видео. Потребитель забирает их пачками с арендой, поэтому несколько
+    реплик не обрабатывают одно событие одновременно, а упавшая реплика
+    отпускает пачку по истечении аренды. Каждый обработчик отмечается в
+    processed_handlers события, и при повторе выполняются только те, что еще
+    не отработали. Транзакционные обработчики пишут свои изменения и эту
+    отметку в одной транзакции, поэтому выполняются ровно один раз.
+    """
+
+    def __init__(self, db: Database, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.db = db
+        self.outbox = db.outbox
+        self.batch_size = batch_size
+        self.handlers: Dict[str, List[RegisteredHandler]] = defaultdict(list)
+        self.processed = 0
+        self.failed = 0
+        self.dead = 0
+        self.last_batch_duration: Optional[float] = None
+
+    def register(self, event_type: str, name: str, func: OutboxHandler, transactional: bool = False) -> None:
+        """Добавляет обработчик пачки событий одного типа."""
+        self.handlers[event_type].append(RegisteredHandler(name, func, transactional))
+
+    async def _claim(self) -> List[dict]:
+        """Забирает пачку готовых событий, продвигая available_at на время аренды."""
+        now = datetime.utcnow()
+        query = {"status": "pending", "available_at": {"$lte": now}}
+        cursor = self.outbox.find(query, projection={"_id": 1}).sort("available_at", ASCENDING).limit(self.batch_size)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            return []
+
+        claim_id = ObjectId()
+        await self.outbox.update_many(
+            {"_id": {"$in": ids}, **query},
+            {"$set": {
+                "claim_id": claim_id,
+                "available_at": now + timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+            }}
+        )
+        # Часть событий могла успеть забрать другая реплика
+        return await self.outbox.find({"claim_id": claim_id}).sort("created_at", ASCENDING).to_list(None)
+
+    async def _mark_handled(self, events: List[dict], name: str, session=None) -> None:
+        await self.outbox.update_many(
+            {"_id": {"$in": [event["_id"] for event in events]}},
+            {"$addToSet": {"processed_handlers": name}},
+            session=session
+        )
+
+    async def _run_handler(self, handler: RegisteredHandler, events: List[dict]) -> None:
+        pending = [event for event in events if handler.name not in event["processed_handlers"]]
+        if not pending:
+            return
+        if handler.transactional:
+            async def write(session) -> None:
+                await handler.func(pending, session)
+                await self._mark_handled(pending, handler.name, session=session)
+
+            await self.db._with_transaction(write)
+        else:
+            try:
+                await handler.func(pending, None)
+            except PartialHandlerFailure as e:
+                # Успешные события отмечаем, чтобы повтор не выполнил их второй раз
+                failed_ids = {event["_id"] for event in e.failed}
+                handled = [event for event in pending if event["_id"] not in failed_ids]
+                if handled:
+                    await self._mark_handled(handled, handler.name)
+                    for event in handled:
+                        event["processed_handlers"].append(handler.name)
+                raise
+            await self._mark_handled(pending, handler.name)
+        # Отмечаем в памяти только после фиксации, чтобы повтор пачки не пропустил обработчик
+        for event in pending:
+            event["processed_handlers"].append(handler.name)
+
+    async def _retry(self, events: List[dict], error: str) -> None:
+        now = datetime.utcnow()
+        for event in events:
+            attempts = event["attempts"] + 1
+            update = {"attempts": attempts, "last_error": error}
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                update.update({"status": "dead", "processed_at": now})
+                self.dead += 1
+                logger.error(f"Outbox event {event['_id']} ({event['type']}) is dead: {error}")
+            else:
+                delay = min(OUTBOX_BACKOFF_BASE ** attempts, OUTBOX_BACKOFF_MAX)
+                update["available_at"] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+            await self.outbox.update_one(
+                {"_id": event["_id"]},
+                {"$set": update, "$unset": {"claim_id": ""}}
+            )
+
+    async def process_batch(self) -> int:
+        """Обрабатывает одну пачку событий. Возвращает число взятых событий."""
+        events = await self._claim()
+        if not events:
+            return 0
+
+        started = time.perf_counter()
+        by_type: Dict[str, List[dict]] = defaultdict(list)
+        for event in events:
+            by_type[event["type"]].append(event)
+
+        done: List[dict] = []
+        for event_type, typed_events in by_type.items():
+            try:
+                for handler in self.handlers.get(event_type, []):
+                    await self._run_handler(handler, typed_events)
+            except Exception as e:
+                self.failed += len(typed_events)
+                logger.error(f"Outbox handler failed for {event_type}: {e}")
+                await self._retry(typed_events, str(e))
+            else:
+                done.extend(typed_events)
+
+        if done:
+            await self.outbox.update_many(
+                {"_id": {"$in": [event["_id"] for event in done]}},
+                {"$set": {"status": "processed", "processed_at": datetime.utcnow()}, "$unset": {"claim_id": ""}}
+            )
+            self.processed += len(done)
+        self.last_batch_duration = time.perf_counter() - started
+        return len(events)
+
+    async def run(self, stop_event: Optional[asyncio.Event] = None) -> None:
+        """Обрабатывает outbox, пока не выставлен stop_event."""
+        stop_event = stop_event or asyncio.Event()
+        with priority_scope(PRIORITY_BACKGROUND):
+            await self._consume(stop_event)
+
+    async def _consume(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                claimed = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Error in outbox consumer: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=OUTBOX_IDLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def get_metrics(self) -> Dict[str, object]:
+        """Отставание outbox и счетчики обработки в этом процессе."""
+        pending = await self.outbox.count_documents({"status": "pending"})
+        oldest = await self.outbox.find_one(
+            {"status": "pending"}, projection={"created_at": 1}, sort=[("created_at", ASCENDING)]
+        )
+        lag = (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0
+        return {
+            "pending": pending,
+            "lag_seconds": lag,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dead": self.dead,
+            "last_batch_duration": self.last_batch_duration
+        }
+
+
+def register_submission_handlers(
+    consumer: OutboxConsumer,
+    db: Database,
+    channel_manager: ChannelManager,
+    notifications: NotificationManager
+) -> None:
+    """Подключает побочные эффекты модерации видео к outbox."""
+
+    async def award_points(events: List[dict], session) -> None:
+        for event in events:
+            await db.update_leaderboard(event["payload"]["user_id"], POINTS_PER_APPROVAL, session=session)
+
+    async def record_completion(events: List[dict], session) -> None:
+        for event in events:
+            payload = event["payload"]
+            # Уникальный индекс отсекает повтор; потерянную дельту поправит сверка счетчиков
+            if await db.add_completion(payload["user_id"], payload["challenge_id"]):
+                db.challenge_counters.incr(payload["challenge_id"], "completions_count")
+
+    async def challenge_titles(events: List[dict]) -> Dict[int, str]:
+        challenges = await db.get_challenges_by_ids({event["payload"]["challenge_id"] for event in events})
+        return {challenge_id: challenge.title for challenge_id, challenge in challenges.items()}
+
+    async def publish(events: List[dict], session) -> None:
+        titles = await challenge_titles(events)
+        for event in events:
+            payload = event["payload"]
+            await channel_manager.publish_video(
+                video_file_id=payload["video_file_id"],
+                caption=f"🎯 Челлендж: {titles.get(payload['challenge_id'], payload['challenge_id'])}",
+                user_id=payload["user_id"],
+                challenge_id=payload["challenge_id"],
+                submission_id=payload["submission_id"]
+            )
+
+    async def notify(events: List[dict], session) -> None:
+        titles = await challenge_titles(events)
+        batch = [
+            notifications.moderation_notification(
+                event["payload"], titles.get(event["payload"]["challenge_id"], str(event["payload"]["challenge_id"]))
+            )
+            for event in events
+        ]
+        failed = {id(notification) for notification in await notifications.send_notifications(batch)}
+        if failed:
+            raise PartialHandlerFailure(
+                [event for event, notification in zip(events, batch) if id(notification) in failed],
+                f"{len(failed)} of {len(batch)} notifications not delivered"
+            )
+
+    consumer.register("submission.approved", "award_points", award_points, transactional=True)
+    consumer.register("submission.approved", "record_completion", record_completion)
+    consumer.register("submission.approved", "publish", publish)
+    consumer.register("submission.approved", "notify", notify)
+    consumer.register("submission.rejected", "notify", notify)
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import logging
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne, ReturnDocument
+
+from config import (
+    RECOMMENDER_POOL_SIZE,
+    RECOMMENDER_POOL_LOW_WATER,
+    RECOMMENDER_CATALOG_TTL,
+    RECOMMENDER_REFILL_BATCH_SIZE
+)
+from database.completions import CompletionSet
+from database.models import Challenge
+from database.operations import Database
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед фоновой дозаправкой, чтобы собрать пользователей в одну пачку
+REFILL_DELAY = 0.5
+
+
+class ChallengeRecommender:
+    """Персональный "рандом челлендж" из заранее подготовленных пулов кандидатов.
+
+    Для каждого пользователя в коллекции recommendation_pools хранится короткий
+    список кандидатов, выбранных взвешенной выборкой по любимым категориям,
+    прогрессии сложности и популярности челленджа. Выдача — один $pop по _id,
+    пулы пополняются фоновыми пачками по каталогу, закешированному в памяти.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.pools = db.db.recommendation_pools
+        self._catalog: Dict[int, dict] = {}
+        self._catalog_loaded_at = 0.0
+        self._catalog_lock = asyncio.Lock()
+        self._pending_refills: set = set()
+        self._refill_task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self) -> None:
+        await self.pools.create_index([("size", ASCENDING)])
+        await self.db.completions.ensure_indexes()
+
+    async def warm_up(self) -> None:
+        """Загружает каталог заранее, чтобы первый пользователь не ждал его чтения."""
+        await self._get_catalog()
+
+    async def _get_catalog(self) -> Dict[int, dict]:
+        """Возвращает активные челленджи из кеша, перечитывая его раз в RECOMMENDER_CATALOG_TTL."""
+        if time.monotonic() - self._catalog_loaded_at < RECOMMENDER_CATALOG_TTL:
+            return self._catalog
+        async with self._catalog_lock:
+            if time.monotonic() - self._catalog_loaded_at >= RECOMMENDER_CATALOG_TTL:
+                cursor = self.db.challenges.find(
+                    {"is_active": True},
+                    projection={
+                        "_id": 0, "challenge_id": 1, "category": 1, "difficulty": 1,
+                        "completions_count": 1, "views_count": 1
+                    }
+                )
+                self._catalog = {doc["challenge_id"]: doc async for doc in cursor}
+                self._catalog_loaded_at = time.monotonic()
+        return self._catalog
+
+    def _rank(self, catalog: Dict[int, dict], completed: CompletionSet) -> List[int]:
+        """Выбирает кандидатов взвешенной выборкой без повторений."""
+        done = [catalog[challenge_id] for challenge_id in completed if challenge_id in catalog]
+
+        categories = Counter(challenge["category"] for challenge in done)
+        total = sum(categories.values())
+        # Следующий уровень сложности чуть выше среднего из пройденных
+        target_difficulty = (
+            sum(challenge.get("difficulty", 1) for challenge in done) / len(done) + 0.5
+            if done else 1.0
+        )
+        max_popularity = max(
+            (self._popularity(challenge) for challenge in catalog.values()), default=0
+        ) or 1.0
+
+        keyed = []
+        for challenge_id, challenge in catalog.items():
+            if challenge_id in completed:
+                continue
+            affinity = (1 + categories[challenge["category"]]) / (1 + total)
+            difficulty_fit = 1 / (1 + abs(challenge.get("difficulty", 1) - target_difficulty))
+            popularity = self._popularity(challenge) / max_popularity
+            weight = (0.2 + affinity) * difficulty_fit * (0.5 + popularity)
+            # Ключ Эфраимидиса — Спиракиса: top-k по ключу дает взвешенную выборку
+            keyed.append((random.random() ** (1 / weight), challenge_id))
+
+        return [challenge_id for _, challenge_id in heapq.nlargest(RECOMMENDER_POOL_SIZE, keyed)]
+
+    @staticmethod
+    def _popularity(challenge: dict) -> float:
+        return math.log1p(challenge.get("completions_count", 0)) + 0.5 * math.log1p(challenge.get("views_count", 0))
+
+    async def refill_pools(self, user_ids: List[int]) -> int:
+        """Пересобирает пулы кандидатов для пачки пользователей одним bulk_write."""
+        if not user_ids:
+            return 0
+        catalog = await self._get_catalog()
+        completions = await self.db.completions.load_many(user_ids)
+        operations = []
+        for user_id in user_ids:
+            # Документа пользователя может не быть вовсе: пул строится с нуля
+            candidates = self._rank(catalog, completions.get(user_id) or CompletionSet())
+            operations.append(UpdateOne(
+                {"_id": user_id},
+                {"$set": {"candidates": candidates, "size": len(candidates), "refilled_at": time.time()}},
+                upsert=True
+            ))
+        await self.pools.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def refill_low_pools(self, limit: int = 1000) -> int:
+        """Фоновая задача: пополняет пулы, опустевшие ниже порога."""
+        refilled = 0
+        cursor = self.pools.find(
+            {"size": {"$lt": RECOMMENDER_POOL_LOW_WATER}}, projection={"_id": 1}
+        ).limit(limit)
+        batch: List[int] = []
+        async for doc in cursor:
+            batch.append(doc["_id"])
+            if len(batch) >= RECOMMENDER_REFILL_BATCH_SIZE:
+                refilled += await self.refill_pools(batch)
+                batch = []
+        refilled += await self.refill_pools(batch)
+        return refilled
+
+    def _schedule_refill(self, user_id: int) -> None:
+        self._pending_refills.add(user_id)
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._drain_refills())
+
+    async def _drain_refills(self) -> None:
+        await asyncio.sleep(REFILL_DELAY)
+        while self._pending_refills:
+            batch = [self._pending_refills.pop() for _ in range(
+                min(len(self._pending_refills), RECOMMENDER_REFILL_BATCH_SIZE)
+            )]
+            try:
+                await self.refill_pools(batch)
+            except Exception as e:
+                logger.error(f"Error refilling recommendation pools: {e}")
+
+    async def _pop_candidate(self, user_id: int) -> Optional[int]:
+        """Снимает первого кандидата из пула одним запросом по _id."""
+        doc = await self.pools.find_one_and_update(
+            {"_id": user_id, "size": {"$gt": 0}},
+            {"$pop": {"candidates": -1}, "$inc": {"size": -1}},
+            projection={"candidates": {"$slice": 1}, "size": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not doc:
+            return None
+        if doc["size"] - 1 < RECOMMENDER_POOL_LOW_WATER:
+            self._schedule_refill(user_id)
+        return doc["candidates"][0] if doc["candidates"] else None
+
+    async def pick(self, user_id: int) -> Optional[Challenge]:
+        """Возвращает персональный случайный челлендж для пользователя."""
+        catalog = await self._get_catalog()
+        # Несколько попыток на случай, если кандидат успел стать неактивным
+        for _ in range(3):
+            challenge_id = await self._pop_candidate(user_id)
+            if challenge_id is None:
+                # Пула еще нет — собираем его сразу, это единственный синхронный путь
+                if not await self.refill_pools([user_id]):
+                    return None
+                challenge_id = await self._pop_candidate(user_id)
+                if challenge_id is None:
+                    return None
+            if challenge_id in catalog and not await self.db.has_completed(user_id, challenge_id):
+                challenge = await self.db.get_challenge(challenge_id)
+                if challenge and challenge.is_active:
+                    return challenge
+        return None
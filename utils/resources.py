@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from functools import cached_property
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from telegram.ext import Application
+
+from config import HEALTH_PORT, HEALTH_CHECK_TIMEOUT, MONGO_WARM_CONNECTIONS
+from database.operations import Database, mongo_breaker
+from utils.channel_manager import ChannelManager
+from utils.circuit_breaker import OPEN, telegram_breaker
+from utils.media import MediaRegistry
+from utils.notifications import NotificationManager
+from utils.recommender import ChallengeRecommender
+from utils.search import ChallengeSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Состояния компонента (бота) процесса
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class Resources:
+    """Общие клиенты процесса, создаваемые при первом обращении.
+
+    Импорт модуля бота ничего не подключает: Database, менеджеры и кеши
+    появляются, когда их впервые попросит обработчик или main, и все боты
+    процесса делят один клиент Mongo. warm_up параллельно прогревает пул
+    соединений и кеши до первого апдейта, а итоги прогрева и состояние
+    зависимостей отдаются на /healthz и /readyz.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready_after: Optional[float] = None
+        self.components: Dict[str, str] = {}
+        # имя прогрева -> {"ok", "ms", "error"}
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.required: set = set()
+        self._once: Dict[str, asyncio.Task] = {}
+        self._background: Dict[str, asyncio.Task] = {}
+
+    @cached_property
+    def db(self) -> Database:
+        return Database()
+
+    @cached_property
+    def notifications(self) -> NotificationManager:
+        return NotificationManager(self.db)
+
+    @cached_property
+    def channel_manager(self) -> ChannelManager:
+        return ChannelManager(self.db)
+
+    @cached_property
+    def recommender(self) -> ChallengeRecommender:
+        return ChallengeRecommender(self.db)
+
+    @cached_property
+    def search_index(self) -> ChallengeSearchIndex:
+        return ChallengeSearchIndex(self.db)
+
+    @cached_property
+    def media(self) -> MediaRegistry:
+        return MediaRegistry(self.db.media_files)
+
+    async def warm_mongo(self) -> None:
+        """Открывает несколько соединений пула параллельными ping."""
+        await asyncio.gather(*(self.db.ping() for _ in range(MONGO_WARM_CONNECTIONS)))
+
+    async def _run_check(self, name: str, func: Callable[[], Awaitable]) -> None:
+        started = time.perf_counter()
+        try:
+            await func()
+        except Exception as e:
+            self.checks[name] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000), "error": str(e)}
+            raise
+        self.checks[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000)}
+
+    def _check_once(self, name: str, func: Callable[[], Awaitable]) -> asyncio.Task:
+        # Боты процесса прогревают общие зависимости один раз на всех
+        task = self._once.get(name)
+        if task is None:
+            task = self._once[name] = asyncio.ensure_future(self._run_check(name, func))
+        return task
+
+    def start_background(
+        self,
+        name: str,
+        func: Callable[[asyncio.Event], Awaitable],
+        stop_event: asyncio.Event
+    ) -> asyncio.Task:
+        """Запускает фоновый цикл один раз на процесс.
+
+        Боты процесса делят Database и его буферы: второй цикл того же
+        буфера перехватил бы его сигнал раннего сброса.
+        """
+        task = self._background.get(name)
+        if task is None or task.done():
+            task = self._background[name] = asyncio.ensure_future(func(stop_event))
+        return task
+
+    async def warm_up(
+        self,
+        tasks: Dict[str, Callable[[], Awaitable]],
+        optional: Iterable[str] = ()
+    ) -> None:
+        """Выполняет прогрев параллельно.
+
+        Ошибка обязательного шага пробрасывается, как раньше при
+        последовательном старте; необязательные (кеши) только логируются —
+        бот заработает и с холодным кешем.
+        """
+        optional = set(optional)
+        self.required.update(name for name in tasks if name not in optional)
+        names = list(tasks)
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._check_once(name, tasks[name]) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                if name in optional:
+                    logger.warning(f"Warm-up step {name} failed: {result}")
+                else:
+                    raise result
+        logger.info(
+            f"Warm-up of {', '.join(names)} took {time.perf_counter() - started:.3f}s: "
+            + ", ".join(f"{name}={self.checks[name]['ms']}ms" for name in names if name in self.checks)
+        )
+
+    def starting(self, component: str) -> None:
+        self.components[component] = STARTING
+
+    def failed(self, component: str) -> None:
+        self.components[component] = FAILED
+
+    def ready(self, component: str) -> None:
+        self.components[component] = READY
+        if self.is_started and self.ready_after is None:
+            self.ready_after = time.monotonic() - self.started_at
+            logger.info(f"All components ready {self.ready_after:.3f}s after process start")
+
+    @property
+    def is_started(self) -> bool:
+        return bool(self.components) and all(state == READY for state in self.components.values())
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Состояние каждой зависимости. Mongo проверяется живым ping с таймаутом."""
+        dependencies: Dict[str, Dict[str, Any]] = {}
+        if "db" in vars(self):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.db.ping(), timeout=HEALTH_CHECK_TIMEOUT)
+                dependencies["mongo"] = {"ok": True}
+            except Exception as e:
+                dependencies["mongo"] = {"ok": False, "error": str(e) or type(e).__name__}
+            dependencies["mongo"]["ms"] = round((time.perf_counter() - started) * 1000)
+        for breaker in (mongo_breaker, telegram_breaker):
+            dependencies[f"{breaker.name}_breaker"] = {"ok": breaker.state != OPEN, "state": breaker.state}
+
+        ready = (
+            self.is_started
+            and all(self.checks.get(name, {}).get("ok") for name in self.required)
+            and all(dependency["ok"] for dependency in dependencies.values())
+        )
+        return {
+            "ready": ready,
+            "components": self.components,
+            "warm_up": self.checks,
+            "dependencies": dependencies,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None
+        }
+
+
+resources = Resources()
+
+
+async def start_health_server(port: int = HEALTH_PORT):
+    """Поднимает /healthz и /readyz на aiohttp. Возвращает runner для cleanup."""
+    # aiohttp.web импортируется ~0.2 с, а нужен только процессу с веб-портом
+    from aiohttp import web
+
+    async def healthz(request):
+        """Живость: цикл событий отвечает."""
+        return web.json_response({
+            "status": "ok",
+            "uptime_seconds": round(time.monotonic() - resources.started_at, 3)
+        })
+
+    async def readyz(request):
+        """Готовность: боты запущены, прогрев прошел, зависимости доступны."""
+        report = await resources.readiness()
+        return web.json_response(report, status=200 if report["ready"] else 503)
+
+    app = web.Application()
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    logger.info(f"Health endpoints listening on port {port}")
+    return runner
+
+
+async def run_bot(
+    name: str,
+    application: Application,
+    warm_up: Optional[Dict[str, Callable[[], Awaitable]]] = None,
+    optional: Iterable[str] = (),
+    background: Optional[Dict[str, Callable[[asyncio.Event], Awaitable]]] = None,
+    stop_event: Optional[asyncio.Event] = None,
+    **polling_kwargs
+) -> None:
+    """Запускает приложение и держит long polling, пока не выставлен stop_event.
+
+    getMe и прогрев зависимостей идут параллельно, а не друг за другом.
+    Фоновые циклы из background вызываются как run(stop_event): стартуют
+    вместе с приложением, один раз на процесс под своим именем, и
+    дорабатывают свою итерацию при остановке.
+    """
+    resources.starting(name)
+    stop_event = stop_event or asyncio.Event()
+    tasks: Dict[str, asyncio.Task] = {}
+    try:
+        await resources.warm_up({f"telegram.{name}": application.initialize, **(warm_up or {})}, optional)
+        await application.start()
+        for task_name, func in (background or {}).items():
+            tasks[task_name] = resources.start_background(task_name, func, stop_event)
+        await application.updater.start_polling(**polling_kwargs)
+        resources.ready(name)
+        await stop_event.wait()
+    except Exception:
+        resources.failed(name)
+        raise
+    finally:
+        stop_event.set()
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        # Фоновые циклы делают последний сброс, пока транспорт еще открыт
+        for task_name, result in zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.error(f"Background task {task_name} failed: {result}")
+        await application.shutdown()
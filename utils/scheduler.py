@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from telegram.ext import Application, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Диапазоны полей cron: минута, час, день месяца, месяц, день недели (0 — воскресенье)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+JOB_RUNS_RETENTION_DAYS = 30
+
+
+class CronSchedule:
+    """Расписание в формате cron из пяти полей: "*/10 * * * *", "0 0 * * 1", "5,35 9-18 * * *"."""
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.fields: List[Set[int]] = [
+            self._parse_field(part, low, high) for part, (low, high) in zip(parts, CRON_FIELDS)
+        ]
+        # Как в cron: если ограничены и день месяца, и день недели, подходит любой из них
+        self._day_or = parts[2] != "*" and parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/")
+                step = int(step_text)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start_text, end_text = item.split("-")
+                start, end = int(start_text), int(end_text)
+            else:
+                start = end = int(item)
+            if start < low or end > high or step < 1:
+                raise ValueError(f"Cron field out of range: {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches(self, dt: datetime) -> bool:
+        minute, hour, day, month, weekday = self.fields
+        # isoweekday: 1 — понедельник ... 7 — воскресенье
+        day_of_week = dt.isoweekday() % 7
+        if dt.minute not in minute or dt.hour not in hour or dt.month not in month:
+            return False
+        if self._day_or:
+            return dt.day in day or day_of_week in weekday
+        return dt.day in day and day_of_week in weekday
+
+
+class ScheduledJob:
+    def __init__(self, name: str, schedule: CronSchedule, func: Callable[[], Awaitable], lease_seconds: int):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.lease_seconds = lease_seconds
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration: Optional[float] = None
+
+
+class JobScheduler:
+    """Периодические задачи поверх Application.job_queue с арендой в Mongo.
+
+    Раз в минуту каждая реплика проверяет расписания, но задачу запускает только
+    та, что первой захватила документ аренды в job_leases для этой минуты.
+    Пока задача работает, аренда продлевается, поэтому долгие задачи не
+    перекрываются ни между репликами, ни внутри процесса. Каждый запуск
+    записывается в job_runs с длительностью и результатом.
+    """
+
+    def __init__(self, application: Application, db, owner: Optional[str] = None):
+        self.application = application
+        self.leases = db.db.job_leases
+        self.runs = db.db.job_runs
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._running: Set[str] = set()
+
+    def register(
+        self,
+        name: str,
+        cron: str,
+        func: Callable[[], Awaitable],
+        lease_seconds: int = 10 * 60
+    ) -> None:
+        """Регистрирует задачу. Пустое расписание отключает ее."""
+        if not cron:
+            logger.info(f"Job {name} is disabled")
+            return
+        self.jobs[name] = ScheduledJob(name, CronSchedule(cron), func, lease_seconds)
+
+    async def ensure_indexes(self) -> None:
+        await self.runs.create_index([("job", ASCENDING), ("started_at", DESCENDING)])
+        await self.runs.create_index(
+            [("started_at", ASCENDING)], expireAfterSeconds=JOB_RUNS_RETENTION_DAYS * 24 * 60 * 60
+        )
+
+    def start(self) -> None:
+        """Запускает ежеминутную проверку расписаний в job_queue приложения."""
+        now = datetime.utcnow()
+        first = 60 - now.second - now.microsecond / 1_000_000
+        self.application.job_queue.run_repeating(self._tick, interval=60, first=first, name="scheduler")
+
+    async def _tick(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        for job in self.jobs.values():
+            if not job.schedule.matches(now):
+                continue
+            if job.name in self._running:
+                job.skipped += 1
+                logger.warning(f"Job {job.name} is still running, skipping {now:%H:%M}")
+                continue
+            self.application.create_task(self.run_job(job.name, run_key=now.strftime("%Y-%m-%dT%H:%M")))
+
+    async def _acquire(self, job: ScheduledJob, run_key: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            lease = await self.leases.find_one_and_update(
+                {
+                    "_id": job.name,
+                    "last_run_key": {"$ne": run_key},
+                    "$or": [{"lease_until": {"$lt": now}}, {"lease_until": None}]
+                },
+                {"$set": {
+                    "owner": self.owner,
+                    "lease_until": now + timedelta(seconds=job.lease_seconds),
+                    "last_run_key": run_key
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Документ есть, но аренда занята или запуск за эту минуту уже был
+            return False
+        return lease is not None
+
+    async def _renew(self, job: ScheduledJob) -> None:
+        """Продлевает аренду, пока задача выполняется."""
+        while True:
+            await asyncio.sleep(job.lease_seconds / 3)
+            await self.leases.update_one(
+                {"_id": job.name, "owner": self.owner},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=job.lease_seconds)}}
+            )
+
+    async def run_job(self, name: str, run_key: Optional[str] = None) -> bool:
+        """Запускает задачу, если удалось захватить аренду. Возвращает True, если задача выполнялась."""
+        job = self.jobs[name]
+        run_key = run_key or datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        if name in self._running or not await self._acquire(job, run_key):
+            return False
+
+        self._running.add(name)
+        renewer = asyncio.create_task(self._renew(job))
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        status, error = "success", None
+        try:
+            await job.func()
+        except Exception as e:
+            status, error = "failed", str(e)
+            job.failures += 1
+            logger.error(f"Job {name} failed: {e}")
+        finally:
+            renewer.cancel()
+            self._running.discard(name)
+
+        duration = time.perf_counter() - started
+        job.runs += 1
+        job.last_duration = duration
+        await self.leases.update_one(
+            {"_id": name, "owner": self.owner},
+            {"$set": {
+                "lease_until": datetime.utcnow(),
+                "last_status": status,
+                "last_duration_ms": int(duration * 1000)
+            }}
+        )
+        await self.runs.insert_one({
+            "job": name,
+            "run_key": run_key,
+            "owner": self.owner,
+            "started_at": started_at,
+            "finished_at": datetime.utcnow(),
+            "duration_ms": int(duration * 1000),
+            "status": status,
+            "error": error
+        })
+        logger.info(f"Job {name} finished with {status} in {duration:.2f}s")
+        return True
+
+    def get_metrics(self) -> Dict[str, dict]:
+        """Счетчики запусков задач в этом процессе."""
+        return {
+            name: {
+                "runs": job.runs,
+                "failures": job.failures,
+                "skipped": job.skipped,
+                "last_duration": job.last_duration,
+                "running": name in self._running
+            }
+            for name, job in self.jobs.items()
+        }
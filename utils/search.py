@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import heapq
+import logging
+import math
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    SEARCH_REBUILD_SECONDS,
+    SEARCH_REFRESH_SECONDS,
+    SEARCH_RESULTS_LIMIT,
+    SEARCH_WATERMARK_LAG
+)
+from database.operations import Database
+
+logger = logging.getLogger(__name__)
+
+# Вес совпадения в зависимости от поля
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "category": 2.0, "description": 1.0}
+# Минимальное сходство по триграммам, чтобы считать слово опечаткой
+FUZZY_THRESHOLD = 0.3
+# Сколько похожих слов словаря брать на одно слово запроса
+FUZZY_CANDIDATES = 3
+# Вес продолжения слова: "танц" находит "танцевальный"
+PREFIX_SIMILARITY = 0.7
+PREFIX_CANDIDATES = 5
+# Для частых слов оцениваются только документы, где слово весит больше всего
+MAX_SCORED_POSTINGS = 200
+# Насколько популярность может поднять релевантный челлендж
+POPULARITY_WEIGHT = 0.3
+MIN_STEM = 3
+
+TOKEN_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile(r"[а-я]")
+STOPWORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "для", "из", "за", "от", "до", "не", "как", "что",
+    "the", "a", "an", "of", "to", "and", "or", "in", "on", "for", "with"
+}
+# Окончания, которые отрезает легкий стеммер
+RU_SUFFIXES = {
+    "иями", "ями", "ами", "ией", "ого", "его", "ому", "ему", "ыми", "ими", "ться", "тся",
+    "ешь", "ать", "ять", "ить", "еть", "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой",
+    "ую", "юю", "ом", "ем", "ах", "ях", "ов", "ев", "ей", "ам", "ям", "ия", "ию", "ть",
+    "ся", "сь", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+}
+EN_SUFFIXES = {"ing", "ies", "es", "ed", "ly", "s"}
+MAX_SUFFIX = max(len(suffix) for suffix in RU_SUFFIXES | EN_SUFFIXES)
+
+
+@functools.lru_cache(maxsize=100000)
+def stem(word: str) -> str:
+    """Отрезает самое длинное известное окончание, оставляя основу не короче MIN_STEM."""
+    suffixes = RU_SUFFIXES if CYRILLIC_RE.search(word) else EN_SUFFIXES
+    for length in range(min(MAX_SUFFIX, len(word) - MIN_STEM), 0, -1):
+        suffix = word[-length:]
+        if suffix in suffixes:
+            return word[:-length] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Нормализует текст (регистр, ё) и возвращает основы значимых слов."""
+    words = TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [stem(word) for word in words if len(word) > 1 and word not in STOPWORDS]
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def popularity(challenge: dict) -> float:
+    return math.log1p(challenge.get("completions_count", 0)) + 0.5 * math.log1p(challenge.get("views_count", 0))
+
+
+class ChallengeSearchIndex:
+    """Полнотекстовый поиск по активным челленджам в памяти процесса.
+
+    Обратный индекс хранит для каждой основы слова веса документов по полям
+    (название важнее тегов и категории, те — описания). Слова запроса,
+    которых нет в словаре, заменяются похожими по триграммам, поэтому
+    опечатки находят нужный челлендж. Итоговый балл — TF-IDF по полям,
+    умноженный на покрытие запроса и немного поднятый популярностью.
+
+    Индекс догружается по last_updated не чаще раза в SEARCH_REFRESH_SECONDS:
+    новые и измененные челленджи переиндексируются, у остальных
+    обновляется только популярность. last_updated пишут клиенты, и документ
+    может появиться в базе с меткой старше уже прочитанных (импорт ставит
+    ее при разборе строки, часы другого хоста отстают), поэтому догрузка
+    перечитывает последние SEARCH_WATERMARK_LAG секунд, а раз в
+    SEARCH_REBUILD_SECONDS челленджи перечитываются целиком.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # Постинги частых слов, отсортированные по весу; строятся при первом запросе
+        self._impacts: Dict[str, List[Tuple[float, int]]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        # Отсортированный словарь для поиска по началу слова
+        self._vocabulary: List[str] = []
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._signatures: Dict[int, tuple] = {}
+        self._docs: Dict[int, dict] = {}
+        self._max_popularity = 1.0
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _add_term(self, term: str, challenge_id: int, weight: float) -> None:
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = {}
+            insort(self._vocabulary, term)
+            for trigram in trigrams(term):
+                self._trigrams.setdefault(trigram, set()).add(term)
+        postings[challenge_id] = weight
+        self._impacts.pop(term, None)
+
+    def _remove_terms(self, challenge_id: int) -> None:
+        for term in self._doc_terms.pop(challenge_id, {}):
+            postings = self._postings[term]
+            postings.pop(challenge_id, None)
+            self._impacts.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+                for trigram in trigrams(term):
+                    terms = self._trigrams[trigram]
+                    terms.discard(term)
+                    if not terms:
+                        del self._trigrams[trigram]
+
+    def remove(self, challenge_id: int) -> None:
+        self._remove_terms(challenge_id)
+        self._signatures.pop(challenge_id, None)
+        self._docs.pop(challenge_id, None)
+
+    def upsert(self, challenge: dict) -> None:
+        """Добавляет или обновляет челлендж; неактивные убираются из индекса."""
+        challenge_id = challenge["challenge_id"]
+        if not challenge.get("is_active", True):
+            self.remove(challenge_id)
+            return
+
+        self._docs[challenge_id] = {
+            "challenge_id": challenge_id,
+            "title": challenge["title"],
+            "category": challenge["category"],
+            "difficulty": challenge.get("difficulty", 1),
+            "popularity": popularity(challenge)
+        }
+        fields = {
+            "title": challenge["title"],
+            "description": challenge.get("description", ""),
+            "category": challenge["category"],
+            "tags": " ".join(challenge.get("tags", []))
+        }
+        signature = tuple(fields.values())
+        if self._signatures.get(challenge_id) == signature:
+            # Текст не менялся, пришли только новые счетчики
+            return
+
+        self._remove_terms(challenge_id)
+        weights: Dict[str, float] = {}
+        for field, text in fields.items():
+            for term, count in Counter(tokenize(text)).items():
+                # Повторы слова в поле дают убывающую прибавку
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field] * (1 + math.log(count))
+        for term, weight in weights.items():
+            self._add_term(term, challenge_id, weight)
+        self._doc_terms[challenge_id] = weights
+        self._signatures[challenge_id] = signature
+
+    def _fuzzy_terms(self, term: str) -> List[Tuple[str, float]]:
+        """Слова словаря, похожие на term по триграммам, с коэффициентом сходства."""
+        query_trigrams = trigrams(term)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        scored = []
+        for candidate, common in shared.items():
+            # У слова из n букв n + 2 триграммы с учетом отступов
+            similarity = common / (len(query_trigrams) + len(candidate) + 2 - common)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((similarity, candidate))
+        return [(candidate, similarity) for similarity, candidate in heapq.nlargest(FUZZY_CANDIDATES, scored)]
+
+    def _scored_postings(self, term: str) -> Iterable[Tuple[int, float]]:
+        """Постинги слова; у частых слов — только MAX_SCORED_POSTINGS самых весомых."""
+        postings = self._postings[term]
+        if len(postings) <= MAX_SCORED_POSTINGS:
+            return postings.items()
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            impacts = self._impacts[term] = heapq.nlargest(
+                MAX_SCORED_POSTINGS, ((weight, challenge_id) for challenge_id, weight in postings.items())
+            )
+        return ((challenge_id, weight) for weight, challenge_id in impacts)
+
+    def _prefix_terms(self, term: str) -> List[Tuple[str, float]]:
+        """Слова словаря, которые продолжают term."""
+        found = []
+        index = bisect_left(self._vocabulary, term)
+        while index < len(self._vocabulary) and len(found) < PREFIX_CANDIDATES:
+            candidate = self._vocabulary[index]
+            if not candidate.startswith(term):
+                break
+            if candidate != term:
+                found.append((candidate, PREFIX_SIMILARITY))
+            index += 1
+        return found
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Слова словаря для слова запроса: точное и продолжения, а если их нет — похожие."""
+        candidates = [(term, 1.0)] if term in self._postings else []
+        if len(term) >= MIN_STEM:
+            candidates.extend(self._prefix_terms(term))
+        return candidates or self._fuzzy_terms(term)
+
+    def search(self, query: str, limit: int = SEARCH_RESULTS_LIMIT) -> List[dict]:
+        """Возвращает найденные челленджи (краткие карточки) по убыванию релевантности."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._docs:
+            return []
+
+        total = len(self._docs)
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        for term in terms:
+            candidates = self._expand(term)
+            best: Dict[int, float] = {}
+            for candidate, similarity in candidates:
+                idf = math.log(1 + total / len(self._postings[candidate]))
+                for challenge_id, weight in self._scored_postings(candidate):
+                    score = similarity * weight * idf
+                    if score > best.get(challenge_id, 0.0):
+                        best[challenge_id] = score
+            for challenge_id, score in best.items():
+                scores[challenge_id] = scores.get(challenge_id, 0.0) + score
+                matched[challenge_id] += 1
+
+        ranked = heapq.nlargest(limit, (
+            (
+                score * (matched[challenge_id] / len(terms)) ** 2
+                * (1 + POPULARITY_WEIGHT * self._docs[challenge_id]["popularity"] / self._max_popularity),
+                challenge_id
+            )
+            for challenge_id, score in scores.items()
+        ))
+        return [self._docs[challenge_id] for _, challenge_id in ranked]
+
+    def build(self, challenges: Iterable[dict]) -> None:
+        for challenge in challenges:
+            self.upsert(challenge)
+        self._max_popularity = max((doc["popularity"] for doc in self._docs.values()), default=0.0) or 1.0
+
+    async def refresh(self, force: bool = False) -> int:
+        """Догружает челленджи, измененные с прошлого обновления. Возвращает их число."""
+        if not force and time.monotonic() - self._refreshed_at < SEARCH_REFRESH_SECONDS:
+            return 0
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if not force and time.monotonic() - self._refreshed_at < SEARCH_REFRESH_SECONDS:
+                return 0
+            started = time.perf_counter()
+            full = self._watermark is None or time.monotonic() - self._rebuilt_at >= SEARCH_REBUILD_SECONDS
+            # Перечитанные повторно документы просто переиндексируются, это безопасно
+            query = {} if full else {
+                "last_updated": {"$gte": self._watermark - timedelta(seconds=SEARCH_WATERMARK_LAG)}
+            }
+            cursor = self.db.challenges.find(query, projection={
+                "_id": 0, "challenge_id": 1, "title": 1, "description": 1, "category": 1,
+                "tags": 1, "difficulty": 1, "is_active": 1, "completions_count": 1,
+                "views_count": 1, "last_updated": 1
+            })
+            changed = [doc async for doc in cursor]
+            if full:
+                # Удаленные из базы челленджи при догрузке не видны
+                for challenge_id in set(self._docs) - {doc["challenge_id"] for doc in changed}:
+                    self.remove(challenge_id)
+                self._rebuilt_at = time.monotonic()
+            self.build(changed)
+            for doc in changed:
+                if doc.get("last_updated") and (self._watermark is None or doc["last_updated"] > self._watermark):
+                    self._watermark = doc["last_updated"]
+            self._refreshed_at = time.monotonic()
+            if changed:
+                logger.info(
+                    f"Search index: {len(changed)} challenges updated in "
+                    f"{time.perf_counter() - started:.3f}s, {len(self._docs)} indexed"
+                )
+            return len(changed)
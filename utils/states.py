@@ -30,10 +30,13 @@ class AdminStates(Enum):
     # Модерация
     MODERATING_VIDEOS = auto()
     REJECTING_VIDEO = auto()
+    BATCH_MODERATING = auto()
+    BATCH_REJECTING = auto()
     
     # Управление челленджами
     ADDING_CHALLENGE = auto()
     EDITING_CHALLENGE = auto()
+    IMPORTING_CHALLENGES = auto()
     
     # Управление блогерами
     MANAGING_INFLUENCERS = auto()
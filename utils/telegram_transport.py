@@ -0,0 +1,333 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple, Union
+
+from telegram import Bot
+from telegram._utils.defaultvalue import DEFAULT_NONE
+from telegram._utils.types import ODVInput
+from telegram.ext import Application, ApplicationBuilder
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from config import (
+    TELEGRAM_POOL_SIZE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_RATE_PER_MINUTE,
+    TELEGRAM_MAX_PARK_SECONDS
+)
+from utils.tracing import TracingApplication, tracer
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих запросов: меньше — раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 5
+PRIORITY_BROADCAST = 10
+
+# Обработчики апдейтов работают с приоритетом по умолчанию, фоновые рассылки его понижают
+outbound_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_INTERACTIVE)
+
+# Методы, которые отправляют сообщения в чат и подпадают под лимиты на чат
+CHAT_LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+# Сколько раз переждать 429 самим, прежде чем отдать RetryAfter вызывающему
+TELEGRAM_429_RETRIES = 3
+# Сколько простаивающих корзин чатов держать, прежде чем чистить
+MAX_IDLE_BUCKETS = 10000
+
+# Ключ чата: числовой id или @username публичного канала/группы
+ChatKey = Union[int, str]
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """Выполняет блок с указанным приоритетом исходящих запросов."""
+    token = outbound_priority.set(priority)
+    try:
+        yield
+    finally:
+        outbound_priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов с резервированием: reserve возвращает, сколько подождать."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, now: float, weight: float = 1) -> bool:
+        self._refill(now)
+        return self.tokens >= weight
+
+    def reserve(self, now: float, weight: float = 1) -> float:
+        """Забирает weight токенов (в долг, если их нет) и возвращает время ожидания."""
+        self._refill(now)
+        self.tokens -= weight
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundLimiter:
+    """Лимиты Bot API на один токен: общий, на чат и на группу.
+
+    Сначала запрос дожидается своего чата (личные чаты — TELEGRAM_CHAT_RATE в
+    секунду с запасом TELEGRAM_CHAT_BURST, группы — TELEGRAM_GROUP_RATE_PER_MINUTE),
+    затем встает в общую очередь с приоритетом. Если общий токен свободен и
+    впереди никого нет, запрос уходит сразу, поэтому ответы пользователю не
+    ждут. Чат, получивший 429, паркуется на retry_after, остальные продолжают.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self.chat_buckets: Dict[ChatKey, TokenBucket] = {}
+        self.parked_until: Dict[ChatKey, float] = {}
+        self.global_parked_until = 0.0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.throttled = 0
+        self.retry_after_hits = 0
+
+    def _chat_bucket(self, chat_id: ChatKey, now: float) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > MAX_IDLE_BUCKETS:
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items() if not value.is_idle(now)
+                }
+            # @username бывает только у каналов и групп
+            if isinstance(chat_id, str) or chat_id < 0:
+                rate = TELEGRAM_GROUP_RATE_PER_MINUTE / 60
+                bucket = TokenBucket(rate, TELEGRAM_GROUP_RATE_PER_MINUTE)
+            else:
+                bucket = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def park(self, chat_id: Optional[ChatKey], retry_after: float) -> None:
+        """Запрещает отправку в чат (или вообще, если чат неизвестен) на retry_after секунд."""
+        until = time.monotonic() + retry_after
+        self.retry_after_hits += 1
+        if chat_id is None:
+            self.global_parked_until = max(self.global_parked_until, until)
+        else:
+            self.parked_until[chat_id] = max(self.parked_until.get(chat_id, 0.0), until)
+
+    async def _wait_for_chat(self, chat_id: ChatKey, weight: int, chat_limited: bool) -> None:
+        now = time.monotonic()
+        delay = self._chat_bucket(chat_id, now).reserve(now, weight) if chat_limited else 0.0
+        parked = self.parked_until.get(chat_id, 0.0) - now
+        if parked <= 0:
+            self.parked_until.pop(chat_id, None)
+        delay = max(delay, parked)
+        if delay > 0:
+            self.throttled += 1
+            await asyncio.sleep(delay)
+
+    async def acquire(self, chat_id: Optional[ChatKey], weight: int = 1, chat_limited: bool = True) -> None:
+        """Ждет, пока запрос можно отправить, не нарушая лимитов.
+
+        Без chat_limited лимит чата не тратится, но припаркованный чат ждет.
+        """
+        if chat_id is not None:
+            await self._wait_for_chat(chat_id, weight, chat_limited)
+
+        now = time.monotonic()
+        if not self._waiters and now >= self.global_parked_until and self.global_bucket.available(now, weight):
+            self.global_bucket.reserve(now, weight)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (outbound_priority.get(), next(self._sequence), weight, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        """Выдает общие токены ожидающим в порядке приоритета."""
+        while self._waiters:
+            priority, sequence, weight, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self.global_parked_until:
+                await asyncio.sleep(self.global_parked_until - now)
+                continue
+            delay = 0.0 if self.global_bucket.available(now, weight) else (
+                (weight - self.global_bucket.tokens) / self.global_bucket.rate
+            )
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.global_bucket.reserve(now, weight)
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def get_metrics(self) -> Dict[str, int]:
+        now = time.monotonic()
+        return {
+            "queued": len(self._waiters),
+            "chats": len(self.chat_buckets),
+            "parked_chats": sum(1 for until in self.parked_until.values() if until > now),
+            "throttled": self.throttled,
+            "retry_after": self.retry_after_hits
+        }
+
+
+class SharedRequest(BaseRequest):
+    """Общий HTTP-транспорт одного токена для всех Bot этого процесса.
+
+    Держит один пул соединений и пропускает запросы через OutboundLimiter.
+    Пул закрывается, когда его отпустил последний инициализировавший
+    пользователь, и открывается снова при следующем запросе.
+    """
+
+    def __init__(self, pool_size: int = TELEGRAM_POOL_SIZE):
+        self._inner = HTTPXRequest(connection_pool_size=pool_size, pool_timeout=5.0)
+        self.limiter = OutboundLimiter()
+        self._users = 0
+        self._closed = False
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._inner.read_timeout
+
+    async def initialize(self) -> None:
+        self._users += 1
+        if self._closed:
+            self._closed = False
+            await self._inner.initialize()
+
+    async def shutdown(self) -> None:
+        self._users = max(self._users - 1, 0)
+        if self._users == 0 and not self._closed:
+            self._closed = True
+            await self._inner.shutdown()
+
+    @staticmethod
+    def _chat_key(chat_id) -> Optional[ChatKey]:
+        """Числовой chat_id приводится к int: PTB передает строку (CHANNEL_ID из env) как есть."""
+        if chat_id is None or isinstance(chat_id, int):
+            return chat_id
+        text = str(chat_id).strip()
+        try:
+            return int(text)
+        except ValueError:
+            return text or None
+
+    @classmethod
+    def _limits_for(
+        cls,
+        url: str,
+        request_data: Optional[RequestData]
+    ) -> Tuple[bool, Optional[ChatKey], bool, int]:
+        """Возвращает (ограничивать ли, чат, тратить ли лимит чата, вес) для запроса."""
+        method = url.rsplit("/", 1)[-1]
+        if method.startswith("get"):
+            return False, None, False, 1
+        parameters = request_data.parameters if request_data else {}
+        chat_id = cls._chat_key(parameters.get("chat_id"))
+        weight = len(parameters.get("media", [])) if method == "sendMediaGroup" else 1
+        return True, chat_id, method.startswith(CHAT_LIMITED_PREFIXES), max(weight, 1)
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: ODVInput[float] = DEFAULT_NONE,
+        write_timeout: ODVInput[float] = DEFAULT_NONE,
+        connect_timeout: ODVInput[float] = DEFAULT_NONE,
+        pool_timeout: ODVInput[float] = DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        if self._closed:
+            # Bot вне Application может слать запросы и после остановки приложения
+            self._closed = False
+            await self._inner.initialize()
+        limited, chat_id, chat_limited, weight = self._limits_for(url, request_data)
+        # Сообщение из inline-режима адресовано чату, но какому — неизвестно
+        inline = chat_id is None and bool(request_data and "inline_message_id" in request_data.parameters)
+        api_method = url.rsplit("/", 1)[-1]
+        for _ in range(TELEGRAM_429_RETRIES):
+            with tracer.span(f"telegram.{api_method}", **{"telegram.chat_id": chat_id}) as span:
+                if limited:
+                    waited = time.monotonic()
+                    await self.limiter.acquire(chat_id, weight, chat_limited)
+                    if span is not None:
+                        span.set_attribute("telegram.limiter_wait_ms", (time.monotonic() - waited) * 1000)
+                code, payload = await self._inner.do_request(
+                    url, method, request_data,
+                    read_timeout=read_timeout,
+                    write_timeout=write_timeout,
+                    connect_timeout=connect_timeout,
+                    pool_timeout=pool_timeout
+                )
+                if span is not None:
+                    span.set_attribute("http.status_code", code)
+            if code != 429:
+                return code, payload
+            try:
+                retry_after = json.loads(payload)["parameters"]["retry_after"]
+            except (ValueError, KeyError, TypeError):
+                return code, payload
+            if inline:
+                # Чат неизвестен, а из-за одного сообщения весь токен не паркуем
+                return code, payload
+            # 429 на запрос в чат касается только этого чата, без чата — всего токена
+            self.limiter.park(chat_id, retry_after)
+            logger.warning(f"Telegram 429 for chat {chat_id}, parked for {retry_after}s")
+            # Короткую паузу переждем сами, длинную отдаем вызывающему как RetryAfter
+            if retry_after > TELEGRAM_MAX_PARK_SECONDS:
+                break
+        return code, payload
+
+
+_requests: Dict[str, SharedRequest] = {}
+_bots: Dict[str, Bot] = {}
+
+
+def get_shared_request(token: str) -> SharedRequest:
+    """Возвращает общий транспорт для токена, создавая его при первом обращении."""
+    if token not in _requests:
+        _requests[token] = SharedRequest()
+    return _requests[token]
+
+
+def get_shared_bot(token: str) -> Bot:
+    """Возвращает общий Bot для токена поверх общего транспорта."""
+    if token not in _bots:
+        _bots[token] = Bot(token=token, request=get_shared_request(token))
+    return _bots[token]
+
+
+def application_builder(token: str) -> ApplicationBuilder:
+    """Builder приложения, исходящие запросы которого идут через общий транспорт токена.
+
+    Long polling (getUpdates) остается на отдельном соединении и лимитам не подлежит.
+    Приложение открывает корневой спан трассировки на каждый апдейт.
+    """
+    return (
+        Application.builder()
+        .application_class(TracingApplication)
+        .token(token)
+        .request(get_shared_request(token))
+    )
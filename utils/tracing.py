@@ -0,0 +1,334 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_MS,
+    TRACE_DIR,
+    TRACE_FILE_MAX_BYTES,
+    TRACE_FILE_BACKUPS,
+    TRACE_SERVICE_NAME
+)
+
+logger = logging.getLogger(__name__)
+
+# Защита от трасс-гигантов (циклы по тысячам документов)
+MAX_SPANS_PER_TRACE = 1000
+
+# Коды статуса OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Спаны одного апдейта. Решение о выгрузке принимается, когда закрывается корень."""
+
+    __slots__ = ("trace_id", "spans", "sampled", "dropped")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List["Span"] = []
+        self.sampled = sampled
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if len(self.trace.spans) < MAX_SPANS_PER_TRACE:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class JsonlSpanExporter:
+    """Пишет трассы в локальные JSONL-файлы с ротацией по размеру.
+
+    Каждая строка — объект ExportTraceServiceRequest в JSON-кодировке OTLP,
+    поэтому файл можно отдать коллектору OpenTelemetry (filelog/otlpjson)
+    или разобрать jq без сети.
+    """
+
+    def __init__(
+        self,
+        directory: str = TRACE_DIR,
+        max_bytes: int = TRACE_FILE_MAX_BYTES,
+        backups: int = TRACE_FILE_BACKUPS,
+        service_name: str = TRACE_SERVICE_NAME
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.resource = {"attributes": _otlp_attributes({
+            "service.name": service_name,
+            "process.pid": os.getpid()
+        })}
+        self._writer: Optional[logging.Logger] = None
+        self._lock = threading.Lock()
+
+    def _get_writer(self) -> logging.Logger:
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            handler = RotatingFileHandler(
+                os.path.join(self.directory, f"traces-{os.getpid()}.jsonl"),
+                maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # Отдельный логгер вне иерархии: трассы не попадают в общий лог
+            writer = logging.Logger(f"{__name__}.export")
+            writer.propagate = False
+            writer.addHandler(handler)
+            self._writer = writer
+        return self._writer
+
+    def _encode(self, trace: Trace) -> str:
+        spans = []
+        for span in trace.spans:
+            encoded = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1 if span.parent_id else 2,  # INTERNAL / SERVER
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": _otlp_attributes(span.attributes),
+                "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {"code": STATUS_OK}
+            }
+            if span.parent_id:
+                encoded["parentSpanId"] = span.parent_id
+            spans.append(encoded)
+        return json.dumps({"resourceSpans": [{
+            "resource": self.resource,
+            "scopeSpans": [{"scope": {"name": "sparkaph"}, "spans": spans}]
+        }]}, ensure_ascii=False, separators=(",", ":"))
+
+    def export(self, trace: Trace) -> None:
+        line = self._encode(trace)
+        with self._lock:
+            self._get_writer().info(line)
+
+
+class Tracer:
+    """Трассировка апдейтов внутри процесса.
+
+    Корневой спан открывается на апдейт, дочерние — вокруг вызовов Database,
+    команд Mongo и запросов к Bot API; родитель передается через contextvars,
+    поэтому видно, в каком обработчике и методе случился каждый запрос.
+    Трасса выгружается, если апдейт попал в долю TRACE_SAMPLE_RATE или
+    обрабатывался дольше TRACE_SLOW_MS. Когда оба выключены, корень не
+    создается, и остальные спаны стоят одну проверку contextvar.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        slow_ms: float = TRACE_SLOW_MS,
+        exporter: Optional[JsonlSpanExporter] = None
+    ):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exporter = exporter or JsonlSpanExporter()
+        self.started = 0
+        self.exported = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def start_span(self, name: str, root: bool = False, **attributes) -> Optional[Span]:
+        """Открывает спан; None, если трасса не ведется. Текущим его не делает."""
+        if root:
+            if not self.enabled:
+                return None
+            sampled = random.random() < self.sample_rate
+            if not sampled and not self.slow_ms:
+                return None
+            self.started += 1
+            return Span(Trace(sampled), name, None, attributes)
+        parent = current_span.get()
+        if parent is None:
+            return None
+        return Span(parent.trace, name, parent, attributes)
+
+    def finish(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end(error)
+        if span.parent_id is not None:
+            return
+        trace = span.trace
+        if trace.sampled or (self.slow_ms and span.duration_ms >= self.slow_ms):
+            if trace.dropped:
+                span.set_attribute("trace.dropped_spans", trace.dropped)
+            try:
+                self.exporter.export(trace)
+                self.exported += 1
+            except Exception as e:
+                logger.error(f"Error exporting trace: {e}")
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, **attributes):
+        """Выполняет блок внутри спана, делая его текущим."""
+        span = self.start_span(name, root=root, **attributes)
+        if span is None:
+            yield None
+            return
+        token = current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish(span, error)
+
+
+tracer = Tracer()
+
+
+def traced(name: str):
+    """Декоратор корутины: дочерний спан, если вызов идет внутри трассы."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return await func(*args, **kwargs)
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_methods(prefix: str):
+    """Декоратор класса: спан вокруг каждой публичной корутины с именем prefix.метод.
+
+    Если трассировка выключена конфигурацией, класс не меняется вовсе.
+    """
+    def decorate(cls):
+        if not tracer.enabled:
+            return cls
+        for name, method in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(method):
+                setattr(cls, name, traced(f"{prefix}.{name}")(method))
+        return cls
+    return decorate
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """Спан на каждую команду Mongo.
+
+    Motor выполняет команды в пуле потоков с копией контекста вызывающей
+    корутины, поэтому current_span здесь — спан метода Database.
+    """
+
+    def __init__(self):
+        self._spans: Dict[tuple, Span] = {}
+
+    def started(self, event):
+        if current_span.get() is None:
+            return
+        collection = event.command.get(event.command_name)
+        span = tracer.start_span(
+            f"mongo.{event.command_name}",
+            **{
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection if isinstance(collection, str) else None,
+                "net.peer.name": event.connection_id[0]
+            }
+        )
+        self._spans[(event.connection_id, event.request_id)] = span
+
+    def _finish(self, event, error: Optional[BaseException] = None):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            tracer.finish(span, error)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, RuntimeError(str(event.failure.get("errmsg", event.failure))))
+
+
+def update_attributes(update: Update) -> Dict[str, Any]:
+    """Атрибуты корневого спана: что за апдейт и от кого."""
+    if update.callback_query:
+        kind = "callback_query"
+    elif update.message and update.message.text and update.message.text.startswith("/"):
+        kind = "command"
+    elif update.message:
+        kind = "message"
+    else:
+        kind = "other"
+    return {
+        "telegram.update_id": update.update_id,
+        "telegram.update_type": kind,
+        "telegram.chat_id": update.effective_chat.id if update.effective_chat else None,
+        "telegram.user_id": update.effective_user.id if update.effective_user else None
+    }
+
+
+class TracingApplication(Application):
+    """Application, который открывает корневой спан на каждый апдейт."""
+
+    async def process_update(self, update: object) -> None:
+        if not tracer.enabled or not isinstance(update, Update):
+            return await super().process_update(update)
+        with tracer.span("telegram.update", root=True, **update_attributes(update)) as span:
+            if span is not None:
+                # id бота — первая часть токена, без обращения к getMe
+                span.set_attribute("telegram.bot_id", self.bot.token.split(":", 1)[0])
+            return await super().process_update(update)